@@ -0,0 +1,1816 @@
+# *********************** async_client.py **************************
+# Die Kommunikation mit der Drohne auf Basis von asyncio. Alle
+# Verbindungen laufen in einer einzigen Ereignisschleife, statt dass
+# für jede Aufgabe ein eigener, blockierender Thread im recv() wartet.
+# Verbindungsaufbau, Senden, Empfangen und der Wiederaufbau einer
+# abgebrochenen Sitzung sind Coroutinen bzw. Tasks in dieser Schleife.
+# Der WLANClient (client.py) ist eine blockierende Schnittstelle zu
+# demselben Client für Threads außerhalb der Ereignisschleife.
+# Das Protokoll (Rahmen, Kanäle) ist dasselbe wie in client.py.
+# ******************************************************************
+
+import asyncio
+import collections
+import random
+import socket
+import threading
+import time
+
+from communication import client
+from communication.capture import TrafficRecorder, KIND_SENT, KIND_RECEIVED, KIND_DATAGRAM
+from communication.framing import FrameReader, encode_frame, HEADER, MAX_REQUEST_ID, NO_REQUEST_ID
+from communication.metrics import LinkStatistics, DATAGRAM_CHANNEL
+from misc.event_handling import EventHandler
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    """
+    Weckt eine wartende Coroutine, sofern sie nicht schon geweckt oder abgebrochen wurde.
+
+    Parameters
+    ----------
+    waiter: asyncio.Future
+        Das Future, auf das die Coroutine wartet.
+    """
+
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EventLoopThread(object):
+    """
+    Ein Thread, in dem eine asyncio-Ereignisschleife läuft. Mehrere Clients können sich
+    dieselbe Schleife teilen.
+
+    Attributes
+    ----------
+    loop: asyncio.AbstractEventLoop
+        Die Ereignisschleife
+    thread: Thread
+        Der Thread, in dem die Schleife läuft.
+
+    Methods
+    -------
+    start():
+        Startet die Schleife in einem Hintergrundthread.
+    stop():
+        Hält die Schleife an und wartet auf das Ende des Threads.
+    submit(coroutine, callback=None, dispatch=None):
+        Führt eine Coroutine in der Schleife aus.
+    run(coroutine, timeout=None):
+        Führt eine Coroutine in der Schleife aus und wartet blockierend auf das Ergebnis.
+    call_soon(function, *args):
+        Führt eine Funktion im Thread der Schleife aus.
+    in_loop_thread():
+        Läuft der Aufrufer im Thread der Schleife?
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die EventLoopThread-Klasse.
+        """
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+
+    def start(self) -> None:
+        """
+        Startet die Schleife in einem Hintergrundthread, sofern sie noch nicht läuft.
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Hält die Schleife an und wartet auf das Ende des Threads. Danach kann sie nicht erneut gestartet werden.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            default: None
+            Wie lange maximal auf das Ende des Threads gewartet wird.
+        """
+
+        if self.thread is None:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def submit(self, coroutine, callback=None, dispatch=None):
+        """
+        Führt eine Coroutine in der Schleife aus. Kann von jedem Thread aus aufgerufen werden.
+
+        Parameters
+        ----------
+        coroutine: coroutine
+            Die Coroutine, z.B. client.request(...)
+        callback: method, optional
+            default: None
+            Wird mit dem Ergebnis und der Exception (oder None) aufgerufen, sobald die Coroutine fertig ist.
+        dispatch: method, optional
+            default: None
+            Bestimmt, in welchem Thread der Callback läuft. Bekommt den Callback und dessen Argumente,
+            z.B. MainThreadDispatcher.post, um ihn im Hauptthread auszuführen. Ohne wird er direkt aufgerufen.
+
+        Returns
+        -------
+        future: concurrent.futures.Future
+            Das Future, womit man auch blockierend auf das Ergebnis warten oder die Coroutine abbrechen kann.
+        """
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        if callback is not None:
+            def on_done(done):
+                error = done.exception() if not done.cancelled() else asyncio.CancelledError()
+                result = done.result() if error is None else None
+                if dispatch is None:
+                    callback(result, error)
+                else:
+                    dispatch(callback, result, error)
+
+            future.add_done_callback(on_done)
+        return future
+
+    def run(self, coroutine, timeout: float = None):
+        """
+        Führt eine Coroutine in der Schleife aus und wartet auf ihr Ergebnis. Blockiert den Aufrufer,
+        darf also nicht im Thread der Schleife selbst aufgerufen werden.
+
+        Parameters
+        ----------
+        coroutine: coroutine
+            Die Coroutine
+        timeout: float, optional
+            default: None
+            Wie lange maximal gewartet wird.
+
+        Returns
+        -------
+        <nameless>: any
+            Das Ergebnis der Coroutine. Ihre Exceptions werden hier ausgelöst.
+        """
+
+        if self.in_loop_thread():
+            coroutine.close()
+            raise RuntimeError('Blocking call from inside the event loop')
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def call_soon(self, function, *args) -> None:
+        """
+        Führt eine Funktion beim nächsten Durchlauf im Thread der Schleife aus.
+        Kann von jedem Thread aus aufgerufen werden.
+
+        Parameters
+        ----------
+        function: method
+            Die Funktion
+        args: any
+            Die Argumente der Funktion
+        """
+
+        self.loop.call_soon_threadsafe(function, *args)
+
+    def in_loop_thread(self) -> bool:
+        """
+        Gibt zurück, ob der Aufrufer im Thread der Schleife läuft.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der aktuelle Thread der der Schleife ist.
+        """
+
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def _run(self) -> None:
+        """
+        Die Hauptfunktion des Threads. Nach stop() werden die übrigen Tasks abgebrochen
+        (z.B. die Empfangstasks, die dabei ihre Sockets schließen) und die Schleife geschlossen.
+        """
+
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+
+class _CancelMarker(object):
+    """
+    Wird von ChannelInbox.cancel() eingereiht, um wartende Aufrufe zu wecken.
+    Die Generation verhindert, dass ein übrig gebliebener Marker einen späteren Aufruf abbricht.
+    """
+
+    __slots__ = ('generation',)
+
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+class _OutboundFrame(object):
+    """
+    Ein Rahmen in der Warteschlange des Schreibtasks.
+    Die Generation verhindert, dass Rahmen von vor einem reset() noch gesendet werden.
+    """
+
+    __slots__ = ('channel', 'request_id', 'data', 'generation')
+
+    def __init__(self, channel: int, request_id: int, data: bytes, generation: int):
+        self.channel = channel
+        self.request_id = request_id
+        self.data = data
+        self.generation = generation
+
+
+class _PendingFuture(object):
+    """
+    Eine offene Anfrage einer Coroutine. Wie client.PendingRequest, die Antwort kommt aber
+    über ein asyncio-Future, auf das die Coroutine wartet, ohne einen Thread zu blockieren.
+    """
+
+    __slots__ = ('request_id', 'channel', 'sent_at', 'future', '_loop')
+
+    def __init__(self, request_id: int, channel: int, loop: asyncio.AbstractEventLoop):
+        self.request_id = request_id
+        self.channel = channel
+        self.sent_at = time.monotonic()
+        self.future = loop.create_future()
+        self._loop = loop
+
+    def set_response(self, response: str) -> None:
+        self._loop.call_soon_threadsafe(self._resolve, response, None)
+
+    def set_error(self, error: Exception) -> None:
+        self._loop.call_soon_threadsafe(self._resolve, None, error)
+
+    def cancel(self) -> None:
+        self._loop.call_soon_threadsafe(self._resolve, client.ReceiveCancelled(self.channel), None)
+
+    def _resolve(self, response, error: Exception) -> None:
+        # Nach einer abgelaufenen Frist hat asyncio.wait_for() das Future schon abgebrochen
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(response)
+
+
+class ChannelInbox(object):
+    """
+    Die Warteschlange eines Kanals mit den empfangenen Nutzdaten. Daraus lesen sowohl Coroutinen
+    in der Ereignisschleife (receive()) als auch blockierende Threads (receive_blocking()),
+    z.B. über den WLANClient. Fehler der Verbindung und Abbrüche werden ebenfalls eingereiht,
+    damit sie die wartenden Aufrufe wecken.
+
+    Attributes
+    ----------
+    channel: int
+        Der Kanal
+
+    Methods
+    -------
+    put(item):
+        Reiht Nutzdaten oder einen Fehler ein.
+    cancel():
+        Bricht einen wartenden Aufruf ab.
+    empty():
+        Ist die Warteschlange leer?
+    discard_errors():
+        Entfernt eingereihte Fehler.
+    receive(flag='', deadline=None):
+        Wartet in der Ereignisschleife auf eine passende Nachricht.
+    receive_blocking(flag='', deadline=None):
+        Wartet blockierend auf eine passende Nachricht.
+    """
+
+    def __init__(self, channel: int, loop: asyncio.AbstractEventLoop):
+        """
+        Erstellt alle nötigen Variablen für die ChannelInbox-Klasse.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        loop: asyncio.AbstractEventLoop
+            Die Ereignisschleife, in der receive() läuft.
+        """
+
+        self.channel = channel
+
+        self._loop = loop
+        self._items = collections.deque()
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._generation = 0
+
+    def put(self, item) -> None:
+        """
+        Reiht Nutzdaten (bytes), einen Fehler (Exception) oder einen Abbruch ein und weckt die
+        wartenden Aufrufe. Kann von jedem Thread aus aufgerufen werden.
+
+        Parameters
+        ----------
+        item: bytes, Exception oder _CancelMarker
+            Der Eintrag
+        """
+
+        with self._condition:
+            self._items.append(item)
+            self._condition.notify()
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            self._loop.call_soon_threadsafe(_wake, waiter)
+
+    def cancel(self) -> None:
+        """
+        Bricht einen Aufruf ab, der gerade wartet. Er bekommt ReceiveCancelled zurück.
+        """
+
+        with self._condition:
+            self._generation += 1
+            generation = self._generation
+        self.put(_CancelMarker(generation))
+
+    def empty(self) -> bool:
+        """
+        Gibt zurück, ob die Warteschlange leer ist.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls nichts bereitliegt.
+        """
+
+        return not self._items
+
+    def discard_errors(self) -> None:
+        """
+        Entfernt Fehler einer früheren Verbindung, damit sie nach einem erneuten
+        Verbindungsaufbau nicht fälschlicherweise ausgelöst werden.
+        """
+
+        with self._condition:
+            items = [item for item in self._items if not isinstance(item, Exception)]
+            self._items.clear()
+            self._items.extend(items)
+
+    async def receive(self, flag: str = '', deadline: float = None):
+        """
+        Wartet in der Ereignisschleife auf eine Nachricht, die die Zeichenkette enthält.
+        Andere Nachrichten werden verworfen.
+
+        Parameters
+        ----------
+        flag: str, optional
+            default: ''
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt. Bei abgelaufener Frist wird nur noch geprüft,
+            ob schon etwas bereitliegt. None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Nachricht oder der Grund, warum keine Nachricht da ist.
+        """
+
+        generation = self._generation
+        while True:
+            with self._condition:
+                if self._items:
+                    item = self._items.popleft()
+                    waiter = None
+                else:
+                    waiter = self._loop.create_future()
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                try:
+                    if timeout is not None and timeout <= 0:
+                        return client.ReceiveTimeout(self.channel)
+                    await asyncio.wait_for(waiter, timeout)
+                except asyncio.TimeoutError:
+                    return client.ReceiveTimeout(self.channel)
+                finally:
+                    with self._condition:
+                        if waiter in self._waiters:
+                            self._waiters.remove(waiter)
+                continue
+
+            result = self._accept(item, flag, generation)
+            if result is not None:
+                return result
+
+    def receive_blocking(self, flag: str = '', deadline: float = None):
+        """
+        Wie receive(), blockiert aber den aufrufenden Thread. Darf nicht in der Ereignisschleife
+        aufgerufen werden.
+
+        Parameters
+        ----------
+        flag: str, optional
+            default: ''
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt (siehe receive()).
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Nachricht oder der Grund, warum keine Nachricht da ist.
+        """
+
+        generation = self._generation
+        while True:
+            with self._condition:
+                while not self._items:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        return client.ReceiveTimeout(self.channel)
+                    self._condition.wait(timeout)
+                item = self._items.popleft()
+
+            result = self._accept(item, flag, generation)
+            if result is not None:
+                return result
+
+    def _accept(self, item, flag: str, generation: int):
+        """
+        Prüft einen Eintrag der Warteschlange.
+
+        Parameters
+        ----------
+        item: bytes, Exception oder _CancelMarker
+            Der Eintrag
+        flag: str
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        generation: int
+            Die Generation der Abbrüche zu Beginn des Wartens.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveCancelled oder None
+            Die Nachricht, der Abbruch oder None, falls weiter gewartet werden soll.
+        """
+
+        if isinstance(item, _CancelMarker):
+            # Übrig gebliebene Marker von früheren Abbrüchen werden ignoriert
+            if item.generation > generation:
+                return client.ReceiveCancelled(self.channel)
+            return None
+
+        # Bei einem Verbindungsabbruch liegt die Exception in der Warteschlange
+        if isinstance(item, Exception):
+            raise item
+
+        data = item.decode('utf-8')
+        return data if flag in data else None
+
+
+class AsyncWLANClient(object):
+    """
+    Klasse für die Kommunikation über WLAN auf Basis von asyncio.
+    Alle logischen Kanäle (Befehle, Steuerdaten, Sensordaten, Verbindungsdaten) teilen sich
+    eine einzige TCP-Verbindung (siehe framing.py). Verbindungsaufbau, Empfangen, Senden und
+    der Wiederaufbau laufen als Coroutinen in der Ereignisschleife eines EventLoopThread und
+    blockieren keinen Thread. Mehrere Clients (z.B. im Flottenmodus) können sich eine Schleife teilen.
+    Die Methoden mit 'async' müssen in der Ereignisschleife laufen, z.B. über submit().
+    Die übrigen kehren sofort zurück und können von jedem Thread aus aufgerufen werden.
+    Gesendet wird von einem Schreibtask, der bereits wartende Rahmen zu einem Aufruf zusammenfasst.
+    Nach der Registrierung (start_session()) wird eine abgebrochene Verbindung automatisch
+    wieder aufgebaut und die Sitzung mit 'CMD|resume_session|<ID>' fortgesetzt.
+    Anfragen tragen eine Anfrage-ID, sodass mehrere gleichzeitig offen sein können.
+    Die Funktionen der EventHandler laufen in der Ereignisschleife und dürfen nicht blockieren.
+
+    Attributes
+    ----------
+    loop_thread: EventLoopThread
+        Die Ereignisschleife, in der der Client läuft.
+    dispatch: method
+        Führt die Callbacks von submit() im gewünschten Thread aus (z.B. MainThreadDispatcher.post).
+    socket: socket.socket
+        Socket, worüber Nachrichten gesendet und empfangen werden.
+    paired_device_ip: str
+        Die IP-Adresse des Zielgerätes(ESP32).
+    paired_device_port: int
+        Der Port des Zielgerätes(ESP32).
+    connected: bool
+        Besteht die Verbindung?
+    last_activity: float
+        Zeitpunkt (time.monotonic()) der letzten erfolgreichen Übertragung.
+    error_count: int
+        Anzahl der aufgetretenen Übertragungsfehler.
+    datagram_socket: socket.socket
+        Optionaler UDP-Socket für den Steuerdatenstrom, bei dem nur der neueste Wert zählt.
+    datagram_address: tuple(str, int)
+        Das Ziel des UDP-Sockets.
+    telemetry_rate_hz: float
+        Die Rate, mit der die Drohne die Sensordaten sendet, oder 0, falls sie abgefragt werden müssen.
+    known_address: tuple(str, int)
+        Die zuletzt funktionierende Adresse der Drohne aus einer früheren Sitzung, z.B. aus der Konfiguration.
+        Sie wird beim Kaltstart zuerst versucht, bevor der Hostname aufgelöst wird.
+    on_address_resolved: EventHandler
+        Wird mit IP-Adresse und Port ausgelöst, sobald eine Verbindung zu einer neuen Adresse
+        gelungen ist, damit sie gespeichert werden kann.
+    statistics: LinkStatistics
+        Bytes, Nachrichten, Fehler und Antwortzeiten pro Kanal (siehe metrics.py).
+    state: str
+        Der Zustand der Verbindung (siehe client.STATE_*).
+    on_state_changed: EventHandler
+        Wird mit dem neuen Zustand ausgelöst.
+    session_id: str
+        Die Sitzungs-ID der Registrierung oder None ohne Sitzung. Eine leere ID bedeutet, dass die
+        Drohne keine Sitzungen kennt und nach dem Wiederaufbau nur die Verbindung zählt.
+    on_session_lost: EventHandler
+        Wird ausgelöst, wenn die Drohne die Sitzung beim Fortsetzen nicht mehr kennt.
+        Dann muss sich die App neu registrieren.
+    recorder: TrafficRecorder
+        Schneidet alle gesendeten und empfangenen Rahmen mit oder None (siehe capture.py).
+
+    Methods
+    -------
+    submit(coroutine, callback=None):
+        Führt eine Coroutine des Clients aus und gibt das Ergebnis an den Callback weiter.
+    connect(address, port):
+        Baut die Verbindung auf, sofern sie noch nicht besteht.
+    start_session(session_id):
+        Merkt sich die Sitzung nach der Registrierung und schaltet den automatischen Wiederaufbau ein.
+    ensure_connected(deadline=None):
+        Baut eine abgebrochene Verbindung wieder auf oder wartet auf den Wiederaufbau.
+    is_connected():
+        Gibt zurück, ob die Verbindung besteht.
+    is_ready():
+        Kann ohne Warten gesendet und empfangen werden?
+    send_message(channel, message):
+        Reiht eine Nachricht zum Senden ein.
+    send_bytes(channel, payload):
+        Reiht binäre Nutzdaten zum Senden ein.
+    send_request(channel, message, create_pending):
+        Reiht eine Anfrage mit Anfrage-ID ein, ohne auf die Antwort zu warten.
+    flush(deadline=None):
+        Wartet, bis alle eingereihten Rahmen gesendet wurden.
+    request(channel, message, deadline=None):
+        Sendet eine Anfrage mit Anfrage-ID und wartet auf die Antwort.
+    subscribe_telemetry(rate_hz, deadline=None):
+        Bittet die Drohne, die Sensordaten selbstständig zu senden.
+    unsubscribe_telemetry():
+        Beendet das selbstständige Senden der Sensordaten.
+    open_datagram(address, port):
+        Öffnet den UDP-Kanal für den Steuerdatenstrom.
+    send_datagram(payload):
+        Sendet ein einzelnes Datagramm über den UDP-Kanal.
+    close_datagram():
+        Schließt den UDP-Kanal.
+    wait_for_response(channel, flag='', deadline=None):
+        Wartet bis zur Frist, bis eine Nachricht auf dem Kanal angekommen ist.
+    wait_for_latest_response(channel, flag='', deadline=None):
+        Wie wait_for_response(), gibt aber bei mehreren Nachrichten nur die neueste zurück.
+    get_inbox(channel):
+        Gibt die Warteschlange des Kanals zurück.
+    cancel_receive(channel=None):
+        Bricht wartende Empfangsaufrufe ab.
+    has_pending_response(channel):
+        Liegt bereits eine vollständige Nachricht für den Kanal bereit?
+    reset():
+        Setzt den Client zurück und kappt die Verbindung.
+    get_server_address():
+        Gibt die (zwischengespeicherte) Adresse der Drohne zurück.
+    invalidate_server_address():
+        Verwirft die zwischengespeicherte Adresse der Drohne.
+    get_statistics():
+        Gibt eine Kopie der Messwerte aller Kanäle zurück.
+    start_capture(path):
+        Beginnt einen Mitschnitt aller Rahmen.
+    stop_capture():
+        Beendet den Mitschnitt.
+    """
+
+    def __init__(self, loop_thread: EventLoopThread = None, dispatch=None):
+        """
+        Erstellt alle nötigen Variablen für die AsyncWLANClient-Klasse.
+
+        Parameters
+        ----------
+        loop_thread: EventLoopThread, optional
+            default: None
+            Eine bereits bestehende Ereignisschleife. Ohne wird eine eigene erstellt und gestartet.
+        dispatch: method, optional
+            default: None
+            Siehe EventLoopThread.submit()
+        """
+
+        if loop_thread is None:
+            loop_thread = EventLoopThread()
+            loop_thread.start()
+
+        self.loop_thread = loop_thread
+        self.dispatch = dispatch
+
+        self.socket = None
+        self.paired_device_ip = None
+        self.paired_device_port = None
+
+        self.connected = False
+        self.last_activity = 0.0
+        self.error_count = 0
+        self.statistics = LinkStatistics()
+        self.recorder = None
+
+        self.datagram_socket = None
+        self.datagram_address = None
+
+        self.telemetry_rate_hz = 0
+
+        self.state = client.STATE_DISCONNECTED
+        self.on_state_changed = EventHandler()
+        self.session_id = None
+        self.on_session_lost = EventHandler()
+        self._session_generation = 0
+        self._ready = False
+        self._ready_waiters = []
+        self._reconnect_task = None
+
+        self.known_address = None
+        self.on_address_resolved = EventHandler()
+        self._resolved_address = None
+        self._resolved_at = 0.0
+
+        self._inboxes = {}
+        self._pending = {}
+        self._next_request_id = NO_REQUEST_ID
+        self._lock = threading.RLock()
+
+        self._outbox = collections.deque()
+        self._outbox_generation = 0
+        self._unfinished = 0
+        self._flush_waiters = []
+        self._outbox_lock = threading.Lock()
+        self._writer_task = None
+        self._connect_generation = 0
+
+    def submit(self, coroutine, callback=None):
+        """
+        Führt eine Coroutine in der Ereignisschleife aus (siehe EventLoopThread.submit()).
+
+        Parameters
+        ----------
+        coroutine: coroutine
+            Die Coroutine, z.B. self.request(...)
+        callback: method, optional
+            default: None
+            Wird mit dem Ergebnis und der Exception (oder None) aufgerufen.
+
+        Returns
+        -------
+        future: concurrent.futures.Future
+            Das Future
+        """
+
+        return self.loop_thread.submit(coroutine, callback, self.dispatch)
+
+    async def connect(self, address: str, port: int) -> None:
+        """
+        Baut die Verbindung zu IP-Adresse und Port auf, ohne die Ereignisschleife zu blockieren.
+        Besteht die Verbindung zu derselben Adresse bereits, wird sie weiterverwendet.
+        Besteht eine Sitzung, wird sie danach im Hintergrund fortgesetzt.
+
+        Parameters
+        ----------
+        address: str
+            Die IP-Adresse des Zielgerätes(ESP32)
+        port: int
+            Der Port des Zielgerätes(ESP32)
+        """
+
+        same_target = self.paired_device_ip == address and self.paired_device_port == port
+        if self.connected and same_target:
+            return
+
+        self._close_socket()
+        if self.state != client.STATE_RECONNECTING:
+            self._set_state(client.STATE_CONNECTING)
+        self._connect_generation += 1
+        generation = self._connect_generation
+
+        s = self._create_socket()
+        try:
+            try:
+                await asyncio.wait_for(self.loop_thread.loop.sock_connect(s, (address, port)),
+                                       client.CONNECT_TIMEOUT_SEC)
+            except asyncio.TimeoutError:
+                # Erst ab Python 3.11 ist asyncio.TimeoutError ein OSError
+                raise TimeoutError('Connection attempt timed out') from None
+        except OSError:
+            s.close()
+            self.error_count += 1
+            if generation == self._connect_generation:
+                # Die Drohne hat vielleicht eine neue IP-Adresse bekommen
+                if (address, port) in (self._resolved_address, self.known_address):
+                    self.invalidate_server_address()
+                if self.session_id is None:
+                    self._set_state(client.STATE_DISCONNECTED)
+            raise
+
+        # Ein reset() oder ein neuerer connect() kam dazwischen
+        if generation != self._connect_generation:
+            s.close()
+            raise ConnectionAbortedError('Connection attempt has been superseded')
+
+        self.socket = s
+        self.paired_device_ip = address
+        self.paired_device_port = port
+        self.connected = True
+        self.last_activity = time.monotonic()
+        self._discard_stale_errors()
+        self.loop_thread.loop.create_task(self._receive_loop(s))
+
+        if self.session_id is None:
+            self._set_ready(True)
+            self._set_state(client.STATE_CONNECTED)
+        else:
+            self._start_reconnect()
+
+        new_address = self.known_address != (address, port)
+        self.known_address = (address, port)
+        if new_address:
+            self.on_address_resolved.invoke(address, port)
+
+    async def start_session(self, session_id: str) -> None:
+        """
+        Merkt sich die Sitzung, die die Drohne bei der Registrierung vergeben hat (REGISTER|1|<ID>).
+        Ab jetzt wird eine abgebrochene Verbindung automatisch wieder aufgebaut und die Sitzung
+        fortgesetzt. reset() beendet die Sitzung.
+
+        Parameters
+        ----------
+        session_id: str
+            Die Sitzungs-ID, leer bei einer Drohne ohne Sitzungen.
+        """
+
+        self.session_id = session_id
+        self._session_generation += 1
+        if self.connected:
+            self._set_ready(True)
+            self._set_state(client.STATE_CONNECTED)
+        else:
+            self._start_reconnect()
+
+    async def ensure_connected(self, deadline: float = None) -> None:
+        """
+        Baut die Verbindung mit den gespeicherten Daten wieder auf, falls sie abgebrochen ist.
+        Besteht eine Sitzung, übernimmt das der Wiederaufbau-Task und es wird nur gewartet.
+
+        Parameters
+        ----------
+        deadline: float, optional
+            default: None
+            Wie lange höchstens auf eine fortgesetzte Sitzung gewartet wird (time.monotonic()-Zeitpunkt).
+            None wartet RECONNECT_WAIT_SEC Sekunden.
+        """
+
+        if self.session_id is not None:
+            if self._ready:
+                return
+            self._start_reconnect()
+            timeout = client.RECONNECT_WAIT_SEC if deadline is None else max(0.0, deadline - time.monotonic())
+            ready = await self._wait_ready(timeout)
+            # reset() beendet die Sitzung und weckt dabei die wartenden Coroutinen
+            if self.session_id is not None:
+                if not ready:
+                    raise ConnectionError('Connection is being re-established')
+                return
+
+        if self.connected:
+            return
+
+        if not self._has_target():
+            raise ConnectionError('Connection has no known target')
+        await self.connect(self.paired_device_ip, int(self.paired_device_port))
+
+    def is_connected(self) -> bool:
+        """
+        Gibt zurück, ob die Verbindung besteht.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Verbindung besteht.
+        """
+
+        return self.connected
+
+    def is_ready(self) -> bool:
+        """
+        Gibt zurück, ob die Verbindung besteht und eine Sitzung gegebenenfalls fortgesetzt ist,
+        ensure_connected() also nicht warten müsste.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls sofort gesendet und empfangen werden kann.
+        """
+
+        if self.session_id is not None:
+            return self._ready
+        return self.connected
+
+    def send_message(self, channel: int, message: str) -> None:
+        """
+        Reiht eine Nachricht zum Senden über einen Kanal ein und kehrt sofort zurück.
+        Ist die Verbindung abgebrochen, baut der Schreibtask sie wieder auf oder wartet
+        auf den Wiederaufbau der Sitzung. Schlägt das Senden fehl, bekommen die offenen
+        Anfragen den Fehler.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Nachricht gesendet werden soll (z.B. CHANNEL_COMMAND).
+        message: str
+            Die Nachricht
+        """
+
+        self.send_bytes(channel, message.encode('utf-8'))
+
+    def send_bytes(self, channel: int, payload: bytes, request_id: int = NO_REQUEST_ID) -> None:
+        """
+        Reiht binäre Nutzdaten als einen Rahmen zum Senden ein (siehe send_message()).
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Nutzdaten gesendet werden sollen.
+        payload: bytes
+            Die Nutzdaten, z.B. ein Steuerrahmen aus codec.py
+        request_id: int, optional
+            default: NO_REQUEST_ID
+            Die Anfrage-ID, normalerweise von send_request() vergeben.
+        """
+
+        frame = encode_frame(payload, channel, request_id)
+        if not self.connected and not self._has_target():
+            raise ConnectionError('Connection has no known target')
+
+        with self._outbox_lock:
+            self._unfinished += 1
+            item = _OutboundFrame(channel, request_id, frame, self._outbox_generation)
+        self.loop_thread.call_soon(self._push_outbound, item)
+
+    def send_request(self, channel: int, message: str, create_pending):
+        """
+        Reiht eine Anfrage mit einer neuen Anfrage-ID ein und kehrt sofort zurück.
+        Die Antwort wird anhand der ID zugeordnet und an das Objekt gegeben, das create_pending erstellt.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Anfrage gesendet werden soll.
+        message: str
+            Die Anfrage
+        create_pending: method
+            Wird mit der Anfrage-ID und der Funktion zum Verwerfen der Anfrage aufgerufen und gibt
+            das Objekt zurück, das die Antwort bekommt (z.B. client.PendingRequest).
+            Es braucht die Methoden set_response(), set_error() und cancel().
+
+        Returns
+        -------
+        pending: any
+            Das Objekt von create_pending
+        """
+
+        with self._lock:
+            request_id = self._allocate_request_id()
+            pending = create_pending(request_id, self._discard_request)
+            self._pending[request_id] = pending
+
+        try:
+            self.send_bytes(channel, message.encode('utf-8'), request_id)
+        except (OSError, ValueError):
+            self._discard_request(request_id)
+            raise
+        return pending
+
+    async def flush(self, deadline: float = None) -> bool:
+        """
+        Wartet, bis der Schreibtask alle bisher eingereihten Rahmen gesendet (oder verworfen) hat.
+
+        Parameters
+        ----------
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt. None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Warteschlange rechtzeitig leer wurde.
+        """
+
+        while True:
+            with self._outbox_lock:
+                if not self._unfinished:
+                    return True
+                waiter = self.loop_thread.loop.create_future()
+                self._flush_waiters.append(waiter)
+
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                return False
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                return False
+
+    async def request(self, channel: int, message: str, deadline: float = None):
+        """
+        Sendet eine Anfrage (z.B. 'CMD|get_sensor_data') mit einer neuen Anfrage-ID und wartet auf die
+        Antwort mit derselben ID. Mehrere Anfragen können gleichzeitig offen sein (z.B. über asyncio.gather()).
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        message: str
+            Die Anfrage
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt. None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Antwort oder der Grund, warum keine Antwort da ist.
+        """
+
+        loop = self.loop_thread.loop
+        pending = self.send_request(channel, message,
+                                    lambda request_id, discard: _PendingFuture(request_id, channel, loop))
+        return await self._await_response(pending, deadline)
+
+    async def subscribe_telemetry(self, rate_hz: float, deadline: float = None):
+        """
+        Bittet die Drohne, die Sensordaten (GEODATA) mit der angegebenen Rate selbstständig über
+        CHANNEL_SENSOR zu senden. Die Drohne antwortet mit SUBSCRIBE|1|<Rate>, wobei sie die Rate begrenzen kann.
+        Nach dem Wiederaufbau einer Sitzung wird mit der Rate automatisch neu abonniert.
+
+        Parameters
+        ----------
+        rate_hz: float
+            Die gewünschte Rate in Hz
+        deadline: float, optional
+            default: None
+            Frist für die Antwort (siehe request()).
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Antwort mit der ausgehandelten Rate
+        """
+
+        self.telemetry_rate_hz = rate_hz
+        return await self.request(client.CHANNEL_COMMAND,
+                                  f'CMD{client.SEPARATOR}subscribe_telemetry{client.SEPARATOR}{rate_hz}', deadline)
+
+    def unsubscribe_telemetry(self) -> None:
+        """
+        Beendet das selbstständige Senden der Sensordaten (siehe subscribe_telemetry()).
+        """
+
+        self.telemetry_rate_hz = 0
+        self.send_message(client.CHANNEL_COMMAND, f'CMD{client.SEPARATOR}unsubscribe_telemetry')
+
+    def open_datagram(self, address: str, port: int) -> None:
+        """
+        Öffnet einen UDP-Socket für Daten, bei denen nur der neueste Wert zählt (Joysticks).
+        Geht ein Paket verloren, wird es nicht erneut gesendet und hält so auch keine späteren Pakete auf.
+
+        Parameters
+        ----------
+        address: str
+            Die IP-Adresse des Zielgerätes(ESP32)
+        port: int
+            Der UDP-Port des Zielgerätes(ESP32)
+        """
+
+        if self.datagram_socket is not None and self.datagram_address == (address, port):
+            return
+
+        self.close_datagram()
+        self.datagram_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.datagram_address = (address, port)
+
+    def send_datagram(self, payload: bytes) -> None:
+        """
+        Sendet die Nutzdaten als ein einzelnes Datagramm. Ein UDP-Socket blockiert dabei nicht,
+        gesendet wird deshalb direkt im aufrufenden Thread.
+
+        Parameters
+        ----------
+        payload: bytes
+            Die Nutzdaten, z.B. ein Steuerrahmen aus codec.py
+        """
+
+        if self.datagram_socket is None:
+            raise ConnectionError('Datagram channel is not open')
+        try:
+            self.datagram_socket.sendto(payload, self.datagram_address)
+        except OSError:
+            self.statistics.record_error(DATAGRAM_CHANNEL)
+            raise
+        self.statistics.record_sent(DATAGRAM_CHANNEL, len(payload))
+        if self.recorder is not None:
+            self.recorder.record(KIND_DATAGRAM, encode_frame(payload, client.CHANNEL_CONTROL))
+
+    def close_datagram(self) -> None:
+        """
+        Schließt den UDP-Socket, sofern er geöffnet wurde.
+        """
+
+        if self.datagram_socket is not None:
+            self.datagram_socket.close()
+        self.datagram_socket = None
+        self.datagram_address = None
+
+    async def wait_for_response(self, channel: int, flag: str = '', deadline: float = None):
+        """
+        Wartet auf eine vollständige Nachricht auf dem Kanal, die die Zeichenkette enthält.
+        Andere Nachrichten auf dem Kanal werden verworfen. Das Warten endet spätestens
+        mit der Frist oder sobald cancel_receive() aufgerufen wird.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        flag: str, optional
+            default: ''
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt. None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Nachricht oder der Grund, warum keine Nachricht da ist.
+        """
+
+        if not self.is_ready():
+            await self.ensure_connected(deadline)
+        return await self.get_inbox(channel).receive(flag, deadline)
+
+    async def wait_for_latest_response(self, channel: int, flag: str = '', deadline: float = None):
+        """
+        Wartet wie wait_for_response() auf eine Nachricht. Liegen danach schon weitere
+        Nachrichten bereit, werden die älteren übersprungen und nur die neueste zurückgegeben.
+        Gedacht für Daten, bei denen nur der aktuelle Wert zählt (z.B. GEODATA).
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        flag: str, optional
+            default: ''
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist für die erste Nachricht.
+
+        Returns
+        -------
+        data: str, ReceiveTimeout oder ReceiveCancelled
+            Die neueste Nachricht oder der Grund, warum keine Nachricht da ist.
+        """
+
+        data = await self.wait_for_response(channel, flag, deadline)
+        inbox = self.get_inbox(channel)
+        while data and not inbox.empty():
+            newer = await inbox.receive(flag, deadline=time.monotonic())
+            if isinstance(newer, client.ReceiveCancelled):
+                return newer
+            if newer:
+                data = newer
+        return data
+
+    def get_inbox(self, channel: int) -> ChannelInbox:
+        """
+        Gibt die Warteschlange des Kanals zurück und erstellt sie bei Bedarf.
+        Der WLANClient liest daraus blockierend (ChannelInbox.receive_blocking()).
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+
+        Returns
+        -------
+        <nameless>: ChannelInbox
+            Die Warteschlange mit den empfangenen Nutzdaten
+        """
+
+        with self._lock:
+            if channel not in self._inboxes:
+                self._inboxes[channel] = ChannelInbox(channel, self.loop_thread.loop)
+            return self._inboxes[channel]
+
+    def cancel_receive(self, channel: int = None) -> None:
+        """
+        Bricht alle Aufrufe ab, die gerade auf eine Nachricht oder Antwort auf dem Kanal warten.
+        Sie bekommen ReceiveCancelled zurück. Kann von jedem Thread aus aufgerufen werden.
+
+        Parameters
+        ----------
+        channel: int, optional
+            default: None
+            Der Kanal. Ohne werden alle Kanäle abgebrochen.
+        """
+
+        with self._lock:
+            channels = list(self._inboxes.keys()) if channel is None else [channel]
+            inboxes = [self.get_inbox(c) for c in channels]
+            pending = [request for request in self._pending.values()
+                       if channel is None or request.channel == channel]
+
+        for inbox in inboxes:
+            inbox.cancel()
+        for request in pending:
+            request.cancel()
+
+    def has_pending_response(self, channel: int) -> bool:
+        """
+        Prüft, ob bereits eine vollständige Nachricht empfangen wurde, die
+        wait_for_response() ohne zu warten zurückgeben würde.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls eine Nachricht bereitliegt.
+        """
+
+        return not self.get_inbox(channel).empty()
+
+    async def reset(self) -> None:
+        """
+        Setzt den Client zurück. Die Verbindung und der UDP-Kanal werden geschlossen und
+        noch nicht abgeholte Nachrichten verworfen. Eingereihte Rahmen (z.B. ein letztes 'CMD|reset')
+        bekommen kurz Zeit, gesendet zu werden, der Rest wird verworfen.
+        """
+
+        await self.flush(client.deadline_in(client.RESET_FLUSH_SEC))
+
+        with self._outbox_lock:
+            self._outbox_generation += 1
+        self._connect_generation += 1
+        self._end_session()
+        self.close_datagram()
+        self._close_socket()
+        self.paired_device_ip = ''
+        self.paired_device_port = ''
+        self._wake_waiters(ConnectionAbortedError('Client has been reset'))
+        with self._lock:
+            self._inboxes = {}
+        self._set_state(client.STATE_DISCONNECTED)
+
+    async def get_server_address(self) -> (str, int):
+        """
+        Gibt die IP-Adresse und den Port des Servers zurück, dessen Hostname gehardcoded wurde.
+        Der Hostname wird aufgelöst, ohne die Ereignisschleife zu blockieren, und für
+        ADDRESS_TTL_SEC Sekunden zwischengespeichert. Beim Kaltstart wird zuerst die zuletzt
+        funktionierende Adresse (known_address) zurückgegeben. Schlägt der Verbindungsaufbau fehl,
+        wird beides verworfen und beim nächsten Aufruf neu aufgelöst.
+
+        Returns
+        -------
+        <nameless>: tuple(str, int)
+            Die Adresse und den Port
+        """
+
+        with self._lock:
+            if self._resolved_address is not None and \
+                    time.monotonic() - self._resolved_at < client.ADDRESS_TTL_SEC:
+                return self._resolved_address
+            # Kaltstart: noch nie aufgelöst, aber aus einer früheren Sitzung bekannt
+            if self._resolved_address is None and self.known_address is not None:
+                return self.known_address
+
+        infos = await self.loop_thread.loop.getaddrinfo(client.SERVER_HOSTNAME, client.SERVER_PORT,
+                                                        family=socket.AF_INET, type=socket.SOCK_STREAM)
+        address = (infos[0][4][0], client.SERVER_PORT)
+
+        with self._lock:
+            self._resolved_address = address
+            self._resolved_at = time.monotonic()
+        return address
+
+    def invalidate_server_address(self) -> None:
+        """
+        Verwirft die zwischengespeicherte und die zuletzt funktionierende Adresse,
+        sodass get_server_address() den Hostnamen erneut auflöst.
+        """
+
+        with self._lock:
+            self._resolved_address = None
+            self.known_address = None
+
+    def get_statistics(self) -> dict:
+        """
+        Gibt eine Kopie der Messwerte aller Kanäle zurück (siehe LinkStatistics.snapshot()).
+        Mit metrics.link_quality() lässt sich daraus eine Verbindungsqualität von 0 bis 100 berechnen.
+
+        Returns
+        -------
+        <nameless>: dict
+            Kanal -> Messwerte
+        """
+
+        return self.statistics.snapshot()
+
+    def start_capture(self, path: str) -> None:
+        """
+        Beginnt einen Mitschnitt aller gesendeten und empfangenen Rahmen (siehe capture.py).
+        Ein laufender Mitschnitt wird vorher beendet.
+
+        Parameters
+        ----------
+        path: str
+            Der Pfad der Mitschnittdatei. Eine bestehende Datei wird erweitert.
+        """
+
+        self.stop_capture()
+        self.recorder = TrafficRecorder(path)
+
+    def stop_capture(self) -> None:
+        """
+        Beendet den Mitschnitt, sofern einer läuft, und schreibt ihn vollständig in die Datei.
+        """
+
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is not None:
+            recorder.close()
+
+    async def _receive_loop(self, sock: socket.socket) -> None:
+        """
+        Läuft als Task solange die Verbindung besteht und verteilt die empfangenen Rahmen
+        auf die Warteschlangen der Kanäle. Es wird direkt in den Puffer des FrameReader empfangen.
+        Am Ende wird der Socket geschlossen.
+
+        Parameters
+        ----------
+        sock: socket.socket
+            Der Socket, von dem gelesen wird.
+        """
+
+        loop = self.loop_thread.loop
+        reader = FrameReader(sock)
+        try:
+            while True:
+                try:
+                    while not reader.has_frame():
+                        reader.commit(await loop.sock_recv_into(sock, reader.receive_view()))
+                    frame = reader.read_frame_view()
+                except OSError as e:
+                    self._mark_failed(sock, e)
+                    return
+
+                self.last_activity = time.monotonic()
+                self.statistics.record_received(frame.channel, HEADER.size + len(frame.payload))
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.record_frame(KIND_RECEIVED, frame)
+                self._dispatch_frame(frame)
+        finally:
+            sock.close()
+
+    def _push_outbound(self, item: _OutboundFrame) -> None:
+        """
+        Läuft in der Ereignisschleife. Hängt einen Rahmen an die Warteschlange und startet
+        den Schreibtask, sofern er nicht schon läuft.
+
+        Parameters
+        ----------
+        item: _OutboundFrame
+            Der Rahmen
+        """
+
+        self._outbox.append(item)
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = self.loop_thread.loop.create_task(self._write_loop())
+
+    async def _write_loop(self) -> None:
+        """
+        Läuft als Task, bis die Warteschlange leer ist. Nimmt den nächsten Rahmen und hängt alle
+        Rahmen an, die bereits dahinter warten, damit sie zusammen gesendet werden.
+        """
+
+        while self._outbox:
+            batch = [self._outbox.popleft()]
+            size = len(batch[0].data)
+            while self._outbox and size < client.MAX_COALESCE_BYTES:
+                item = self._outbox.popleft()
+                batch.append(item)
+                size += len(item.data)
+
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._outbox_done(len(batch))
+
+    async def _write_batch(self, batch: list) -> None:
+        """
+        Sendet mehrere Rahmen mit einem einzigen sock_sendall(). Rahmen von vor einem reset() werden verworfen.
+
+        Parameters
+        ----------
+        batch: list
+            Die Rahmen (_OutboundFrame)
+        """
+
+        batch = [item for item in batch if item.generation == self._outbox_generation]
+        if not batch:
+            return
+
+        try:
+            if not self.is_ready():
+                await self.ensure_connected(client.deadline_in(client.RECONNECT_WAIT_SEC))
+            s = self.socket
+            if s is None:
+                raise ConnectionResetError('Connection closed while sending')
+        except OSError as e:
+            self._drop_batch(batch, e)
+            return
+
+        try:
+            await self.loop_thread.loop.sock_sendall(s, b''.join(item.data for item in batch))
+        except OSError as e:
+            self._drop_batch(batch, e)
+            self._mark_failed(s, e)
+            return
+
+        self.last_activity = time.monotonic()
+        recorder = self.recorder
+        for item in batch:
+            self.statistics.record_sent(item.channel, len(item.data))
+            if recorder is not None:
+                recorder.record(KIND_SENT, item.data)
+
+    def _outbox_done(self, count: int) -> None:
+        """
+        Zählt gesendete (oder verworfene) Rahmen ab und weckt flush(), sobald keine mehr ausstehen.
+
+        Parameters
+        ----------
+        count: int
+            Die Anzahl der Rahmen
+        """
+
+        with self._outbox_lock:
+            self._unfinished -= count
+            if self._unfinished:
+                return
+            waiters, self._flush_waiters = self._flush_waiters, []
+        for waiter in waiters:
+            _wake(waiter)
+
+    def _drop_batch(self, batch: list, error: Exception) -> None:
+        """
+        Zählt die Rahmen, die nicht gesendet werden konnten, als Fehler und beendet
+        die zugehörigen offenen Anfragen mit dem Fehler.
+
+        Parameters
+        ----------
+        batch: list
+            Die Rahmen (_OutboundFrame)
+        error: Exception
+            Der Fehler, den die Anfragen auslösen sollen.
+        """
+
+        for item in batch:
+            self.statistics.record_error(item.channel)
+
+        with self._lock:
+            pending = [self._pending.pop(item.request_id, None) for item in batch
+                       if item.request_id != NO_REQUEST_ID]
+        for request in pending:
+            if request is not None:
+                request.set_error(error)
+
+    def _dispatch_frame(self, frame) -> None:
+        """
+        Ordnet einen empfangenen Rahmen zu: Antworten auf offene Anfragen gehen an die Anfrage,
+        alles andere in die Warteschlange des Kanals.
+        Antworten werden direkt aus dem Empfangspuffer dekodiert, nur Nachrichten für die
+        Warteschlangen werden kopiert, da der Puffer danach wiederverwendet wird.
+
+        Parameters
+        ----------
+        frame: Frame
+            Der empfangene Rahmen, die Nutzdaten als memoryview (siehe FrameReader.read_frame_view())
+        """
+
+        if frame.request_id != NO_REQUEST_ID:
+            with self._lock:
+                pending = self._pending.pop(frame.request_id, None)
+            if pending is not None:
+                self.statistics.record_rtt(pending.channel, time.monotonic() - pending.sent_at)
+                pending.set_response(str(frame.payload, 'utf-8'))
+                return
+
+        self.get_inbox(frame.channel).put(bytes(frame.payload))
+
+    async def _await_response(self, pending: _PendingFuture, deadline: float = None):
+        """
+        Wartet bis zur Frist auf die Antwort einer Anfrage.
+
+        Parameters
+        ----------
+        pending: _PendingFuture
+            Die offene Anfrage
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt. None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Antwort oder der Grund, warum keine Antwort da ist.
+        """
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(pending.future, timeout)
+        except asyncio.TimeoutError:
+            # Eine spätere Antwort wird dann wie eine normale Nachricht behandelt
+            self._discard_request(pending.request_id, timed_out=True)
+            return client.ReceiveTimeout(pending.channel)
+        except asyncio.CancelledError:
+            self._discard_request(pending.request_id)
+            raise
+
+    def _discard_request(self, request_id: int, timed_out: bool = False) -> None:
+        """
+        Entfernt eine offene Anfrage, auf deren Antwort niemand mehr wartet.
+
+        Parameters
+        ----------
+        request_id: int
+            Die Anfrage-ID
+        timed_out: bool, optional
+            default: False
+            Wurde die Frist überschritten? Dann wird die Anfrage als verloren gezählt.
+        """
+
+        with self._lock:
+            pending = self._pending.pop(request_id, None)
+        if pending is not None and timed_out:
+            self.statistics.record_timeout(pending.channel)
+
+    def _allocate_request_id(self) -> int:
+        """
+        Vergibt die nächste freie Anfrage-ID. Die IDs laufen von 1 bis MAX_REQUEST_ID im Kreis,
+        IDs von noch offenen Anfragen werden übersprungen.
+
+        Returns
+        -------
+        <nameless>: int
+            Die Anfrage-ID
+        """
+
+        if len(self._pending) >= MAX_REQUEST_ID:
+            raise OverflowError('Too many pending requests')
+
+        while True:
+            self._next_request_id = self._next_request_id % MAX_REQUEST_ID + 1
+            if self._next_request_id not in self._pending:
+                return self._next_request_id
+
+    def _has_target(self) -> bool:
+        """
+        Gibt zurück, ob IP-Adresse und Port für einen erneuten Verbindungsaufbau bekannt sind.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls ensure_connected() die Verbindung wieder aufbauen kann.
+        """
+
+        return bool(self.paired_device_ip) and str(self.paired_device_port).isnumeric()
+
+    def _mark_failed(self, sock: socket.socket, error: OSError) -> None:
+        """
+        Markiert die Verbindung als abgebrochen, ohne die Zieldaten zu vergessen, und
+        weckt alle Aufrufe, die auf eine Nachricht warten.
+
+        Parameters
+        ----------
+        sock: socket.socket
+            Der Socket, bei dem der Fehler aufgetreten ist. Wurde die Verbindung
+            inzwischen geschlossen oder neu aufgebaut, bleibt alles unberührt.
+        error: OSError
+            Der aufgetretene Fehler
+        """
+
+        if sock is None or sock is not self.socket:
+            return
+        self.error_count += 1
+        self._close_socket()
+        self._wake_waiters(ConnectionResetError(f'Connection lost: {error}'))
+
+        if self.session_id is not None:
+            self._set_state(client.STATE_RECONNECTING)
+            self._start_reconnect()
+        else:
+            self._set_state(client.STATE_DISCONNECTED)
+
+    def _discard_stale_errors(self) -> None:
+        """
+        Entfernt Fehler einer früheren Verbindung aus den Warteschlangen.
+        """
+
+        with self._lock:
+            inboxes = list(self._inboxes.values())
+        for inbox in inboxes:
+            inbox.discard_errors()
+
+    def _wake_waiters(self, error: Exception) -> None:
+        """
+        Legt den Fehler in jede Warteschlange und beendet alle offenen Anfragen damit,
+        damit wartende Aufrufe nicht ewig blockieren.
+
+        Parameters
+        ----------
+        error: Exception
+            Der Fehler, den wait_for_response() auslösen soll.
+        """
+
+        with self._lock:
+            inboxes = list(self._inboxes.values())
+            pending, self._pending = self._pending, {}
+        for inbox in inboxes:
+            inbox.put(error)
+        for request in pending.values():
+            request.set_error(error)
+
+    def _set_state(self, state: str) -> None:
+        """
+        Setzt den Zustand der Verbindung und löst on_state_changed aus, falls er sich geändert hat.
+
+        Parameters
+        ----------
+        state: str
+            Der neue Zustand
+        """
+
+        if self.state == state:
+            return
+        self.state = state
+        self.on_state_changed.invoke(state)
+
+    def _set_ready(self, ready: bool) -> None:
+        """
+        Merkt sich, ob gesendet werden kann, und weckt die Coroutinen in _wait_ready().
+
+        Parameters
+        ----------
+        ready: bool
+            Ist die Verbindung bereit?
+        """
+
+        self._ready = ready
+        if ready:
+            waiters, self._ready_waiters = self._ready_waiters, []
+            for waiter in waiters:
+                _wake(waiter)
+
+    async def _wait_ready(self, timeout: float) -> bool:
+        """
+        Wartet, bis die Verbindung bereit ist (siehe _set_ready()).
+
+        Parameters
+        ----------
+        timeout: float
+            Wie lange höchstens gewartet wird.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Verbindung rechtzeitig bereit war.
+        """
+
+        if self._ready:
+            return True
+
+        waiter = self.loop_thread.loop.create_future()
+        self._ready_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._ready_waiters:
+                self._ready_waiters.remove(waiter)
+
+    def _end_session(self) -> None:
+        """
+        Beendet die Sitzung. Ein laufender Wiederaufbau hört danach auf.
+        """
+
+        self.session_id = None
+        self._session_generation += 1
+        task, self._reconnect_task = self._reconnect_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        # Coroutinen, die in ensure_connected() auf die Sitzung warten, aufwecken
+        self._set_ready(True)
+
+    def _start_reconnect(self) -> None:
+        """
+        Startet den Wiederaufbau der Sitzung als Task, sofern er nicht schon läuft.
+        """
+
+        if self.session_id is None or self._reconnect_task is not None:
+            return
+        self._reconnect_task = self.loop_thread.loop.create_task(self._reconnect_loop(self._session_generation))
+
+    async def _reconnect_loop(self, generation: int) -> None:
+        """
+        Läuft als Task, bis die Sitzung fortgesetzt oder beendet wurde.
+        Zwischen den Versuchen wird exponentiell länger gewartet (höchstens RECONNECT_MAX_SEC),
+        mit einem zufälligen Anteil, damit die Versuche nicht im Gleichschritt mit Störungen laufen.
+
+        Parameters
+        ----------
+        generation: int
+            Die Generation der Sitzung. Ändert sie sich (reset(), neue Sitzung), endet der Task.
+        """
+
+        delay = client.RECONNECT_INITIAL_SEC
+        try:
+            while generation == self._session_generation:
+                try:
+                    if not self.connected:
+                        await self.connect(self.paired_device_ip, int(self.paired_device_port))
+                    if await self._resume_session(generation):
+                        return
+                except (OSError, ValueError):
+                    pass
+
+                await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+                delay = min(delay * 2, client.RECONNECT_MAX_SEC)
+        finally:
+            if self._reconnect_task is asyncio.current_task():
+                self._reconnect_task = None
+
+    async def _resume_session(self, generation: int) -> bool:
+        """
+        Setzt die Sitzung über die gerade aufgebaute Verbindung fort. Die Anfrage wird direkt
+        gesendet, da der Schreibtask bis zum Fortsetzen wartet. Danach wird auch das Abonnement
+        der Sensordaten erneuert.
+
+        Parameters
+        ----------
+        generation: int
+            Die Generation der Sitzung
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Wiederaufbau beendet ist (fortgesetzt oder Sitzung verloren),
+            False, falls es erneut versucht werden soll.
+        """
+
+        session_id = self.session_id
+        if session_id:
+            response = await self._request_direct(
+                client.CHANNEL_COMMAND, f'CMD{client.SEPARATOR}resume_session{client.SEPARATOR}{session_id}',
+                client.deadline_in(client.RESUME_TIMEOUT_SEC))
+            if not response:
+                self._mark_failed(self.socket, ConnectionError('No answer to resume_session'))
+                return False
+
+            if response.split(client.SEPARATOR)[1:2] != ['1']:
+                if generation != self._session_generation:
+                    return True
+                self._end_session()
+                self._close_socket()
+                self._set_state(client.STATE_DISCONNECTED)
+                self.on_session_lost.invoke()
+                return True
+
+        if generation != self._session_generation:
+            return True
+        if not self.connected:
+            return False
+        self._set_ready(True)
+        self._reconnect_task = None
+        self._set_state(client.STATE_CONNECTED)
+
+        if self.telemetry_rate_hz:
+            # Auf die Antwort wartet niemand, sie wird nur der Anfrage zugeordnet
+            self.send_request(client.CHANNEL_COMMAND,
+                              f'CMD{client.SEPARATOR}subscribe_telemetry{client.SEPARATOR}{self.telemetry_rate_hz}',
+                              lambda request_id, discard: client.PendingRequest(request_id, client.CHANNEL_COMMAND,
+                                                                                discard))
+        return True
+
+    async def _request_direct(self, channel: int, message: str, deadline: float):
+        """
+        Wie request(), sendet aber direkt über den Socket statt über den Schreibtask.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        message: str
+            Die Anfrage
+        deadline: float
+            Frist für die Antwort als time.monotonic()-Zeitpunkt
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Antwort oder der Grund, warum keine Antwort da ist.
+        """
+
+        s = self.socket
+        if s is None:
+            raise ConnectionResetError('Connection closed')
+
+        loop = self.loop_thread.loop
+        with self._lock:
+            request_id = self._allocate_request_id()
+            pending = _PendingFuture(request_id, channel, loop)
+            self._pending[request_id] = pending
+
+        frame = encode_frame(message.encode('utf-8'), channel, request_id)
+        try:
+            await loop.sock_sendall(s, frame)
+        except OSError as e:
+            self._discard_request(request_id)
+            self._mark_failed(s, e)
+            raise
+        self.statistics.record_sent(channel, len(frame))
+        if self.recorder is not None:
+            self.recorder.record(KIND_SENT, frame)
+        return await self._await_response(pending, deadline)
+
+    def _close_socket(self) -> None:
+        """
+        Kappt die Verbindung. Der Empfangstask wacht dadurch auf und schließt den Socket.
+        """
+
+        s = self.socket
+        self.socket = None
+        self.connected = False
+        self._ready = False
+
+        if s is not None:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _create_socket() -> socket.socket:
+        """
+        Erstellt einen nicht blockierenden TCP-Socket, bei dem das Betriebssystem tote Verbindungen
+        über Keep-alive-Pakete erkennt. Kleine Rahmen werden ohne Verzögerung durch
+        den Nagle-Algorithmus gesendet, zusammengefasst wird schon im Schreibtask.
+
+        Returns
+        -------
+        s: socket.socket
+            Der neue Socket
+        """
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(False)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # Nicht jedes Betriebssystem unterstützt die feineren Einstellungen
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, client.KEEPALIVE_IDLE_SEC)
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, client.KEEPALIVE_INTERVAL_SEC)
+        if hasattr(socket, 'TCP_KEEPCNT'):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, client.KEEPALIVE_COUNT)
+        return s
@@ -0,0 +1,235 @@
+# *********************** capture.py **************************
+# Mitschnitt des Datenverkehrs zwischen App und Drohne. Jeder
+# gesendete und empfangene Rahmen wird mit einem monotonen Zeitstempel
+# an eine Binärdatei angehängt, damit Probleme im Steuerkreis später
+# reproduziert werden können (siehe replay.py).
+#
+# Datei:    | MAGIC (5 Byte) | Eintrag | Eintrag | ...
+# Eintrag:  | Art (1 Byte) | Zeitstempel in µs (8 Byte) | Rahmen (siehe framing.py) |
+# Jeder Start eines Mitschnitts beginnt mit einem Eintrag KIND_SESSION, dessen
+# Nutzdaten die Unix-Zeit (double) enthalten. Zeitstempel sind nur innerhalb
+# eines Mitschnitts vergleichbar. Alle Zahlen sind big-endian.
+# *************************************************************
+
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from communication.framing import HEADER, Frame, encode_frame
+
+MAGIC = b'MSDC\x01'
+RECORD = struct.Struct('!BQ')
+WALL_TIME = struct.Struct('!d')
+
+KIND_SESSION = 0
+KIND_SENT = 1
+KIND_RECEIVED = 2
+KIND_DATAGRAM = 3
+KIND_NAMES = {KIND_SESSION: 'session', KIND_SENT: 'sent', KIND_RECEIVED: 'received', KIND_DATAGRAM: 'datagram'}
+
+# timestamp in Sekunden (time.monotonic() beim Mitschnitt)
+CaptureRecord = namedtuple('CaptureRecord', ['kind', 'timestamp', 'channel', 'request_id', 'payload'])
+
+
+class TrafficRecorder(object):
+    """
+    Hängt Rahmen an eine Mitschnittdatei an. Die Datei wird nur erweitert, ein bestehender
+    Mitschnitt bleibt erhalten. Die Methoden sind threadsicher, da Empfangs- und Schreibthread
+    des WLANClient gleichzeitig eintragen. Geschrieben wird gepuffert, damit das Mitschneiden
+    die Threads kaum aufhält.
+
+    Attributes
+    ----------
+    path: str
+        Der Pfad der Mitschnittdatei
+    records: int
+        Anzahl der seit dem Öffnen eingetragenen Rahmen
+
+    Methods
+    -------
+    record(kind, frame):
+        Trägt einen vollständigen, kodierten Rahmen ein.
+    record_frame(kind, frame):
+        Trägt einen dekodierten Rahmen ein (siehe framing.Frame).
+    flush():
+        Schreibt den Puffer in die Datei.
+    close():
+        Schreibt den Puffer und schließt die Datei.
+    """
+
+    def __init__(self, path: str):
+        """
+        Öffnet die Mitschnittdatei und beginnt einen neuen Mitschnitt.
+
+        Parameters
+        ----------
+        path: str
+            Der Pfad der Mitschnittdatei. Existiert sie noch nicht, wird sie erstellt.
+        """
+
+        self.path = path
+        self.records = 0
+
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self.record(KIND_SESSION, encode_frame(WALL_TIME.pack(time.time())))
+
+    def record(self, kind: int, frame: bytes) -> None:
+        """
+        Trägt einen vollständigen, kodierten Rahmen ein.
+
+        Parameters
+        ----------
+        kind: int
+            Die Art des Eintrags (KIND_*)
+        frame: bytes
+            Der Rahmen mit Rahmenkopf (siehe framing.encode_frame())
+        """
+
+        timestamp = RECORD.pack(kind, time.monotonic_ns() // 1000)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(timestamp)
+            self._file.write(frame)
+            self.records += 1
+
+    def record_frame(self, kind: int, frame: Frame) -> None:
+        """
+        Trägt einen dekodierten Rahmen ein. Die Nutzdaten dürfen ein memoryview auf den
+        Empfangspuffer sein, sie werden sofort geschrieben.
+
+        Parameters
+        ----------
+        kind: int
+            Die Art des Eintrags (KIND_*)
+        frame: Frame
+            Der Rahmen
+        """
+
+        timestamp = RECORD.pack(kind, time.monotonic_ns() // 1000)
+        header = HEADER.pack(len(frame.payload), frame.channel, frame.request_id)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(timestamp)
+            self._file.write(header)
+            self._file.write(frame.payload)
+            self.records += 1
+
+    def flush(self) -> None:
+        """
+        Schreibt den Puffer in die Datei.
+        """
+
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        """
+        Schreibt den Puffer und schließt die Datei. Weitere Einträge werden ignoriert.
+        """
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
+
+
+def read_capture(path: str):
+    """
+    Liest alle Einträge einer Mitschnittdatei der Reihe nach. Ein unvollständiger letzter
+    Eintrag (z.B. nach einem Absturz der App) wird ignoriert.
+
+    Parameters
+    ----------
+    path: str
+        Der Pfad der Mitschnittdatei
+
+    Returns
+    -------
+    <nameless>: generator
+        Die Einträge als CaptureRecord, die Nutzdaten als bytes
+    """
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a capture file')
+
+        while True:
+            head = file.read(RECORD.size + HEADER.size)
+            if len(head) < RECORD.size + HEADER.size:
+                return
+            kind, timestamp_us = RECORD.unpack_from(head)
+            length, channel, request_id = HEADER.unpack_from(head, RECORD.size)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield CaptureRecord(kind, timestamp_us / 1e6, channel, request_id, payload)
+
+
+def read_sessions(path: str) -> list:
+    """
+    Teilt eine Mitschnittdatei in die einzelnen Mitschnitte auf.
+
+    Parameters
+    ----------
+    path: str
+        Der Pfad der Mitschnittdatei
+
+    Returns
+    -------
+    sessions: list
+        Pro Mitschnitt die Liste seiner Einträge, jeweils beginnend mit dem KIND_SESSION-Eintrag.
+    """
+
+    sessions = []
+    for record in read_capture(path):
+        if record.kind == KIND_SESSION or not sessions:
+            sessions.append([])
+        sessions[-1].append(record)
+    return sessions
+
+
+def session_wall_time(record: CaptureRecord) -> float:
+    """
+    Gibt die Unix-Zeit zurück, zu der ein Mitschnitt begonnen hat.
+
+    Parameters
+    ----------
+    record: CaptureRecord
+        Der KIND_SESSION-Eintrag
+
+    Returns
+    -------
+    <nameless>: float
+        Die Unix-Zeit oder None, falls es kein gültiger KIND_SESSION-Eintrag ist.
+    """
+
+    if record.kind != KIND_SESSION or len(record.payload) != WALL_TIME.size:
+        return None
+    return WALL_TIME.unpack(record.payload)[0]
+
+
+def default_capture_path(directory: str = '.') -> str:
+    """
+    Gibt einen Dateinamen für einen neuen Mitschnitt zurück.
+
+    Parameters
+    ----------
+    directory: str, optional
+        default: '.'
+        Das Verzeichnis
+
+    Returns
+    -------
+    <nameless>: str
+        Der Pfad, z.B. './capture-20240101-120000.msdc'
+    """
+
+    return os.path.join(directory, time.strftime('capture-%Y%m%d-%H%M%S.msdc'))
@@ -3,56 +3,416 @@
 # ************************************************************
 
 import socket
+import threading
+import time
+
+from communication import async_client
+from communication.framing import NO_REQUEST_ID
 
 # Konstanten
-from typing import Union
+KEEPALIVE_IDLE_SEC = 5
+KEEPALIVE_INTERVAL_SEC = 2
+KEEPALIVE_COUNT = 3
+
+SERVER_HOSTNAME = 'espressif'
+SERVER_PORT = 9192
+ADDRESS_TTL_SEC = 300
+CONNECT_TIMEOUT_SEC = 2
+
+# Wiederaufbau einer abgebrochenen Sitzung: Wartezeit verdoppelt sich bis zum Maximum
+RECONNECT_INITIAL_SEC = 0.05
+RECONNECT_MAX_SEC = 0.5
+RECONNECT_WAIT_SEC = 2
+RESUME_TIMEOUT_SEC = 1
+
+# Zustände der Verbindung
+STATE_DISCONNECTED = 'disconnected'
+STATE_CONNECTING = 'connecting'
+STATE_CONNECTED = 'connected'
+STATE_RECONNECTING = 'reconnecting'
+
+# Der Schreibtask fasst bereits wartende Rahmen bis zu dieser Größe zu einem Aufruf zusammen
+MAX_COALESCE_BYTES = 16 * 1024
+RESET_FLUSH_SEC = 0.2
+
+# Logische Kanäle, die sich eine Verbindung teilen
+CHANNEL_COMMAND = 0
+CHANNEL_CONTROL = 1
+CHANNEL_SENSOR = 2
+CHANNEL_CONNECTION = 3
+
+SEPARATOR = '|'
+
+
+def deadline_in(seconds: float) -> float:
+    """
+    Berechnet eine Frist für die Empfangsmethoden, die in 'seconds' Sekunden abläuft.
+
+    Parameters
+    ----------
+    seconds: float
+        Die Dauer in Sekunden
+
+    Returns
+    -------
+    <nameless>: float
+        Die Frist als time.monotonic()-Zeitpunkt
+    """
+
+    return time.monotonic() + seconds
+
+
+class ReceiveInterrupt(object):
+    """
+    Basisklasse für die Ergebnisse der Empfangsmethoden, wenn keine Nachricht angekommen ist.
+    Die Objekte sind 'falsy', sodass man einfach mit 'if not response' prüfen kann.
+
+    Attributes
+    ----------
+    channel: int
+        Der Kanal, auf dem gewartet wurde.
+    """
+
+    __slots__ = ('channel',)
+
+    def __init__(self, channel: int):
+        self.channel = channel
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(channel={self.channel})'
+
+
+class ReceiveTimeout(ReceiveInterrupt):
+    """
+    Die Frist ist abgelaufen, bevor eine passende Nachricht angekommen ist.
+    """
+
+    __slots__ = ()
+
+
+class ReceiveCancelled(ReceiveInterrupt):
+    """
+    Das Warten wurde über WLANClient.cancel_receive() abgebrochen, z.B. weil der Thread gestoppt wird.
+    """
+
+    __slots__ = ()
+
+
+class PendingRequest(object):
+    """
+    Eine gesendete Anfrage, deren Antwort noch aussteht. Die Antwort wird vom Empfangstask
+    anhand der Anfrage-ID zugeordnet, egal in welcher Reihenfolge die Antworten ankommen.
+
+    Attributes
+    ----------
+    request_id: int
+        Die Anfrage-ID
+    channel: int
+        Der Kanal, über den die Anfrage gesendet wurde.
+    sent_at: float
+        Zeitpunkt (time.monotonic()) zu dem die Anfrage gesendet wurde.
+
+    Methods
+    -------
+    done():
+        Ist die Antwort schon da?
+    result(deadline=None):
+        Wartet bis zur Frist auf die Antwort und gibt sie zurück.
+    cancel():
+        Bricht das Warten auf die Antwort ab.
+    """
+
+    def __init__(self, request_id: int, channel: int, discard=None):
+        """
+        Erstellt alle nötigen Variablen für die PendingRequest-Klasse.
+
+        Parameters
+        ----------
+        request_id: int
+            Die Anfrage-ID
+        channel: int
+            Der Kanal
+        discard: method, optional
+            default: None
+            Wird mit der Anfrage-ID aufgerufen, wenn niemand mehr auf die Antwort wartet, und
+            mit timed_out=True, falls das an einer abgelaufenen Frist lag.
+        """
+
+        self.request_id = request_id
+        self.channel = channel
+        self.sent_at = time.monotonic()
+
+        self._discard = discard
+
+        self._event = threading.Event()
+        self._response = None
+        self._error = None
+
+    def done(self) -> bool:
+        """
+        Gibt zurück, ob die Antwort (oder ein Fehler) schon da ist.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls result() nicht mehr blockiert.
+        """
+
+        return self._event.is_set()
+
+    def result(self, deadline: float = None):
+        """
+        Wartet auf die Antwort und gibt sie zurück.
+
+        Parameters
+        ----------
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt (siehe deadline_in()). None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Antwort oder der Grund, warum keine Antwort da ist.
+        """
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not self._event.wait(timeout):
+            # Eine spätere Antwort wird dann wie eine normale Nachricht behandelt
+            self._release(timed_out=True)
+            return ReceiveTimeout(self.channel)
+        if self._error is not None:
+            raise self._error
+        return self._response
+
+    def cancel(self) -> None:
+        """
+        Bricht das Warten ab. result() gibt dann ReceiveCancelled zurück.
+        """
+
+        self._release()
+        self._response = ReceiveCancelled(self.channel)
+        self._event.set()
+
+    def _release(self, timed_out: bool = False) -> None:
+        """
+        Meldet dem Client, dass niemand mehr auf die Antwort wartet.
+
+        Parameters
+        ----------
+        timed_out: bool, optional
+            default: False
+            Wurde die Frist überschritten?
+        """
+
+        if self._discard is not None:
+            self._discard(self.request_id, timed_out)
 
-SIZE = 1024
+    def set_response(self, response: str) -> None:
+        """
+        Wird vom Empfangstask aufgerufen, sobald die Antwort angekommen ist.
+
+        Parameters
+        ----------
+        response: str
+            Die Antwort
+        """
+
+        self._response = response
+        self._event.set()
+
+    def set_error(self, error: Exception) -> None:
+        """
+        Beendet die Anfrage mit einem Fehler, z.B. weil die Verbindung abgebrochen ist.
+
+        Parameters
+        ----------
+        error: Exception
+            Der Fehler, den result() auslösen soll.
+        """
+
+        self._error = error
+        self._event.set()
+
+
+def _delegate(name: str, writable: bool = False) -> property:
+    """
+    Erstellt eine Eigenschaft, die das gleichnamige Attribut des AsyncWLANClient liest (und schreibt).
+
+    Parameters
+    ----------
+    name: str
+        Der Name des Attributs
+    writable: bool, optional
+        default: False
+        Darf das Attribut auch gesetzt werden?
+
+    Returns
+    -------
+    <nameless>: property
+        Die Eigenschaft
+    """
+
+    def getter(self):
+        return getattr(self.engine, name)
+
+    def setter(self, value):
+        setattr(self.engine, name, value)
+
+    return property(getter, setter if writable else None)
 
 
 class WLANClient(object):
     """
     Klasse für die Kommunikation über WLAN
     Die Kommunikation soll dabei nur mit einen Gerät stattfinden (ESP32).
+    Die eigentliche Kommunikation übernimmt ein AsyncWLANClient (siehe async_client.py), dessen
+    Verbindung, Empfangen, Senden und Wiederaufbau als Coroutinen in einer gemeinsamen
+    Ereignisschleife laufen. Diese Klasse ist die blockierende Schnittstelle dazu für Threads
+    außerhalb der Schleife (z.B. den Steuerthread oder die Konfigurationsabgleichung):
+    Die Methoden warten auf das Ergebnis, ohne dass dafür eigene Empfangs- oder Schreibthreads nötig sind.
+    Beide teilen sich dieselbe Verbindung, dieselben Warteschlangen und dieselben Messwerte.
+    send_message() reiht den Rahmen nur ein und kehrt sofort zurück, sodass die Oberfläche nie auf
+    das Netzwerk wartet. Anfragen über request() tragen eine Anfrage-ID, sodass mehrere gleichzeitig
+    offen sein können.
 
     Attributes
     ----------
-    socket: Any
-        Socket, worüber Nachrichten gesendet und empfangen werden-
+    engine: AsyncWLANClient
+        Der asynchrone Client, der die eigentliche Kommunikation übernimmt.
+    socket: socket.socket
+        Socket, worüber Nachrichten gesendet und empfangen werden.
     paired_device_ip: str
-        Die IP-Adresse des Zielgerätes(ESP32)-
+        Die IP-Adresse des Zielgerätes(ESP32).
     paired_device_port: int
-        Der Port des Zielgerätes(ESP32)-
+        Der Port des Zielgerätes(ESP32).
+    connected: bool
+        Besteht die Verbindung?
+    last_activity: float
+        Zeitpunkt (time.monotonic()) der letzten erfolgreichen Übertragung.
+    error_count: int
+        Anzahl der aufgetretenen Übertragungsfehler.
+    datagram_socket: socket.socket
+        Optionaler UDP-Socket für den Steuerdatenstrom, bei dem nur der neueste Wert zählt.
+    datagram_address: tuple(str, int)
+        Das Ziel des UDP-Sockets.
+    telemetry_rate_hz: float
+        Die Rate, mit der die Drohne die Sensordaten sendet, oder 0, falls sie abgefragt werden müssen.
+    known_address: tuple(str, int)
+        Die zuletzt funktionierende Adresse der Drohne aus einer früheren Sitzung, z.B. aus der Konfiguration.
+        Sie wird beim Kaltstart zuerst versucht, bevor der Hostname aufgelöst wird.
+    on_address_resolved: EventHandler
+        Wird mit IP-Adresse und Port ausgelöst, sobald eine Verbindung zu einer neuen Adresse
+        gelungen ist, damit sie gespeichert werden kann.
+    statistics: LinkStatistics
+        Bytes, Nachrichten, Fehler und Antwortzeiten pro Kanal (siehe metrics.py).
+    state: str
+        Der Zustand der Verbindung (STATE_DISCONNECTED, STATE_CONNECTING, STATE_CONNECTED, STATE_RECONNECTING).
+    on_state_changed: EventHandler
+        Wird mit dem neuen Zustand ausgelöst. Die Funktionen laufen in der Ereignisschleife
+        und dürfen nicht blockieren.
+    session_id: str
+        Die Sitzungs-ID der Registrierung oder None ohne Sitzung. Eine leere ID bedeutet, dass die
+        Drohne keine Sitzungen kennt und nach dem Wiederaufbau nur die Verbindung zählt.
+    on_session_lost: EventHandler
+        Wird ausgelöst, wenn die Drohne die Sitzung beim Fortsetzen nicht mehr kennt.
+        Dann muss sich die App neu registrieren.
+    recorder: TrafficRecorder
+        Schneidet alle gesendeten und empfangenen Rahmen mit oder None (siehe capture.py).
 
     Methods
     -------
     connect(address, port):
-        Erstellt ein Socket und speichert die IP und den Port.
-    send_message(message):
-        Sendet eine Nachricht über den Socket.
-    wait_for_response(self, flag='', only_paired_device=False):
-        Wartet bis eine Nachricht angekommen ist.
+        Baut die Verbindung auf, sofern sie noch nicht besteht.
+    start_session(session_id):
+        Merkt sich die Sitzung nach der Registrierung und schaltet den automatischen Wiederaufbau ein.
+    is_connected():
+        Gibt zurück, ob die Verbindung besteht.
+    send_message(channel, message):
+        Sendet eine Nachricht über einen Kanal.
+    send_bytes(channel, payload):
+        Sendet binäre Nutzdaten über einen Kanal.
+    flush(deadline=None):
+        Wartet, bis alle eingereihten Rahmen gesendet wurden.
+    request(channel, message):
+        Sendet eine Anfrage mit Anfrage-ID, ohne auf die Antwort zu warten.
+    subscribe_telemetry(rate_hz):
+        Bittet die Drohne, die Sensordaten selbstständig zu senden.
+    unsubscribe_telemetry():
+        Beendet das selbstständige Senden der Sensordaten.
+    open_datagram(address, port):
+        Öffnet den UDP-Kanal für den Steuerdatenstrom.
+    send_datagram(payload):
+        Sendet ein einzelnes Datagramm über den UDP-Kanal.
+    close_datagram():
+        Schließt den UDP-Kanal.
+    wait_for_response(channel, flag='', deadline=None):
+        Wartet bis zur Frist, bis eine Nachricht auf dem Kanal angekommen ist.
+    wait_for_latest_response(channel, flag='', deadline=None):
+        Wie wait_for_response(), gibt aber bei mehreren Nachrichten nur die neueste zurück.
+    cancel_receive(channel=None):
+        Bricht wartende Empfangsaufrufe ab.
+    has_pending_response(channel):
+        Liegt bereits eine vollständige Nachricht für den Kanal bereit?
     reset():
         Setzt den Client zurück und kappt die Verbindung.
     get_ip_address():
         Gibt die IP-Adresse im momentanen Netzwerk zurück.
+    get_server_address():
+        Gibt die (zwischengespeicherte) Adresse der Drohne zurück.
+    invalidate_server_address():
+        Verwirft die zwischengespeicherte Adresse der Drohne.
+    get_statistics():
+        Gibt eine Kopie der Messwerte aller Kanäle zurück.
+    start_capture(path):
+        Beginnt einen Mitschnitt aller Rahmen.
+    stop_capture():
+        Beendet den Mitschnitt.
     """
 
-    def __init__(self):
+    socket = _delegate('socket')
+    paired_device_ip = _delegate('paired_device_ip')
+    paired_device_port = _delegate('paired_device_port')
+    connected = _delegate('connected')
+    last_activity = _delegate('last_activity')
+    error_count = _delegate('error_count')
+    datagram_socket = _delegate('datagram_socket')
+    datagram_address = _delegate('datagram_address')
+    telemetry_rate_hz = _delegate('telemetry_rate_hz')
+    known_address = _delegate('known_address', writable=True)
+    state = _delegate('state')
+    session_id = _delegate('session_id')
+    recorder = _delegate('recorder')
+
+    def __init__(self, engine=None):
         """
         Erstellt alle nötigen Variablen für die WLANClient-Klasse.
+
+        Parameters
+        ----------
+        engine: AsyncWLANClient, optional
+            default: None
+            Der asynchrone Client, z.B. um ihn mit Coroutinen in derselben Ereignisschleife zu teilen.
+            Ohne wird ein eigener mit eigener Ereignisschleife erstellt.
         """
 
-        self.sockets = []
-        self.paired_device_ips = []
-        self.paired_device_ports = []
+        if engine is None:
+            engine = async_client.AsyncWLANClient()
 
-        self._first_msgs = []
+        self.engine = engine
+        self.statistics = engine.statistics
+        self.on_state_changed = engine.on_state_changed
+        self.on_session_lost = engine.on_session_lost
+        self.on_address_resolved = engine.on_address_resolved
 
-    def connect(self, address: str, port: int, index: int = None) -> None:
+    def connect(self, address: str, port: int) -> None:
         """
-        Erstellt eine Verbindung mithilfe der IP-Adresse und dem Port über einem Socket
-        und speichert die Daten.
+        Erstellt eine Verbindung mithilfe der IP-Adresse und dem Port und wartet, bis sie besteht.
+        Besteht die Verbindung zu derselben Adresse bereits, wird sie weiterverwendet.
+        Besteht eine Sitzung, wird sie danach im Hintergrund fortgesetzt.
 
         Parameters
         ----------
@@ -60,98 +420,275 @@ class WLANClient(object):
             Die IP-Adresse des Zielgerätes(ESP32)
         port: int
             Der Port des Zielgerätes(ESP32)
-        index: int, optional
-            default: None
-            Der Index des Sockets
-        """
-        if index is None:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((address, port))
-            self.sockets.append(s)
-
-            self.paired_device_ips.append(address)
-            self.paired_device_ports.append(port)
-            self._first_msgs.append(False)
-        elif index >= 0:
-            if len(self.sockets) - 1 < index:
-                for _ in range(index - (len(self.sockets) - 1)):
-                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self.paired_device_ips.append(None)
-                    self.paired_device_ports.append(None)
-                    self._first_msgs.append(False)
-                    self.sockets.append(s)
-
-            self.sockets[index].connect((address, port))
-            self.paired_device_ips[index] = address
-            self.paired_device_ports[index] = port
-            self._first_msgs[index] = False
-
-    def send_message(self, index: int, message: str) -> None:
-        """
-        Sendet eine Nachricht über den Socket. Setzt voraus, dass ein Socket
-        mithilfe der connect()-Methode erstellt wurde.
+        """
+
+        self._run(self.engine.connect(address, port))
+
+    def is_connected(self) -> bool:
+        """
+        Gibt zurück, ob die Verbindung besteht.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Verbindung besteht.
+        """
+
+        return self.engine.is_connected()
+
+    def start_session(self, session_id: str) -> None:
+        """
+        Merkt sich die Sitzung, die die Drohne bei der Registrierung vergeben hat (REGISTER|1|<ID>).
+        Ab jetzt wird eine abgebrochene Verbindung automatisch wieder aufgebaut und die Sitzung
+        fortgesetzt. reset() beendet die Sitzung.
 
         Parameters
         ----------
-        index: int
-            Der Index des Sockets worüber die Nachricht gesendet werden soll.
+        session_id: str
+            Die Sitzungs-ID, leer bei einer Drohne ohne Sitzungen.
+        """
+
+        self._run(self.engine.start_session(session_id))
+
+    def send_message(self, channel: int, message: str) -> None:
+        """
+        Reiht eine Nachricht zum Senden über einen Kanal ein und kehrt sofort zurück.
+        Setzt voraus, dass eine Verbindung mithilfe der connect()-Methode erstellt wurde.
+        Ist die Verbindung zuvor abgebrochen, baut der Schreibtask sie mit den gespeicherten
+        Daten wieder auf. Schlägt das Senden fehl, bekommen die offenen Anfragen den Fehler.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Nachricht gesendet werden soll (z.B. CHANNEL_COMMAND).
         message: str
             Die Nachricht
         """
 
-        # Erst nach der ersten Nachricht macht das zurücksetzen ein Sinn
-        if self._first_msgs[index]:
-            ip = self.paired_device_ips[index]
-            port = self.paired_device_ports[index]
+        self.engine.send_message(channel, message)
+
+    def send_bytes(self, channel: int, payload: bytes, request_id: int = NO_REQUEST_ID) -> None:
+        """
+        Sendet binäre Nutzdaten als einen Rahmen über einen Kanal (siehe send_message()).
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Nutzdaten gesendet werden sollen.
+        payload: bytes
+            Die Nutzdaten, z.B. ein Steuerrahmen aus codec.py
+        request_id: int, optional
+            default: NO_REQUEST_ID
+            Die Anfrage-ID, normalerweise von request() vergeben.
+        """
+
+        self.engine.send_bytes(channel, payload, request_id)
+
+    def flush(self, deadline: float = None) -> bool:
+        """
+        Wartet, bis der Schreibtask alle bisher eingereihten Rahmen gesendet (oder verworfen) hat,
+        z.B. bevor die App beendet wird.
+
+        Parameters
+        ----------
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt (siehe deadline_in()). None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Warteschlange rechtzeitig leer wurde.
+        """
+
+        return self._run(self.engine.flush(deadline))
 
-            self.reset(index)
-            if str(port).isnumeric():
-                self.connect(ip, int(port), index)
+    def request(self, channel: int, message: str) -> PendingRequest:
+        """
+        Sendet eine Anfrage (z.B. 'CMD|get_sensor_data') mit einer neuen Anfrage-ID und kehrt sofort zurück.
+        Die Antwort wird anhand der ID zugeordnet und kann über PendingRequest.result() abgeholt werden.
+        Es können beliebig viele Anfragen gleichzeitig offen sein.
 
-        self.sockets[index].send(message.encode('utf-8'))
-        self._first_msgs[index] = True
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, worüber die Anfrage gesendet werden soll.
+        message: str
+            Die Anfrage
 
-    def wait_for_response(self, index: int, flag: str = '') -> str:
+        Returns
+        -------
+        pending: PendingRequest
+            Die offene Anfrage
         """
-        Sendet eine Nachricht über den Socket. Setzt voraus, dass ein Socket
+
+        return self.engine.send_request(channel, message,
+                                        lambda request_id, discard: PendingRequest(request_id, channel, discard))
+
+    def subscribe_telemetry(self, rate_hz: float) -> PendingRequest:
+        """
+        Bittet die Drohne, die Sensordaten (GEODATA) mit der angegebenen Rate selbstständig über
+        CHANNEL_SENSOR zu senden, statt dass sie jedes Mal abgefragt werden müssen.
+        Die Drohne antwortet mit SUBSCRIBE|1|<Rate>, wobei sie die Rate begrenzen kann.
+
+        Parameters
+        ----------
+        rate_hz: float
+            Die gewünschte Rate in Hz
+
+        Returns
+        -------
+        pending: PendingRequest
+            Die offene Anfrage. Die Antwort enthält die ausgehandelte Rate.
+        """
+
+        self.engine.telemetry_rate_hz = rate_hz
+        return self.request(CHANNEL_COMMAND, f'CMD{SEPARATOR}subscribe_telemetry{SEPARATOR}{rate_hz}')
+
+    def unsubscribe_telemetry(self) -> None:
+        """
+        Beendet das selbstständige Senden der Sensordaten (siehe subscribe_telemetry()).
+        """
+
+        self.engine.unsubscribe_telemetry()
+
+    def open_datagram(self, address: str, port: int) -> None:
+        """
+        Öffnet einen UDP-Socket für Daten, bei denen nur der neueste Wert zählt (Joysticks).
+        Geht ein Paket verloren, wird es nicht erneut gesendet und hält so auch keine späteren Pakete auf.
+
+        Parameters
+        ----------
+        address: str
+            Die IP-Adresse des Zielgerätes(ESP32)
+        port: int
+            Der UDP-Port des Zielgerätes(ESP32)
+        """
+
+        self.engine.open_datagram(address, port)
+
+    def send_datagram(self, payload: bytes) -> None:
+        """
+        Sendet die Nutzdaten als ein einzelnes Datagramm. Setzt voraus, dass der UDP-Kanal
+        mithilfe der open_datagram()-Methode geöffnet wurde.
+
+        Parameters
+        ----------
+        payload: bytes
+            Die Nutzdaten, z.B. ein Steuerrahmen aus codec.py
+        """
+
+        self.engine.send_datagram(payload)
+
+    def close_datagram(self) -> None:
+        """
+        Schließt den UDP-Socket, sofern er geöffnet wurde.
+        """
+
+        self.engine.close_datagram()
+
+    def wait_for_response(self, channel: int, flag: str = '', deadline: float = None):
+        """
+        Wartet auf eine vollständige Nachricht auf dem Kanal. Setzt voraus, dass eine Verbindung
         mithilfe der connect()-Methode erstellt wurde.
+        Nachrichten, die die Zeichenkette nicht enthalten, werden verworfen.
+        Das Warten endet spätestens mit der Frist oder sobald cancel_receive() aufgerufen wird.
 
         Parameters
         ----------
-        index: int:
-            Der Index des Sockets, worüber die Nachricht erwartet wird.
+        channel: int:
+            Der Kanal, worüber die Nachricht erwartet wird.
         flag: str, optional:
             default: ''
             Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist als time.monotonic()-Zeitpunkt (siehe deadline_in()). None wartet unbegrenzt.
+
+        Returns
+        -------
+        <nameless>: str, ReceiveTimeout oder ReceiveCancelled
+            Die Nachricht oder der Grund, warum keine Nachricht da ist.
         """
 
-        while True:
-            data = self.sockets[index].recv(1024).decode('utf-8')
-            if data:
-                if flag != '':
-                    return data
-                else:
-                    if flag in data:
-                        return data
+        # Nur wenn die Verbindung erst wieder aufgebaut werden muss, geht es über die Ereignisschleife
+        if not self.engine.is_ready():
+            self._run(self.engine.ensure_connected(deadline))
+        return self.engine.get_inbox(channel).receive_blocking(flag, deadline)
 
-    def reset(self, index: Union[int, None] = None) -> None:
+    def cancel_receive(self, channel: int = None) -> None:
         """
-        Setzt den Client zurück.
+        Bricht alle Threads ab, die gerade auf eine Nachricht oder Antwort auf dem Kanal warten.
+        Sie bekommen ReceiveCancelled zurück. Kann z.B. an DisposableLoopThread.on_finished_events
+        gehängt werden, damit stop() auch einen wartenden Thread sofort beendet.
+
+        Parameters
+        ----------
+        channel: int, optional
+            default: None
+            Der Kanal. Ohne werden alle Kanäle abgebrochen.
         """
 
-        if index is None:
-            for i in range(len(self.sockets)):
-                self.sockets[i].close()
-                self.sockets[i] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.paired_device_ips[i] = ''
-                self.paired_device_ports[i] = ''
-        elif len(self.sockets) - 1 < index:
-            return
-        else:
-            self.sockets[index].close()
-            self.sockets[index] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.paired_device_ips[index] = ''
-            self.paired_device_ports[index] = ''
+        self.engine.cancel_receive(channel)
+
+    def wait_for_latest_response(self, channel: int, flag: str = '', deadline: float = None):
+        """
+        Wartet wie wait_for_response() auf eine Nachricht. Liegen danach schon weitere
+        Nachrichten bereit, werden die älteren übersprungen und nur die neueste zurückgegeben.
+        Gedacht für Daten, bei denen nur der aktuelle Wert zählt (z.B. GEODATA).
+
+        Parameters
+        ----------
+        channel: int:
+            Der Kanal, worüber die Nachricht erwartet wird.
+        flag: str, optional:
+            default: ''
+            Eine Zeichenkette, die die Nachricht zu beinhalten hat.
+        deadline: float, optional
+            default: None
+            Frist für die erste Nachricht (siehe wait_for_response()).
+
+        Returns
+        -------
+        data: str, ReceiveTimeout oder ReceiveCancelled
+            Die neueste Nachricht oder der Grund, warum keine Nachricht da ist.
+        """
+
+        data = self.wait_for_response(channel, flag, deadline)
+        while data and self.has_pending_response(channel):
+            newer = self.wait_for_response(channel, flag, deadline=time.monotonic())
+            if isinstance(newer, ReceiveCancelled):
+                return newer
+            if newer:
+                data = newer
+        return data
+
+    def has_pending_response(self, channel: int) -> bool:
+        """
+        Prüft, ob bereits eine vollständige Nachricht empfangen wurde, die
+        wait_for_response() ohne zu blockieren zurückgeben würde.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls eine Nachricht bereitliegt.
+        """
+
+        return self.engine.has_pending_response(channel)
+
+    def reset(self) -> None:
+        """
+        Setzt den Client zurück. Die Verbindung und der UDP-Kanal werden geschlossen und
+        noch nicht abgeholte Nachrichten verworfen. Eingereihte Rahmen (z.B. ein letztes 'CMD|reset')
+        bekommen kurz Zeit, gesendet zu werden, der Rest wird verworfen.
+        """
+
+        self._run(self.engine.reset())
 
     @staticmethod
     def get_ip_address() -> str:
@@ -167,14 +704,73 @@ class WLANClient(object):
         h_name = socket.gethostname()
         return socket.gethostbyname(h_name)
 
-    @staticmethod
-    def get_server_address() -> (str, int):
+    def get_server_address(self) -> (str, int):
         """
-        Gibt die IP-Adresse und den Port des Servers zurück, der gehardcoded wurde.
+        Gibt die IP-Adresse und den Port des Servers zurück, dessen Hostname gehardcoded wurde
+        (siehe AsyncWLANClient.get_server_address()).
 
         Returns
         -------
         <nameless>: tuple(str, int)
             Die Adresse und den Port
         """
-        return socket.gethostbyname('espressif'), 9192
+
+        return self._run(self.engine.get_server_address())
+
+    def invalidate_server_address(self) -> None:
+        """
+        Verwirft die zwischengespeicherte und die zuletzt funktionierende Adresse,
+        sodass get_server_address() den Hostnamen erneut auflöst.
+        """
+
+        self.engine.invalidate_server_address()
+
+    def get_statistics(self) -> dict:
+        """
+        Gibt eine Kopie der Messwerte aller Kanäle zurück (siehe LinkStatistics.snapshot()).
+        Mit metrics.link_quality() lässt sich daraus eine Verbindungsqualität von 0 bis 100 berechnen.
+
+        Returns
+        -------
+        <nameless>: dict
+            Kanal -> Messwerte
+        """
+
+        return self.engine.get_statistics()
+
+    def start_capture(self, path: str) -> None:
+        """
+        Beginnt einen Mitschnitt aller gesendeten und empfangenen Rahmen (siehe capture.py).
+        Ein laufender Mitschnitt wird vorher beendet.
+
+        Parameters
+        ----------
+        path: str
+            Der Pfad der Mitschnittdatei. Eine bestehende Datei wird erweitert.
+        """
+
+        self.engine.start_capture(path)
+
+    def stop_capture(self) -> None:
+        """
+        Beendet den Mitschnitt, sofern einer läuft, und schreibt ihn vollständig in die Datei.
+        """
+
+        self.engine.stop_capture()
+
+    def _run(self, coroutine):
+        """
+        Führt eine Coroutine des AsyncWLANClient in dessen Ereignisschleife aus und wartet auf das Ergebnis.
+
+        Parameters
+        ----------
+        coroutine: coroutine
+            Die Coroutine
+
+        Returns
+        -------
+        <nameless>: any
+            Das Ergebnis der Coroutine
+        """
+
+        return self.engine.loop_thread.run(coroutine)
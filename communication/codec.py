@@ -0,0 +1,223 @@
+# *********************** codec.py **************************
+# Binäres Format für die Steuerdaten der Joysticks.
+# Statt zwei Textnachrichten (RJ|x|y, LJ|x|y) wird ein Rahmen mit
+# fester Größe gesendet, den App und Drohne gleich kodieren/dekodieren.
+#
+# Format (15 Byte, big-endian):
+# | Typ (1) | Sequenznummer (2) | Zeitstempel in ms (4) | RJ x (2) | RJ y (2) | LJ x (2) | LJ y (2) |
+#
+# Über UDP wird genau ein Steuerrahmen pro Datagramm gesendet (ohne Längenkopf).
+# Der Empfänger verwirft mit dem SequenceFilter veraltete oder vertauschte Pakete.
+# ***********************************************************
+
+import struct
+import time
+from collections import namedtuple
+
+CONTROL_FRAME_TYPE = 0x01
+CONTROL_FRAME = struct.Struct('!BHIhhhh')
+
+AXIS_SCALE = 32767
+SEQUENCE_MODULO = 0x10000
+TIMESTAMP_MODULO = 0x100000000
+
+ControlFrame = namedtuple('ControlFrame', ['sequence', 'timestamp_ms', 'right', 'left'])
+
+
+def quantize_axis(value: float) -> int:
+    """
+    Wandelt einen Achsenwert von -1 bis 1 in eine vorzeichenbehaftete 16-Bit Ganzzahl um.
+
+    Parameters
+    ----------
+    value: float
+        Der Achsenwert. Werte außerhalb von -1 bis 1 werden begrenzt.
+
+    Returns
+    -------
+    <nameless>: int
+        Der quantisierte Wert von -32767 bis 32767
+    """
+
+    value = max(min(value, 1.0), -1.0)
+    return int(round(value * AXIS_SCALE))
+
+
+def dequantize_axis(value: int) -> float:
+    """
+    Gegenstück zu quantize_axis().
+
+    Parameters
+    ----------
+    value: int
+        Der quantisierte Wert
+
+    Returns
+    -------
+    <nameless>: float
+        Der Achsenwert von -1 bis 1
+    """
+
+    return value / AXIS_SCALE
+
+
+def timestamp_ms() -> int:
+    """
+    Gibt einen monotonen Zeitstempel in Millisekunden zurück, der in 32 Bit passt.
+
+    Returns
+    -------
+    <nameless>: int
+        Der Zeitstempel
+    """
+
+    return int(time.monotonic() * 1000) % TIMESTAMP_MODULO
+
+
+def is_control_frame(payload: bytes) -> bool:
+    """
+    Prüft, ob die Nutzdaten ein binärer Steuerrahmen sind.
+    Textnachrichten beginnen immer mit einem druckbaren Zeichen und können so unterschieden werden.
+
+    Parameters
+    ----------
+    payload: bytes
+        Die Nutzdaten
+
+    Returns
+    -------
+    <nameless>: bool
+        True, falls es sich um einen Steuerrahmen handelt.
+    """
+
+    return len(payload) == CONTROL_FRAME.size and payload[0] == CONTROL_FRAME_TYPE
+
+
+def encode_control_frame(sequence: int, timestamp: int, right: (float, float), left: (float, float)) -> bytes:
+    """
+    Kodiert die Positionen beider Joysticks in einen Steuerrahmen.
+
+    Parameters
+    ----------
+    sequence: int
+        Die fortlaufende Sequenznummer (wird auf 16 Bit gekürzt).
+    timestamp: int
+        Der Zeitstempel in Millisekunden (wird auf 32 Bit gekürzt).
+    right: tuple(float, float)
+        Relative Position des rechten Joysticks
+    left: tuple(float, float)
+        Relative Position des linken Joysticks
+
+    Returns
+    -------
+    <nameless>: bytes
+        Der Steuerrahmen
+    """
+
+    return CONTROL_FRAME.pack(CONTROL_FRAME_TYPE,
+                              sequence % SEQUENCE_MODULO,
+                              timestamp % TIMESTAMP_MODULO,
+                              quantize_axis(right[0]), quantize_axis(right[1]),
+                              quantize_axis(left[0]), quantize_axis(left[1]))
+
+
+def decode_control_frame(payload: bytes) -> ControlFrame:
+    """
+    Dekodiert einen Steuerrahmen.
+
+    Parameters
+    ----------
+    payload: bytes
+        Die Nutzdaten
+
+    Returns
+    -------
+    <nameless>: ControlFrame
+        Sequenznummer, Zeitstempel und die Positionen beider Joysticks
+    """
+
+    if not is_control_frame(payload):
+        raise ValueError('payload is not a control frame')
+
+    _, sequence, timestamp, rx, ry, lx, ly = CONTROL_FRAME.unpack(payload)
+    return ControlFrame(sequence, timestamp,
+                        (dequantize_axis(rx), dequantize_axis(ry)),
+                        (dequantize_axis(lx), dequantize_axis(ly)))
+
+
+def is_newer_sequence(sequence: int, last_sequence: int) -> bool:
+    """
+    Vergleicht zwei 16-Bit Sequenznummern unter Berücksichtigung des Überlaufs
+    (Serial Number Arithmetic, RFC 1982).
+
+    Parameters
+    ----------
+    sequence: int
+        Die neue Sequenznummer
+    last_sequence: int
+        Die zuletzt akzeptierte Sequenznummer
+
+    Returns
+    -------
+    <nameless>: bool
+        True, falls 'sequence' nach 'last_sequence' gesendet wurde.
+    """
+
+    difference = (sequence - last_sequence) % SEQUENCE_MODULO
+    return 0 < difference < SEQUENCE_MODULO // 2
+
+
+class SequenceFilter(object):
+    """
+    Empfängerseitiger Filter für Steuerrahmen, die über UDP ankommen.
+    Es gilt immer nur der neueste Wert: Pakete, die älter als das zuletzt akzeptierte sind
+    oder doppelt ankommen, werden verworfen.
+
+    Attributes
+    ----------
+    last_sequence: int
+        Die Sequenznummer des zuletzt akzeptierten Rahmens oder None.
+    accepted: int
+        Anzahl der akzeptierten Rahmen.
+    dropped: int
+        Anzahl der verworfenen Rahmen.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die SequenceFilter-Klasse.
+        """
+
+        self.last_sequence = None
+        self.accepted = 0
+        self.dropped = 0
+
+    def accept(self, frame: ControlFrame) -> bool:
+        """
+        Prüft, ob der Rahmen neuer als der zuletzt akzeptierte ist und merkt sich ihn gegebenenfalls.
+
+        Parameters
+        ----------
+        frame: ControlFrame
+            Der dekodierte Steuerrahmen
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Rahmen verwendet werden soll.
+        """
+
+        if self.last_sequence is not None and not is_newer_sequence(frame.sequence, self.last_sequence):
+            self.dropped += 1
+            return False
+
+        self.last_sequence = frame.sequence
+        self.accepted += 1
+        return True
+
+    def reset(self) -> None:
+        """
+        Vergisst die letzte Sequenznummer, z.B. wenn sich ein neuer Client verbindet.
+        """
+
+        self.last_sequence = None
@@ -0,0 +1,290 @@
+# *********************** config_sync.py **************************
+# Versionierte Übertragung der Maschinenkonfiguration zur Drohne.
+# Statt jedes Mal die ganze Konfiguration zu senden, werden nur die
+# geänderten Schlüssel gegenüber der zuletzt bestätigten Version
+# übertragen. Die Änderung wird kompakt als JSON kodiert und in Stücke
+# zerlegt, die die Drohne einzeln bestätigt.
+#
+# Änderung (JSON): {"b": Basisversion, "v": neue Version,
+#                   "s": [[Pfad, Wert], ...], "d": [Pfad, ...]}
+# oder vollständig: {"b": 0, "v": neue Version, "f": Konfiguration}
+# Ein Pfad ist die Liste der Schlüssel bis zum Wert, z.B. ["pid", "p"].
+#
+# Stück:   CMD|set_config_chunk|<Version>|<Index>|<Anzahl>|<Daten>
+# Antwort: CONFIG|1|<Version>|<Index> oder CONFIG|0|<Version der Drohne>
+# *****************************************************************
+
+import copy
+import json
+import threading
+
+from communication.client import CHANNEL_COMMAND, SEPARATOR, deadline_in
+
+CHUNK_SIZE = 512
+CHUNK_TIMEOUT_SEC = 1
+CHUNK_RETRIES = 3
+
+# Kompakt und nur ASCII, damit Zeichen und Bytes gleich lang sind
+_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=True, sort_keys=True)
+
+
+def diff_config(old: dict, new: dict, path: list = None) -> (list, list):
+    """
+    Vergleicht zwei Konfigurationen. Verschachtelte 'Dictionaries' werden rekursiv verglichen,
+    alle anderen Werte (auch Listen) als Ganzes.
+
+    Parameters
+    ----------
+    old: dict
+        Die zuletzt übertragene Konfiguration
+    new: dict
+        Die aktuelle Konfiguration
+    path: list, optional
+        default: None
+        Der Pfad der beiden 'Dictionaries' innerhalb der gesamten Konfiguration.
+
+    Returns
+    -------
+    changes: list
+        Die geänderten oder neuen Werte als [Pfad, Wert]
+    deletions: list
+        Die Pfade der entfernten Schlüssel
+    """
+
+    path = path or []
+    changes = []
+    deletions = []
+
+    for key, value in new.items():
+        if key not in old:
+            changes.append([path + [key], value])
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            sub_changes, sub_deletions = diff_config(old[key], value, path + [key])
+            changes += sub_changes
+            deletions += sub_deletions
+        elif value != old[key]:
+            changes.append([path + [key], value])
+
+    for key in old:
+        if key not in new:
+            deletions.append(path + [key])
+    return changes, deletions
+
+
+def apply_config_delta(config: dict, delta: dict) -> dict:
+    """
+    Wendet eine Änderung (siehe oben) auf eine Konfiguration an. Wird auf der Seite der Drohne
+    gebraucht, hier z.B. im Simulator.
+
+    Parameters
+    ----------
+    config: dict
+        Die bisherige Konfiguration, sie bleibt unverändert.
+    delta: dict
+        Die dekodierte Änderung
+
+    Returns
+    -------
+    result: dict
+        Die neue Konfiguration
+    """
+
+    if 'f' in delta:
+        return copy.deepcopy(delta['f'])
+
+    result = copy.deepcopy(config)
+    for path, value in delta.get('s', []):
+        target = result
+        for key in path[:-1]:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+        target[path[-1]] = value
+
+    for path in delta.get('d', []):
+        target = result
+        for key in path[:-1]:
+            target = target.get(key, {})
+        if isinstance(target, dict):
+            target.pop(path[-1], None)
+    return result
+
+
+def split_chunks(data: str, size: int = CHUNK_SIZE) -> list:
+    """
+    Zerlegt die kodierte Änderung in Stücke.
+
+    Parameters
+    ----------
+    data: str
+        Die kodierte Änderung
+    size: int, optional
+        default: CHUNK_SIZE
+        Die maximale Länge eines Stücks
+
+    Returns
+    -------
+    <nameless>: list
+        Die Stücke, mindestens eines
+    """
+
+    return [data[i:i + size] for i in range(0, len(data), size)] or ['']
+
+
+class ConfigSync(object):
+    """
+    Überträgt Änderungen der Maschinenkonfiguration zur Drohne. Es wird immer nur der Unterschied zur
+    zuletzt von der Drohne bestätigten Version gesendet. Kennt die Drohne diese Version nicht
+    (z.B. nach einem Neustart), wird einmal die vollständige Konfiguration gesendet.
+    Jedes Stück wird einzeln bestätigt und bei ausbleibender Bestätigung erneut gesendet.
+
+    Attributes
+    ----------
+    wlan_client: WLANClient
+        Der Client, über den gesendet wird.
+    version: int
+        Die zuletzt von der Drohne bestätigte Version (0: noch keine).
+    synced_config: dict
+        Die Konfiguration, die zu dieser Version gehört.
+
+    Methods
+    -------
+    sync(config):
+        Überträgt die Änderungen und wartet auf die Bestätigung.
+    encode_delta(config):
+        Kodiert den Unterschied zur bestätigten Version.
+    """
+
+    def __init__(self, wlan_client):
+        """
+        Erstellt alle nötigen Variablen für die ConfigSync-Klasse.
+
+        Parameters
+        ----------
+        wlan_client: WLANClient
+            Der Client, über den gesendet wird.
+        """
+
+        self.wlan_client = wlan_client
+        self.version = 0
+        self.synced_config = {}
+
+        self._lock = threading.Lock()
+
+    def encode_delta(self, config: dict, full: bool = False) -> (int, str):
+        """
+        Kodiert den Unterschied zwischen der bestätigten und der übergebenen Konfiguration.
+
+        Parameters
+        ----------
+        config: dict
+            Die aktuelle Konfiguration
+        full: bool, optional
+            default: False
+            Soll die vollständige Konfiguration statt des Unterschieds kodiert werden?
+
+        Returns
+        -------
+        version: int
+            Die neue Version
+        <nameless>: str
+            Die kodierte Änderung oder None, falls sich nichts geändert hat.
+        """
+
+        version = self.version + 1
+        if full or self.version == 0:
+            return version, _ENCODER.encode({'b': 0, 'v': version, 'f': config})
+
+        changes, deletions = diff_config(self.synced_config, config)
+        if not changes and not deletions:
+            return version, None
+        return version, _ENCODER.encode({'b': self.version, 'v': version, 's': changes, 'd': deletions})
+
+    def sync(self, config: dict) -> bool:
+        """
+        Überträgt die Änderungen der Konfiguration und wartet, bis die Drohne alle Stücke bestätigt hat.
+        Blockiert, sollte also nicht im Thread der Oberfläche aufgerufen werden.
+        Mehrere gleichzeitige Aufrufe werden nacheinander ausgeführt.
+
+        Parameters
+        ----------
+        config: dict
+            Die aktuelle Konfiguration
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Drohne die Konfiguration übernommen hat (oder es nichts zu senden gab).
+        """
+
+        with self._lock:
+            config = copy.deepcopy(config)
+            version, data = self.encode_delta(config)
+            if data is None:
+                return True
+
+            accepted = self._send_chunks(version, data)
+            # Die Drohne kennt die Basisversion nicht: einmal vollständig senden
+            if not accepted and self.version != 0:
+                version, data = self.encode_delta(config, full=True)
+                accepted = self._send_chunks(version, data)
+
+            if accepted:
+                self.version = version
+                self.synced_config = config
+            return accepted
+
+    def _send_chunks(self, version: int, data: str) -> bool:
+        """
+        Sendet die Stücke nacheinander, jedes erst nach der Bestätigung des vorherigen.
+
+        Parameters
+        ----------
+        version: int
+            Die neue Version
+        data: str
+            Die kodierte Änderung
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls alle Stücke bestätigt und die Änderung übernommen wurde.
+        """
+
+        chunks = split_chunks(data)
+        for index, chunk in enumerate(chunks):
+            message = SEPARATOR.join(['CMD', 'set_config_chunk', str(version), str(index), str(len(chunks)), chunk])
+            if not self._send_chunk(message, version, index):
+                return False
+        return True
+
+    def _send_chunk(self, message: str, version: int, index: int) -> bool:
+        """
+        Sendet ein Stück und wiederholt es, falls die Bestätigung ausbleibt.
+
+        Parameters
+        ----------
+        message: str
+            Der vollständige Befehl
+        version: int
+            Die neue Version
+        index: int
+            Die Nummer des Stücks
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Drohne das Stück bestätigt hat.
+        """
+
+        for _ in range(CHUNK_RETRIES):
+            try:
+                response = self.wlan_client.request(CHANNEL_COMMAND, message).result(deadline_in(CHUNK_TIMEOUT_SEC))
+            except OSError:
+                continue
+            if not response:
+                continue
+
+            response_split = response.split(SEPARATOR)
+            return response_split[:4] == ['CONFIG', '1', str(version), str(index)]
+        return False
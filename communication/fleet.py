@@ -0,0 +1,507 @@
+# *********************** fleet.py **************************
+# Flottenmodus: Eine App überwacht und steuert mehrere Drohnen.
+# Jede Drohne bekommt eine eigene Sitzung mit eigenem AsyncWLANClient,
+# eigenen Sensordaten und eigener Ratensteuerung. Verbindung,
+# Wiederaufbau, Fristen, Messwerte und Mitschnitt übernimmt der
+# Client wie im Einzelbetrieb. Alle Sitzungen laufen als Coroutinen
+# in einer gemeinsamen Ereignisschleife (siehe async_client.py),
+# sodass auch viele Drohnen nur einen Thread brauchen und keine
+# Sitzung beim Warten auf eine Antwort einen Thread blockiert.
+# ***********************************************************
+
+import argparse
+import asyncio
+import time
+
+from communication import codec
+from communication.async_client import AsyncWLANClient, EventLoopThread
+from communication.client import (deadline_in, CHANNEL_COMMAND, CHANNEL_CONTROL, CHANNEL_SENSOR, CHANNEL_CONNECTION,
+                                  SEPARATOR, SERVER_PORT, STATE_DISCONNECTED, STATE_CONNECTING, STATE_CONNECTED)
+from communication.rate_control import RateController
+from communication.telemetry import decode_geodata, GEODATA_FLAG
+from misc.event_handling import EventHandler
+
+RESPONSE_TIMEOUT_SEC = 2
+CONNECTION_POLL_SEC = 0.5
+STOP_TIMEOUT_SEC = 2
+
+
+class DroneSession(object):
+    """
+    Die Sitzung mit einer Drohne der Flotte. Sie registriert sich, abonniert die Sensordaten,
+    fragt regelmäßig die Verbindungsstärke ab und passt die Raten an. Bricht die Verbindung ab,
+    baut der AsyncWLANClient sie selbst wieder auf und setzt die Sitzung fort. Kennt die Drohne die
+    Sitzung nicht mehr, registriert sich die Sitzung neu.
+    Alles läuft als Coroutinen in der Ereignisschleife der Flotte.
+
+    Attributes
+    ----------
+    name: str
+        Der Name der Drohne in der Flotte.
+    address: str
+        IP-Adresse oder Hostname der Drohne.
+    port: int
+        Der Port der Drohne.
+    client: AsyncWLANClient
+        Die Verbindung zur Drohne.
+    state: str
+        Der Zustand der Sitzung (siehe client.STATE_*). STATE_CONNECTED erst nach der Registrierung.
+    telemetry: Telemetry
+        Die zuletzt empfangenen Sensordaten oder None.
+    signal_strength: int
+        Die zuletzt gemeldete Signalstärke oder None.
+    statistics: LinkStatistics
+        Bytes, Antwortzeiten und Verluste dieser Sitzung (die des AsyncWLANClient).
+    rate_controller: RateController
+        Die Ratensteuerung dieser Sitzung.
+    on_telemetry: EventHandler
+        Wird mit der Sitzung und den neuen Sensordaten ausgelöst.
+    on_state_changed: EventHandler
+        Wird mit der Sitzung und dem neuen Zustand ausgelöst.
+
+    Methods
+    -------
+    start():
+        Startet die Sitzung in der Ereignisschleife.
+    stop():
+        Beendet die Sitzung und schließt die Verbindung.
+    send_control(right, left):
+        Sendet die Positionen der Joysticks an diese Drohne.
+    control_interval_sec():
+        Das Intervall, in dem Steuerdaten gesendet werden sollen.
+    """
+
+    def __init__(self, name: str, address: str, port: int, loop_thread: EventLoopThread, dispatch=None):
+        """
+        Erstellt alle nötigen Variablen für die DroneSession-Klasse.
+
+        Parameters
+        ----------
+        name: str
+            Der Name der Drohne
+        address: str
+            IP-Adresse oder Hostname der Drohne
+        port: int
+            Der Port der Drohne
+        loop_thread: EventLoopThread
+            Die gemeinsame Ereignisschleife der Flotte
+        dispatch: method, optional
+            default: None
+            Führt die Events im gewünschten Thread aus (siehe MainThreadDispatcher.post()).
+        """
+
+        self.name = name
+        self.address = address
+        self.port = port
+        self.client = AsyncWLANClient(loop_thread, dispatch)
+
+        self.state = STATE_DISCONNECTED
+        self.telemetry = None
+        self.signal_strength = None
+        self.statistics = self.client.statistics
+        self.rate_controller = RateController()
+
+        self.on_telemetry = EventHandler()
+        self.on_state_changed = EventHandler()
+
+        self._dispatch = dispatch
+        self._connection_task = None
+        self._telemetry_task = None
+        self._control_sequence = 0
+
+        self.client.on_state_changed.add_function(self._on_client_state_changed)
+
+    def start(self) -> None:
+        """
+        Startet die Coroutinen der Sitzung in der Ereignisschleife, sofern sie noch nicht laufen.
+        """
+
+        if self._connection_task is not None:
+            return
+
+        self._connection_task = self.client.submit(self._watch_connection())
+        self._telemetry_task = self.client.submit(self._receive_telemetry())
+
+    def stop(self):
+        """
+        Beendet die Coroutinen der Sitzung und schließt die Verbindung im Hintergrund.
+
+        Returns
+        -------
+        <nameless>: concurrent.futures.Future
+            Das Future des Zurücksetzens, falls man auf das Schließen der Verbindung warten möchte.
+        """
+
+        for task in (self._connection_task, self._telemetry_task):
+            if task is not None:
+                task.cancel()
+        self._connection_task = None
+        self._telemetry_task = None
+        self._set_state(STATE_DISCONNECTED)
+        return self.client.submit(self.client.reset())
+
+    def send_control(self, right: (float, float), left: (float, float)) -> None:
+        """
+        Sendet die Positionen der Joysticks als Steuerrahmen an diese Drohne. Kann von jedem
+        Thread aus aufgerufen werden und blockiert nicht. Ohne Verbindung wird nichts gesendet,
+        da nur der neueste Steuerrahmen zählt.
+
+        Parameters
+        ----------
+        right: tuple(float, float)
+            Position des rechten Joysticks
+        left: tuple(float, float)
+            Position des linken Joysticks
+        """
+
+        if self.state != STATE_CONNECTED:
+            return
+
+        self._control_sequence = (self._control_sequence + 1) % codec.SEQUENCE_MODULO
+        frame = codec.encode_control_frame(self._control_sequence, codec.timestamp_ms(), right, left)
+        try:
+            self.client.send_bytes(CHANNEL_CONTROL, frame)
+        except OSError:
+            pass
+
+    def control_interval_sec(self) -> float:
+        """
+        Gibt das Intervall zurück, in dem Steuerdaten an diese Drohne gesendet werden sollen.
+
+        Returns
+        -------
+        <nameless>: float
+            Das Intervall in Sekunden
+        """
+
+        return self.rate_controller.control_interval_sec()
+
+    async def _watch_connection(self) -> None:
+        """
+        Läuft bis stop(). Registriert die Sitzung, falls sie noch keine hat, und fragt sonst alle
+        CONNECTION_POLL_SEC Sekunden die Verbindungsstärke ab. Das Warten auf die Antworten
+        hält nur diese Sitzung auf, nicht die anderen.
+        """
+
+        while True:
+            if self.client.session_id is None:
+                await self._register()
+            else:
+                await self._poll_connection()
+            await asyncio.sleep(CONNECTION_POLL_SEC)
+
+    async def _poll_connection(self) -> None:
+        """
+        Fragt die Verbindungsstärke ab und passt damit die Raten an. Eine ausgebliebene Antwort
+        zählt der AsyncWLANClient als verloren.
+        """
+
+        try:
+            response = await self.client.request(CHANNEL_CONNECTION, f'CMD{SEPARATOR}get_conn_data',
+                                                 deadline_in(RESPONSE_TIMEOUT_SEC))
+            self.signal_strength = int(response.split(SEPARATOR)[1]) if response else None
+        except (OSError, IndexError, ValueError):
+            # Der AsyncWLANClient baut die Verbindung im Hintergrund wieder auf
+            self.signal_strength = None
+
+        if self.rate_controller.update(self.signal_strength, self.client.get_statistics()):
+            await self._apply_rates()
+
+    async def _register(self) -> None:
+        """
+        Baut die Verbindung auf, registriert sich bei der Drohne und abonniert die Sensordaten.
+        Auf die Antwort wird gewartet, ohne die Ereignisschleife zu blockieren.
+        Schlägt das fehl, wird es beim nächsten Durchlauf erneut versucht.
+        """
+
+        self._set_state(STATE_CONNECTING)
+        try:
+            await self.client.connect(self.address, self.port)
+            response = await self.client.request(CHANNEL_COMMAND, f'CMD{SEPARATOR}register_ip',
+                                                 deadline_in(RESPONSE_TIMEOUT_SEC))
+        except OSError:
+            self._set_state(STATE_DISCONNECTED)
+            return
+
+        response_split = response.split(SEPARATOR) if response else []
+        if response_split[1:2] != ['1']:
+            self._set_state(STATE_DISCONNECTED)
+            return
+
+        # Ab jetzt setzt der AsyncWLANClient die Sitzung nach einem Abbruch selbst fort
+        await self.client.start_session(response_split[2] if len(response_split) > 2 else '')
+        self._set_state(STATE_CONNECTED)
+        await self._apply_rates()
+
+    async def _apply_rates(self) -> None:
+        """
+        Abonniert die Sensordaten mit der Rate der Ratensteuerung.
+        """
+
+        try:
+            await self.client.subscribe_telemetry(self.rate_controller.telemetry_rate_hz(),
+                                                  deadline_in(RESPONSE_TIMEOUT_SEC))
+        except OSError:
+            # Die Rate ist gespeichert, nach dem Wiederaufbau wird damit neu abonniert
+            pass
+
+    async def _receive_telemetry(self) -> None:
+        """
+        Läuft bis stop(). Wartet auf die gesendeten Sensordaten, überspringt veraltete und dekodiert
+        die neuesten. Ohne Verbindung wird nach einer kurzen Pause erneut gewartet.
+        """
+
+        while True:
+            try:
+                message = await self.client.wait_for_latest_response(CHANNEL_SENSOR, GEODATA_FLAG)
+            except OSError:
+                await asyncio.sleep(CONNECTION_POLL_SEC)
+                continue
+
+            telemetry = decode_geodata(message) if message else None
+            if telemetry is None:
+                continue
+            self.telemetry = telemetry
+            self._emit(self.on_telemetry, self, telemetry)
+
+    def _on_client_state_changed(self, state: str) -> None:
+        """
+        Übernimmt den Zustand des AsyncWLANClient. Eine Verbindung ohne Registrierung zählt noch nicht
+        als verbunden.
+
+        Parameters
+        ----------
+        state: str
+            Der neue Zustand des AsyncWLANClient
+        """
+
+        if state == STATE_CONNECTED and self.client.session_id is None:
+            state = STATE_CONNECTING
+        self._set_state(state)
+
+    def _set_state(self, state: str) -> None:
+        """
+        Setzt den Zustand der Sitzung und löst on_state_changed aus, falls er sich geändert hat.
+
+        Parameters
+        ----------
+        state: str
+            Der neue Zustand
+        """
+
+        if self.state == state:
+            return
+        self.state = state
+        self._emit(self.on_state_changed, self, state)
+
+    def _emit(self, event_handler: EventHandler, *args) -> None:
+        """
+        Löst ein Event aus, im Thread, den 'dispatch' bestimmt.
+
+        Parameters
+        ----------
+        event_handler: EventHandler
+            Das Event
+        args: any
+            Die Argumente
+        """
+
+        if self._dispatch is None:
+            event_handler.invoke(*args)
+        else:
+            self._dispatch(event_handler.invoke, *args)
+
+
+class FleetClient(object):
+    """
+    Verwaltet die Sitzungen mit allen Drohnen der Flotte in einer gemeinsamen Ereignisschleife.
+
+    Attributes
+    ----------
+    loop_thread: EventLoopThread
+        Die gemeinsame Ereignisschleife aller Sitzungen
+    sessions: dict
+        Name -> DroneSession
+    on_telemetry: EventHandler
+        Wird mit der Sitzung und den neuen Sensordaten ausgelöst, egal von welcher Drohne.
+    on_state_changed: EventHandler
+        Wird mit der Sitzung und dem neuen Zustand ausgelöst, egal von welcher Drohne.
+
+    Methods
+    -------
+    add_drone(name, address, port=SERVER_PORT):
+        Fügt eine Drohne hinzu.
+    remove_drone(name):
+        Entfernt eine Drohne und trennt die Verbindung.
+    start():
+        Startet alle Sitzungen.
+    stop():
+        Beendet alle Sitzungen.
+    send_control(name, right, left):
+        Sendet die Positionen der Joysticks an eine Drohne.
+    snapshot():
+        Gibt den Zustand aller Drohnen zurück.
+    """
+
+    def __init__(self, dispatch=None, loop_thread: EventLoopThread = None):
+        """
+        Erstellt alle nötigen Variablen für die FleetClient-Klasse.
+
+        Parameters
+        ----------
+        dispatch: method, optional
+            default: None
+            Führt die Events im gewünschten Thread aus, z.B. MainThreadDispatcher.post() für den Hauptthread.
+        loop_thread: EventLoopThread, optional
+            default: None
+            Eine Ereignisschleife, die die Flotte mitbenutzt, z.B. die der App. Ohne bekommt sie eine eigene.
+        """
+
+        self.loop_thread = loop_thread if loop_thread is not None else EventLoopThread()
+        self.sessions = {}
+        self.on_telemetry = EventHandler()
+        self.on_state_changed = EventHandler()
+
+        self._dispatch = dispatch
+        self._own_loop = loop_thread is None
+        self._running = False
+
+    def add_drone(self, name: str, address: str, port: int = SERVER_PORT) -> DroneSession:
+        """
+        Fügt eine Drohne hinzu. Läuft die Flotte schon, wird die Sitzung sofort gestartet.
+
+        Parameters
+        ----------
+        name: str
+            Ein eindeutiger Name für die Drohne
+        address: str
+            IP-Adresse oder Hostname der Drohne
+        port: int, optional
+            default: SERVER_PORT
+            Der Port der Drohne
+
+        Returns
+        -------
+        session: DroneSession
+            Die neue Sitzung
+        """
+
+        if name in self.sessions:
+            raise ValueError(f'drone {name} already exists')
+
+        session = DroneSession(name, address, port, self.loop_thread, self._dispatch)
+        session.on_telemetry.add_function(self.on_telemetry.invoke)
+        session.on_state_changed.add_function(self.on_state_changed.invoke)
+        self.sessions[name] = session
+
+        if self._running:
+            session.start()
+        return session
+
+    def remove_drone(self, name: str) -> None:
+        """
+        Entfernt eine Drohne und trennt die Verbindung.
+
+        Parameters
+        ----------
+        name: str
+            Der Name der Drohne
+        """
+
+        session = self.sessions.pop(name, None)
+        if session is not None:
+            session.stop()
+
+    def start(self) -> None:
+        """
+        Startet die Ereignisschleife und alle Sitzungen.
+        """
+
+        self.loop_thread.start()
+        self._running = True
+        for session in self.sessions.values():
+            session.start()
+
+    def stop(self) -> None:
+        """
+        Beendet alle Sitzungen, schließt die Verbindungen und hält eine eigene Ereignisschleife an.
+        """
+
+        if not self._running:
+            return
+
+        self._running = False
+        resets = [session.stop() for session in self.sessions.values()]
+        if self._own_loop:
+            # Die Verbindungen sollen noch geschlossen werden, bevor die Schleife anhält
+            for reset in resets:
+                try:
+                    reset.result(STOP_TIMEOUT_SEC)
+                except Exception:
+                    pass
+            self.loop_thread.stop(STOP_TIMEOUT_SEC)
+
+    def send_control(self, name: str, right: (float, float), left: (float, float)) -> None:
+        """
+        Sendet die Positionen der Joysticks an eine Drohne (siehe DroneSession.send_control()).
+
+        Parameters
+        ----------
+        name: str
+            Der Name der Drohne
+        right: tuple(float, float)
+            Position des rechten Joysticks
+        left: tuple(float, float)
+            Position des linken Joysticks
+        """
+
+        self.sessions[name].send_control(right, left)
+
+    def snapshot(self) -> dict:
+        """
+        Gibt den Zustand aller Drohnen zurück, z.B. für eine Übersicht.
+
+        Returns
+        -------
+        <nameless>: dict
+            Name -> {'state', 'telemetry', 'signal_strength', 'quality'}
+        """
+
+        return {name: {
+            'state': session.state,
+            'telemetry': session.telemetry,
+            'signal_strength': session.signal_strength,
+            'quality': session.rate_controller.quality,
+        } for name, session in self.sessions.items()}
+
+
+def main() -> None:
+    """
+    Überwacht mehrere Drohnen über die Kommandozeile, z.B. mehrere Simulatoren.
+    """
+
+    parser = argparse.ArgumentParser(description='Monitor several drones at once')
+    parser.add_argument('drones', nargs='+', help='host[:port] of each drone')
+    parser.add_argument('--interval', type=float, default=1, help='seconds between status lines')
+    args = parser.parse_args()
+
+    fleet = FleetClient()
+    for i, drone in enumerate(args.drones):
+        host, _, port = drone.partition(':')
+        fleet.add_drone(f'drone{i}', host, int(port) if port else SERVER_PORT)
+
+    fleet.start()
+    try:
+        while True:
+            time.sleep(args.interval)
+            for name, status in fleet.snapshot().items():
+                telemetry = status['telemetry']
+                position = '-' if telemetry is None else f'{telemetry.latitude:.6f},{telemetry.longitude:.6f}'
+                print(f'{name}: {status["state"]:<12} signal={status["signal_strength"]} '
+                      f'quality={status["quality"]} position={position}')
+    except KeyboardInterrupt:
+        fleet.stop()
+
+
+if __name__ == '__main__':
+    main()
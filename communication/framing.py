@@ -0,0 +1,224 @@
+# *********************** framing.py **************************
+# Rahmenprotokoll für die Nachrichten zwischen App und Drohne.
+# TCP überträgt nur einen Bytestrom, deswegen wird jeder Nachricht
+# ihre Länge vorangestellt, damit der Empfänger sie wieder trennen kann.
+# Alle logischen Kanäle teilen sich eine Verbindung, deswegen trägt
+# jeder Rahmen zusätzlich die Nummer seines Kanals.
+# Anfragen können eine Anfrage-ID tragen, die die Antwort unverändert
+# zurückgibt. So können mehrere Anfragen gleichzeitig unterwegs sein und
+# die Antworten in beliebiger Reihenfolge ankommen. 0 bedeutet keine ID.
+#
+# Format: | Länge (2 Byte) | Kanal (1 Byte) | Anfrage-ID (2 Byte) | Nutzdaten (Länge Bytes) |
+# Alle Zahlen sind big-endian.
+# *************************************************************
+
+import struct
+from collections import namedtuple
+
+HEADER = struct.Struct('!HBH')
+MAX_PAYLOAD_SIZE = 0xFFFF
+MAX_CHANNEL = 0xFF
+MAX_REQUEST_ID = 0xFFFF
+NO_REQUEST_ID = 0
+# Ein größtmöglicher Rahmen und Platz für den Anfang des nächsten
+BUFFER_SIZE = 2 * (HEADER.size + MAX_PAYLOAD_SIZE)
+
+Frame = namedtuple('Frame', ['channel', 'request_id', 'payload'])
+
+
+def encode_frame(payload: bytes, channel: int = 0, request_id: int = NO_REQUEST_ID) -> bytes:
+    """
+    Stellt den Nutzdaten den Rahmenkopf voran.
+
+    Parameters
+    ----------
+    payload: bytes
+        Die Nutzdaten
+    channel: int, optional
+        default: 0
+        Der logische Kanal, zu dem der Rahmen gehört.
+    request_id: int, optional
+        default: NO_REQUEST_ID
+        Die Anfrage-ID, zu der der Rahmen gehört.
+
+    Returns
+    -------
+    <nameless>: bytes
+        Der vollständige Rahmen, der so über den Socket gesendet werden kann.
+    """
+
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError(f'payload too large ({len(payload)} > {MAX_PAYLOAD_SIZE} bytes)')
+    if not 0 <= channel <= MAX_CHANNEL:
+        raise ValueError(f'invalid channel {channel}')
+    if not 0 <= request_id <= MAX_REQUEST_ID:
+        raise ValueError(f'invalid request id {request_id}')
+    return HEADER.pack(len(payload), channel, request_id) + payload
+
+
+class FrameReader(object):
+    """
+    Gepufferter Leser für einen Socket, der immer nur vollständige Rahmen zurückgibt.
+    Der Socket schreibt mit recv_into() direkt in einen einmal angelegten Puffer, die Rahmenköpfe
+    werden dort gelesen, ohne für jedes recv() neue Objekte anzulegen. Bytes, die schon zum
+    nächsten Rahmen gehören, bleiben im Puffer für den nächsten Aufruf. Erst wenn hinten kein
+    Platz mehr ist, wird der unvollständige Rest an den Anfang geschoben.
+    Alle Kanäle teilen sich eine Verbindung und damit auch diesen einen Puffer.
+
+    Attributes
+    ----------
+    sock: socket.socket
+        Der Socket, von dem gelesen wird.
+    buffer: bytearray
+        Der Empfangspuffer. Nur der Bereich zwischen start und end enthält noch nicht
+        zurückgegebene Bytes.
+    start: int
+        Beginn der noch nicht zurückgegebenen Bytes.
+    end: int
+        Ende der empfangenen Bytes.
+
+    Methods
+    -------
+    read_frame():
+        Wartet auf den nächsten vollständigen Rahmen und gibt ihn zurück.
+    read_frame_view():
+        Wie read_frame(), die Nutzdaten zeigen aber direkt in den Puffer.
+    has_frame():
+        Liegt bereits ein vollständiger Rahmen im Puffer?
+    receive_view():
+        Gibt den freien Teil des Puffers zurück, in den empfangen werden kann.
+    commit(received):
+        Übernimmt die Bytes, die in den freien Teil empfangen wurden.
+    """
+
+    def __init__(self, sock, capacity: int = BUFFER_SIZE):
+        """
+        Erstellt alle nötigen Variablen für die FrameReader-Klasse.
+
+        Parameters
+        ----------
+        sock: socket.socket
+            Der Socket, von dem gelesen wird.
+        capacity: int, optional
+            default: BUFFER_SIZE
+            Die Größe des Puffers. Er muss mindestens einen größtmöglichen Rahmen fassen.
+        """
+
+        if capacity < HEADER.size + MAX_PAYLOAD_SIZE:
+            raise ValueError(f'capacity too small for a frame ({capacity} bytes)')
+
+        self.sock = sock
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self._view = memoryview(self.buffer)
+
+    def read_frame(self) -> Frame:
+        """
+        Gibt den nächsten vollständigen Rahmen zurück. Falls der Puffer noch keinen
+        vollständigen Rahmen enthält, wird so lange vom Socket gelesen bis einer da ist.
+
+        Returns
+        -------
+        <nameless>: Frame
+            Der Kanal, die Anfrage-ID und die Nutzdaten
+        """
+
+        channel, request_id, payload = self.read_frame_view()
+        return Frame(channel, request_id, bytes(payload))
+
+    def read_frame_view(self) -> Frame:
+        """
+        Wie read_frame(), die Nutzdaten werden aber nicht kopiert, sondern als memoryview
+        in den Puffer zurückgegeben. Die memoryview ist nur bis zum nächsten Aufruf gültig,
+        wer die Nutzdaten länger braucht, muss sie mit bytes() kopieren.
+
+        Returns
+        -------
+        <nameless>: Frame
+            Der Kanal, die Anfrage-ID und die Nutzdaten als memoryview
+        """
+
+        while not self.has_frame():
+            self._fill()
+
+        length, channel, request_id = HEADER.unpack_from(self.buffer, self.start)
+        payload_start = self.start + HEADER.size
+        self.start = payload_start + length
+        # Puffer leer: beim nächsten Mal wieder vorne anfangen, dann muss nie verschoben werden
+        if self.start == self.end:
+            payload = self._view[payload_start:self.start]
+            self.start = self.end = 0
+            return Frame(channel, request_id, payload)
+        return Frame(channel, request_id, self._view[payload_start:self.start])
+
+    def has_frame(self) -> bool:
+        """
+        Prüft, ob bereits ein vollständiger Rahmen im Puffer liegt, ohne den Socket zu lesen.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls read_frame() sofort zurückkehren würde.
+        """
+
+        available = self.end - self.start
+        if available < HEADER.size:
+            return False
+        length, _, _ = HEADER.unpack_from(self.buffer, self.start)
+        return available >= HEADER.size + length
+
+    def receive_view(self) -> memoryview:
+        """
+        Gibt den freien Teil des Puffers zurück, z.B. für loop.sock_recv_into() in einer
+        asyncio-Ereignisschleife. Reicht der Platz hinten nicht mehr für den angefangenen Rahmen,
+        wird der Rest vorher an den Anfang verschoben. Danach muss commit() aufgerufen werden.
+
+        Returns
+        -------
+        <nameless>: memoryview
+            Der freie Teil des Puffers
+        """
+
+        if self.end == len(self.buffer) or len(self.buffer) - self.start < self._needed():
+            remaining = self.end - self.start
+            self.buffer[:remaining] = self._view[self.start:self.end]
+            self.start, self.end = 0, remaining
+        return self._view[self.end:]
+
+    def commit(self, received: int) -> None:
+        """
+        Übernimmt die Bytes, die in den Bereich von receive_view() empfangen wurden.
+
+        Parameters
+        ----------
+        received: int
+            Die Anzahl der empfangenen Bytes. 0 bedeutet, dass die Gegenseite die Verbindung
+            geschlossen hat.
+        """
+
+        if not received:
+            raise ConnectionResetError('Connection closed by peer')
+        self.end += received
+
+    def _fill(self) -> None:
+        """
+        Liest vom Socket direkt in den freien Teil des Puffers.
+        """
+
+        self.commit(self.sock.recv_into(self.receive_view()))
+
+    def _needed(self) -> int:
+        """
+        Gibt zurück, wie viele Bytes der angefangene Rahmen insgesamt braucht.
+
+        Returns
+        -------
+        <nameless>: int
+            Die Größe des Rahmens oder die des Rahmenkopfes, solange er unvollständig ist.
+        """
+
+        if self.end - self.start < HEADER.size:
+            return HEADER.size
+        length, _, _ = HEADER.unpack_from(self.buffer, self.start)
+        return HEADER.size + length
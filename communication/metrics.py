@@ -0,0 +1,383 @@
+# *********************** metrics.py **************************
+# Messwerte für die Verbindung zur Drohne: gesendete und empfangene
+# Bytes und Nachrichten, Fehler und die Antwortzeiten (RTT) der Anfragen,
+# getrennt nach den logischen Kanälen des WLANClient.
+# *************************************************************
+
+import threading
+from collections import deque
+
+# Obere Grenzen der Histogrammklassen in Millisekunden, die letzte Klasse ist offen
+RTT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+RECENT_WINDOW = 32
+
+DATAGRAM_CHANNEL = 'udp'
+
+
+class RttHistogram(object):
+    """
+    Histogramm der Antwortzeiten mit festen Klassen (siehe RTT_BUCKETS_MS).
+
+    Attributes
+    ----------
+    counts: list
+        Anzahl der Messwerte pro Klasse. Der letzte Eintrag zählt alles über der größten Grenze.
+    count: int
+        Anzahl aller Messwerte
+    total_ms: float
+        Summe aller Messwerte in Millisekunden
+    min_ms: float
+        Kleinster Messwert oder None
+    max_ms: float
+        Größter Messwert oder None
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die RttHistogram-Klasse.
+        """
+
+        self.counts = [0] * (len(RTT_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def add(self, rtt_ms: float) -> None:
+        """
+        Fügt einen Messwert hinzu.
+
+        Parameters
+        ----------
+        rtt_ms: float
+            Die Antwortzeit in Millisekunden
+        """
+
+        index = len(RTT_BUCKETS_MS)
+        for i, bound in enumerate(RTT_BUCKETS_MS):
+            if rtt_ms <= bound:
+                index = i
+                break
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += rtt_ms
+        self.min_ms = rtt_ms if self.min_ms is None else min(self.min_ms, rtt_ms)
+        self.max_ms = rtt_ms if self.max_ms is None else max(self.max_ms, rtt_ms)
+
+    def percentile(self, p: float) -> float:
+        """
+        Schätzt ein Perzentil anhand der Klassengrenzen.
+
+        Parameters
+        ----------
+        p: float
+            Das Perzentil von 0 bis 100
+
+        Returns
+        -------
+        <nameless>: float
+            Die obere Grenze der Klasse, in der das Perzentil liegt, oder None ohne Messwerte.
+        """
+
+        if self.count == 0:
+            return None
+
+        target = self.count * p / 100
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count > 0:
+                return RTT_BUCKETS_MS[i] if i < len(RTT_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        """
+        Gibt das Histogramm als 'Dictionary' zurück.
+
+        Returns
+        -------
+        <nameless>: dict
+            Die Werte des Histogramms
+        """
+
+        return {
+            'buckets_ms': list(RTT_BUCKETS_MS),
+            'counts': list(self.counts),
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'min_ms': self.min_ms,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+        }
+
+
+class ChannelStatistics(object):
+    """
+    Messwerte eines Kanals.
+
+    Attributes
+    ----------
+    sent_bytes: int
+    received_bytes: int
+        Übertragene Bytes inklusive Rahmenkopf.
+    sent_messages: int
+    received_messages: int
+        Anzahl der übertragenen Rahmen.
+    errors: int
+        Anzahl der Übertragungsfehler.
+    timeouts: int
+        Anzahl der Anfragen, deren Antwort nicht rechtzeitig ankam.
+    rtt: RttHistogram
+        Die Antwortzeiten der Anfragen.
+    recent_rtts_ms: deque
+        Die letzten Antwortzeiten, um aktuelle Veränderungen zu erkennen.
+    recent_outcomes: deque
+        Für die letzten Anfragen: True, falls die Antwort ankam, False bei Zeitüberschreitung.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die ChannelStatistics-Klasse.
+        """
+
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.sent_messages = 0
+        self.received_messages = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rtt = RttHistogram()
+        self.recent_rtts_ms = deque(maxlen=RECENT_WINDOW)
+        self.recent_outcomes = deque(maxlen=RECENT_WINDOW)
+
+    def to_dict(self) -> dict:
+        """
+        Gibt die Messwerte als 'Dictionary' zurück.
+
+        Returns
+        -------
+        <nameless>: dict
+            Die Messwerte
+        """
+
+        return {
+            'sent_bytes': self.sent_bytes,
+            'received_bytes': self.received_bytes,
+            'sent_messages': self.sent_messages,
+            'received_messages': self.received_messages,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'rtt': self.rtt.to_dict(),
+            'recent_rtts_ms': list(self.recent_rtts_ms),
+            'recent_outcomes': list(self.recent_outcomes),
+        }
+
+
+class LinkStatistics(object):
+    """
+    Die Messwerte aller Kanäle einer Verbindung. Alle Methoden sind threadsicher, da Sende- und
+    Empfangsthreads gleichzeitig Werte eintragen.
+
+    Methods
+    -------
+    record_sent(channel, size):
+        Trägt einen gesendeten Rahmen ein.
+    record_received(channel, size):
+        Trägt einen empfangenen Rahmen ein.
+    record_rtt(channel, rtt_sec):
+        Trägt die Antwortzeit einer Anfrage ein.
+    record_timeout(channel):
+        Trägt eine unbeantwortete Anfrage ein.
+    record_error(channel):
+        Trägt einen Übertragungsfehler ein.
+    snapshot():
+        Gibt eine Kopie aller Messwerte zurück.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die LinkStatistics-Klasse.
+        """
+
+        self.channels = {}
+        self._lock = threading.Lock()
+
+    def record_sent(self, channel, size: int) -> None:
+        """
+        Trägt einen gesendeten Rahmen ein.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+        size: int
+            Die Größe des Rahmens in Bytes
+        """
+
+        with self._lock:
+            statistics = self._get(channel)
+            statistics.sent_bytes += size
+            statistics.sent_messages += 1
+
+    def record_received(self, channel, size: int) -> None:
+        """
+        Trägt einen empfangenen Rahmen ein.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+        size: int
+            Die Größe des Rahmens in Bytes
+        """
+
+        with self._lock:
+            statistics = self._get(channel)
+            statistics.received_bytes += size
+            statistics.received_messages += 1
+
+    def record_rtt(self, channel, rtt_sec: float) -> None:
+        """
+        Trägt die Antwortzeit einer beantworteten Anfrage ein. Sie zählt auch als Erfolg für die Verlustrate.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+        rtt_sec: float
+            Die Zeit zwischen Anfrage und Antwort in Sekunden
+        """
+
+        with self._lock:
+            statistics = self._get(channel)
+            statistics.rtt.add(rtt_sec * 1000)
+            statistics.recent_rtts_ms.append(rtt_sec * 1000)
+            statistics.recent_outcomes.append(True)
+
+    def record_timeout(self, channel) -> None:
+        """
+        Trägt eine Anfrage ein, deren Antwort nicht innerhalb der Frist kam. Sie zählt als Verlust.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+        """
+
+        with self._lock:
+            statistics = self._get(channel)
+            statistics.timeouts += 1
+            statistics.recent_outcomes.append(False)
+
+    def record_error(self, channel) -> None:
+        """
+        Trägt einen Übertragungsfehler ein, z.B. einen fehlgeschlagenen Sendeversuch.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+        """
+
+        with self._lock:
+            self._get(channel).errors += 1
+
+    def snapshot(self) -> dict:
+        """
+        Gibt eine Kopie aller Messwerte zurück, die ohne Rücksicht auf andere Threads gelesen werden kann.
+
+        Returns
+        -------
+        <nameless>: dict
+            Kanal -> Messwerte (siehe ChannelStatistics.to_dict())
+        """
+
+        with self._lock:
+            return {channel: statistics.to_dict() for channel, statistics in self.channels.items()}
+
+    def _get(self, channel) -> ChannelStatistics:
+        """
+        Gibt die Messwerte des Kanals zurück und legt sie beim ersten Zugriff an.
+        Muss mit gehaltenem _lock aufgerufen werden.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal, auf dem gemessen wurde (bei Datagrammen DATAGRAM_CHANNEL des WLANClient)
+
+        Returns
+        -------
+        <nameless>: ChannelStatistics
+            Die Messwerte des Kanals
+        """
+
+        if channel not in self.channels:
+            self.channels[channel] = ChannelStatistics()
+        return self.channels[channel]
+
+
+def recent_rtt_ms(snapshot: dict) -> float:
+    """
+    Gibt den Median der letzten Antwortzeiten über alle Kanäle zurück.
+
+    Parameters
+    ----------
+    snapshot: dict
+        Siehe LinkStatistics.snapshot()
+
+    Returns
+    -------
+    <nameless>: float
+        Der Median in Millisekunden oder None ohne Messwerte.
+    """
+
+    rtts = sorted(rtt for statistics in snapshot.values() for rtt in statistics['recent_rtts_ms'])
+    if not rtts:
+        return None
+    return rtts[len(rtts) // 2]
+
+
+def recent_loss(snapshot: dict) -> float:
+    """
+    Gibt den Anteil der zuletzt unbeantworteten Anfragen über alle Kanäle zurück.
+
+    Parameters
+    ----------
+    snapshot: dict
+        Siehe LinkStatistics.snapshot()
+
+    Returns
+    -------
+    <nameless>: float
+        Der Anteil von 0 bis 1 (0 ohne Anfragen).
+    """
+
+    outcomes = [outcome for statistics in snapshot.values() for outcome in statistics['recent_outcomes']]
+    if not outcomes:
+        return 0.0
+    return outcomes.count(False) / len(outcomes)
+
+
+def link_quality(snapshot: dict) -> int:
+    """
+    Berechnet aus den gemessenen Antwortzeiten und Verlusten eine Verbindungsqualität von 0 bis 100,
+    die wie die Verbindungsstärke der Drohne (CONDATA) verwendet werden kann.
+
+    Parameters
+    ----------
+    snapshot: dict
+        Siehe LinkStatistics.snapshot()
+
+    Returns
+    -------
+    <nameless>: int
+        Die Qualität, 100 ist die beste.
+    """
+
+    rtt = recent_rtt_ms(snapshot)
+    # 5 ms Antwortzeit kosten einen Punkt, höchstens aber 60
+    rtt_penalty = 0 if rtt is None else min(60.0, rtt / 5)
+    loss_penalty = recent_loss(snapshot) * 100
+    return int(max(0.0, min(100.0, 100 - rtt_penalty - loss_penalty)))
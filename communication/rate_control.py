@@ -0,0 +1,135 @@
+# *********************** rate_control.py **************************
+# Passt die Raten der Steuerdaten und der Sensordaten an die Qualität
+# der Verbindung an. Die Qualität ergibt sich aus der Signalstärke, die
+# die Drohne meldet (CONDATA), und den gemessenen Antwortzeiten und
+# Verlusten (siehe metrics.py). Wird die Verbindung schlechter, werden
+# zuerst die Sensordaten reduziert, damit die Steuerdaten Vorrang haben.
+# ******************************************************************
+
+from collections import namedtuple
+
+from communication import metrics
+
+# Ab welcher Qualität (0 bis 100) welche Raten gelten, von der besten Stufe abwärts.
+# Gestartet wird mit den bisherigen 20 Hz, erst bei sehr guter Verbindung werden die
+# Steuerdaten schneller gesendet.
+RateTier = namedtuple('RateTier', ['min_quality', 'control_hz', 'telemetry_hz'])
+RATE_TIERS = (
+    RateTier(70, 40, 10),
+    RateTier(45, 20, 2),
+    RateTier(20, 10, 1),
+    RateTier(0, 5, 0.5),
+)
+INITIAL_TIER = 1
+
+# So viele Punkte muss die Qualität über der Grenze liegen, bevor eine Stufe höher geschaltet wird
+HYSTERESIS = 10
+
+
+class RateController(object):
+    """
+    Wählt anhand der Verbindungsqualität eine Stufe aus RATE_TIERS. Verschlechtert sich die
+    Verbindung, wird sofort heruntergeschaltet, hochgeschaltet wird erst mit etwas Abstand
+    zur Grenze, damit die Raten nicht ständig hin und her springen.
+
+    Attributes
+    ----------
+    tier: int
+        Der Index der aktuellen Stufe in RATE_TIERS.
+    quality: int
+        Die zuletzt berechnete Qualität oder None.
+
+    Methods
+    -------
+    update(signal_strength, statistics):
+        Berechnet die Qualität neu und wählt die passende Stufe.
+    control_interval_sec():
+        Das Intervall, in dem die Steuerdaten gesendet werden sollen.
+    telemetry_rate_hz():
+        Die Rate, mit der die Drohne die Sensordaten senden soll.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die RateController-Klasse.
+        """
+
+        self.tier = INITIAL_TIER
+        self.quality = None
+
+    def update(self, signal_strength: int, statistics: dict) -> bool:
+        """
+        Berechnet die Qualität aus der Signalstärke und den Messwerten und wählt die Stufe.
+        Die schlechtere der beiden Angaben zählt.
+
+        Parameters
+        ----------
+        signal_strength: int
+            Die von der Drohne gemeldete Signalstärke (0 bis 100) oder None, falls sie nicht antwortet.
+        statistics: dict
+            Die Messwerte des WLANClient (siehe WLANClient.get_statistics())
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls sich die Stufe und damit die Raten geändert haben.
+        """
+
+        quality = metrics.link_quality(statistics)
+        if signal_strength is not None:
+            quality = min(quality, signal_strength)
+        self.quality = quality
+
+        tier = self._tier_for(quality)
+        # Höher schalten nur mit Abstand zur Grenze der neuen Stufe
+        if tier < self.tier:
+            tier = min(self._tier_for(quality - HYSTERESIS), self.tier)
+
+        changed = tier != self.tier
+        self.tier = tier
+        return changed
+
+    def control_interval_sec(self) -> float:
+        """
+        Gibt das Intervall zurück, in dem die Steuerdaten gesendet werden sollen.
+
+        Returns
+        -------
+        <nameless>: float
+            Das Intervall in Sekunden
+        """
+
+        return 1 / RATE_TIERS[self.tier].control_hz
+
+    def telemetry_rate_hz(self) -> float:
+        """
+        Gibt die Rate zurück, mit der die Drohne die Sensordaten senden soll.
+
+        Returns
+        -------
+        <nameless>: float
+            Die Rate in Hz
+        """
+
+        return RATE_TIERS[self.tier].telemetry_hz
+
+    @staticmethod
+    def _tier_for(quality: int) -> int:
+        """
+        Gibt die beste Stufe zurück, deren Mindestqualität erreicht ist.
+
+        Parameters
+        ----------
+        quality: int
+            Die Qualität von 0 bis 100
+
+        Returns
+        -------
+        <nameless>: int
+            Der Index in RATE_TIERS
+        """
+
+        for i, tier in enumerate(RATE_TIERS):
+            if quality >= tier.min_quality:
+                return i
+        return len(RATE_TIERS) - 1
@@ -0,0 +1,347 @@
+# *********************** replay.py **************************
+# Spielt einen Mitschnitt (siehe capture.py) wieder ab. Der Server
+# verhält sich wie die Drohne während des Mitschnitts: Er sendet die
+# damals empfangenen Rahmen in derselben Reihenfolge an den Client,
+# entweder so schnell wie möglich oder in Echtzeit. Antworten werden
+# erst gesendet, wenn der Client die passende Anfrage gestellt hat,
+# und bekommen dessen neue Anfrage-ID. So laufen WLANClient und
+# Bildschirme bei jedem Durchlauf mit denselben Daten.
+#
+# Start: python -m communication.replay capture.msdc --realtime
+# ************************************************************
+
+import argparse
+import socket
+import threading
+import time
+
+from communication.capture import (read_sessions, session_wall_time, KIND_NAMES, KIND_RECEIVED, KIND_SENT,
+                                   KIND_SESSION)
+from communication.client import SEPARATOR, SERVER_PORT
+from communication.framing import FrameReader, encode_frame, NO_REQUEST_ID
+
+DEFAULT_HOST = '127.0.0.1'
+# So lange wird auf die Anfrage des Clients gewartet, bevor die Antwort übersprungen wird
+REQUEST_WAIT_SEC = 2
+
+
+def _command_of(payload: bytes) -> bytes:
+    """
+    Gibt den Befehl einer Anfrage ohne Argumente zurück, z.B. b'CMD|get_conn_data'.
+
+    Parameters
+    ----------
+    payload: bytes
+        Die Nutzdaten der Anfrage
+
+    Returns
+    -------
+    <nameless>: bytes
+        Der Befehl
+    """
+
+    separator = SEPARATOR.encode('utf-8')
+    return separator.join(payload.split(separator, 2)[:2])
+
+
+class ReplayServer(object):
+    """
+    Ein Server, der einen Mitschnitt an den ersten Client abspielt, der sich verbindet.
+    Anfragen des Clients werden der mitgeschnittenen Anfrage mit denselben Nutzdaten zugeordnet,
+    ersatzweise einer mit demselben Befehl.
+
+    Attributes
+    ----------
+    path: str
+        Der Pfad der Mitschnittdatei
+    host: str
+        Die Adresse, an die der Server gebunden wird.
+    port: int
+        Der Port. 0 wählt einen freien Port, der danach hier steht.
+    realtime: bool
+        Werden die Rahmen mit den Abständen des Mitschnitts gesendet? Sonst so schnell wie möglich.
+    speed: float
+        Der Faktor für die Abstände in Echtzeit, z.B. 2 für doppelte Geschwindigkeit.
+    records: list
+        Die Einträge des abgespielten Mitschnitts
+    replayed: int
+        Anzahl der gesendeten Rahmen
+    skipped: int
+        Anzahl der Antworten, deren Anfrage der Client nicht gestellt hat.
+    duration_sec: float
+        Die Dauer des Abspielens oder None, solange es läuft.
+    finished: threading.Event
+        Wird gesetzt, sobald der Mitschnitt vollständig abgespielt wurde.
+
+    Methods
+    -------
+    start():
+        Startet den Server im Hintergrund.
+    stop():
+        Stoppt den Server und trennt den Client.
+    wait(timeout=None):
+        Wartet, bis der Mitschnitt abgespielt wurde.
+    """
+
+    def __init__(self, path: str, host: str = DEFAULT_HOST, port: int = SERVER_PORT, realtime: bool = False,
+                 speed: float = 1.0, session: int = -1):
+        """
+        Erstellt alle nötigen Variablen für die ReplayServer-Klasse.
+
+        Parameters
+        ----------
+        path: str
+            Der Pfad der Mitschnittdatei
+        host: str, optional
+            default: DEFAULT_HOST
+            Die Adresse, an die der Server gebunden wird.
+        port: int, optional
+            default: SERVER_PORT
+            Der Port
+        realtime: bool, optional
+            default: False
+            In Echtzeit abspielen?
+        speed: float, optional
+            default: 1.0
+            Der Faktor für die Abstände in Echtzeit
+        session: int, optional
+            default: -1
+            Welcher Mitschnitt der Datei abgespielt wird, ohne der letzte.
+        """
+
+        self.path = path
+        self.host = host
+        self.port = port
+        self.realtime = realtime
+        self.speed = speed
+        self.records = read_sessions(path)[session]
+
+        self.replayed = 0
+        self.skipped = 0
+        self.duration_sec = None
+        self.finished = threading.Event()
+
+        self._server_socket = None
+        self._client_socket = None
+        # Offene Anfragen des Clients: Kanal -> [(Anfrage-ID, Nutzdaten), ...]
+        self._live_requests = {}
+        self._condition = threading.Condition()
+        self._running = False
+
+    def start(self) -> None:
+        """
+        Bindet den Socket und wartet im Hintergrund auf den Client.
+        """
+
+        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server_socket.bind((self.host, self.port))
+        self._server_socket.listen(1)
+        self.port = self._server_socket.getsockname()[1]
+
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stoppt den Server und trennt den Client.
+        """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        for s in (self._server_socket, self._client_socket):
+            if s is not None:
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                s.close()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wartet, bis der Mitschnitt vollständig abgespielt wurde.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            default: None
+            Wie lange maximal gewartet wird.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls das Abspielen beendet ist.
+        """
+
+        return self.finished.wait(timeout)
+
+    def _accept(self) -> None:
+        """
+        Nimmt den ersten Client an und startet das Lesen und Abspielen.
+        """
+
+        try:
+            sock, _ = self._server_socket.accept()
+        except OSError:
+            return
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._client_socket = sock
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True).start()
+        self._play(sock)
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        """
+        Liest die Rahmen des Clients und merkt sich seine Anfragen.
+
+        Parameters
+        ----------
+        sock: socket.socket
+            Der Socket des Clients
+        """
+
+        reader = FrameReader(sock)
+        try:
+            while True:
+                frame = reader.read_frame()
+                if frame.request_id == NO_REQUEST_ID:
+                    continue
+                with self._condition:
+                    self._live_requests.setdefault(frame.channel, []).append((frame.request_id, frame.payload))
+                    self._condition.notify_all()
+        except OSError:
+            pass
+
+    def _play(self, sock: socket.socket) -> None:
+        """
+        Sendet die mitgeschnittenen Rahmen der Drohne der Reihe nach.
+
+        Parameters
+        ----------
+        sock: socket.socket
+            Der Socket des Clients
+        """
+
+        # Anfrage-ID des Mitschnitts -> Nutzdaten der zuletzt damit gesendeten Anfrage
+        recorded_requests = {}
+        start = time.monotonic()
+        first_timestamp = self.records[0].timestamp if self.records else 0.0
+
+        try:
+            for record in self.records:
+                if record.kind == KIND_SENT and record.request_id != NO_REQUEST_ID:
+                    recorded_requests[record.request_id] = record.payload
+                if record.kind != KIND_RECEIVED:
+                    continue
+
+                if self.realtime:
+                    due = start + (record.timestamp - first_timestamp) / self.speed
+                    time.sleep(max(0.0, due - time.monotonic()))
+
+                request_id = NO_REQUEST_ID
+                if record.request_id != NO_REQUEST_ID:
+                    request_id = self._take_live_request(record.channel,
+                                                         recorded_requests.pop(record.request_id, b''))
+                    if request_id is None:
+                        self.skipped += 1
+                        continue
+
+                sock.sendall(encode_frame(record.payload, record.channel, request_id))
+                self.replayed += 1
+        except OSError:
+            pass
+
+        self.duration_sec = time.monotonic() - start
+        self.finished.set()
+
+    def _take_live_request(self, channel: int, recorded_payload: bytes) -> int:
+        """
+        Wartet auf die Anfrage des Clients, die zur mitgeschnittenen Anfrage passt, und entfernt sie.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        recorded_payload: bytes
+            Die Nutzdaten der mitgeschnittenen Anfrage
+
+        Returns
+        -------
+        <nameless>: int
+            Die Anfrage-ID des Clients oder None, falls die Anfrage nicht rechtzeitig kam.
+        """
+
+        command = _command_of(recorded_payload)
+        deadline = time.monotonic() + REQUEST_WAIT_SEC
+        with self._condition:
+            while self._running:
+                live = self._live_requests.get(channel, [])
+                matches = [i for i, (_, payload) in enumerate(live) if payload == recorded_payload] or \
+                          [i for i, (_, payload) in enumerate(live) if _command_of(payload) == command]
+                if matches:
+                    return live.pop(matches[0])[0]
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+        return None
+
+
+def dump(path: str) -> None:
+    """
+    Gibt alle Einträge einer Mitschnittdatei lesbar aus.
+
+    Parameters
+    ----------
+    path: str
+        Der Pfad der Mitschnittdatei
+    """
+
+    for index, records in enumerate(read_sessions(path)):
+        wall_time = session_wall_time(records[0])
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_time)) if wall_time else '?'
+        print(f'session {index}: started {started}, {len(records)} records')
+
+        for record in records:
+            if record.kind == KIND_SESSION:
+                continue
+            offset_ms = (record.timestamp - records[0].timestamp) * 1000
+            print(f'{offset_ms:10.1f} ms  {KIND_NAMES.get(record.kind, record.kind):<8} '
+                  f'ch={record.channel} id={record.request_id:<5} {record.payload[:60]!r}')
+
+
+def main() -> None:
+    """
+    Spielt einen Mitschnitt über die Kommandozeile ab oder gibt ihn aus.
+    """
+
+    parser = argparse.ArgumentParser(description='Replay a capture of the drone traffic')
+    parser.add_argument('capture', help='capture file (see communication/capture.py)')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--realtime', action='store_true', help='keep the recorded timing')
+    parser.add_argument('--speed', type=float, default=1.0, help='time factor for --realtime')
+    parser.add_argument('--session', type=int, default=-1, help='index of the capture session in the file')
+    parser.add_argument('--dump', action='store_true', help='print the records instead of replaying them')
+    args = parser.parse_args()
+
+    if args.dump:
+        dump(args.capture)
+        return
+
+    server = ReplayServer(args.capture, args.host, args.port, args.realtime, args.speed, args.session)
+    server.start()
+    print(f'Replaying {len(server.records)} records on {server.host}:{server.port}')
+    try:
+        server.wait()
+        print(f'replayed={server.replayed} skipped={server.skipped} duration={server.duration_sec:.3f}s')
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,746 @@
+# *********************** simulator.py **************************
+# Ein lokaler Ersatz für die Drohne (ESP32), der dasselbe Protokoll
+# spricht (Rahmen, Kanäle, Anfrage-IDs, Steuerrahmen über TCP und UDP).
+# Damit lassen sich WLANClient und die Bildschirme ohne Hardware testen
+# und Durchsatz und Latenz reproduzierbar messen.
+#
+# Start: python -m communication.simulator --latency 20 --jitter 5 --loss 0.01
+# ***************************************************************
+
+import argparse
+import heapq
+import json
+import random
+import secrets
+import socket
+import threading
+import time
+
+from communication import codec
+from communication.config_sync import apply_config_delta
+from communication.client import CHANNEL_CONTROL, CHANNEL_SENSOR, SEPARATOR, SERVER_PORT
+from communication.framing import FrameReader, encode_frame, NO_REQUEST_ID
+
+DEFAULT_HOST = '0.0.0.0'
+MAX_TELEMETRY_RATE_HZ = 50
+DATAGRAM_SIZE = 512
+
+
+class LinkProfile(object):
+    """
+    Eigenschaften der simulierten Funkstrecke.
+
+    Attributes
+    ----------
+    latency_ms: float
+        Grundverzögerung jeder Antwort in Millisekunden.
+    jitter_ms: float
+        Maximale zufällige Zusatzverzögerung in Millisekunden.
+    loss: float
+        Wahrscheinlichkeit (0 bis 1), dass eine Antwort, ein gesendeter Sensorwert oder ein
+        UDP-Paket verloren geht.
+    reply_rate_hz: float
+        Wie viele Rahmen pro Sekunde die Drohne höchstens senden kann. 0 bedeutet unbegrenzt.
+    signal_strength: int
+        Die Verbindungsstärke (0 bis 100), die bei get_conn_data gemeldet wird.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, loss: float = 0,
+                 reply_rate_hz: float = 0, signal_strength: int = 100):
+        """
+        Erstellt alle nötigen Variablen für die LinkProfile-Klasse.
+        """
+
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.reply_rate_hz = reply_rate_hz
+        self.signal_strength = signal_strength
+
+    def delay_sec(self) -> float:
+        """
+        Gibt die Verzögerung für den nächsten Rahmen in Sekunden zurück.
+
+        Returns
+        -------
+        <nameless>: float
+            Die Verzögerung
+        """
+
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    def is_lost(self) -> bool:
+        """
+        Entscheidet zufällig, ob der nächste Rahmen verloren geht.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Rahmen verworfen werden soll.
+        """
+
+        return self.loss > 0 and random.random() < self.loss
+
+
+class SimulatedDrone(object):
+    """
+    Der simulierte Zustand der Drohne: Position, Geschwindigkeit, Joysticks und Konfiguration.
+
+    Attributes
+    ----------
+    speed: float
+    altitude: float
+    latitude: float
+    longitude: float
+        Die Sensordaten, die sich langsam zufällig verändern.
+    right_joystick: tuple(float, float)
+    left_joystick: tuple(float, float)
+        Die zuletzt empfangenen Positionen der Joysticks.
+    hover_mode: bool
+        Befindet sich die Drohne im Hover-Modus?
+    config: dict
+        Die zuletzt empfangene Konfiguration.
+    config_version: int
+        Die Version der Konfiguration (siehe config_sync.py), 0 ohne Version.
+    control_filter: SequenceFilter
+        Verwirft veraltete Steuerrahmen.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die SimulatedDrone-Klasse.
+        """
+
+        self.speed = 0.0
+        self.altitude = 0.0
+        self.latitude = 52.533320
+        self.longitude = 13.433042
+
+        self.right_joystick = (0.0, 0.0)
+        self.left_joystick = (0.0, 0.0)
+        self.hover_mode = False
+        self.config = {}
+        self.config_version = 0
+
+        self.control_filter = codec.SequenceFilter()
+        self._lock = threading.Lock()
+
+    def apply_control(self, frame: codec.ControlFrame) -> bool:
+        """
+        Übernimmt einen Steuerrahmen, sofern er neuer als der letzte ist.
+
+        Parameters
+        ----------
+        frame: ControlFrame
+            Der dekodierte Steuerrahmen
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Rahmen übernommen wurde.
+        """
+
+        with self._lock:
+            if not self.control_filter.accept(frame):
+                return False
+            self.right_joystick = frame.right
+            self.left_joystick = frame.left
+            return True
+
+    def geodata(self) -> str:
+        """
+        Bewegt die Drohne ein Stück weiter und gibt die Sensordaten zurück.
+
+        Returns
+        -------
+        <nameless>: str
+            Format: GEODATA|SPEED|ALTITUDE|LATITUDE|LONGITUDE
+        """
+
+        with self._lock:
+            if not self.hover_mode:
+                self.altitude = max(0.0, self.altitude + self.left_joystick[1] + random.uniform(-.1, .1))
+                self.speed = abs(self.right_joystick[1]) * 10 + random.uniform(0, .5)
+                self.latitude += self.right_joystick[1] * 1e-5
+                self.longitude += self.right_joystick[0] * 1e-5
+
+            return SEPARATOR.join(['GEODATA', f'{self.speed:.2f}', f'{self.altitude:.2f}',
+                                   f'{self.latitude:.6f}', f'{self.longitude:.6f}'])
+
+
+class SimulatorConnection(object):
+    """
+    Eine Verbindung eines Clients mit dem Simulator. Ausgehende Rahmen werden mit der Verzögerung
+    aus dem LinkProfile von einem eigenen Thread gesendet, ohne ihre Reihenfolge zu ändern (wie bei TCP).
+
+    Attributes
+    ----------
+    sock: socket.socket
+        Der Socket der Verbindung
+    address: tuple(str, int)
+        Die Adresse des Clients
+    telemetry_rate_hz: float
+        Die ausgehandelte Rate für die gesendeten Sensordaten oder 0.
+    """
+
+    def __init__(self, server, sock: socket.socket, address):
+        """
+        Erstellt alle nötigen Variablen für die SimulatorConnection-Klasse.
+
+        Parameters
+        ----------
+        server: DroneSimulator
+            Der Simulator, zu dem die Verbindung gehört.
+        sock: socket.socket
+            Der Socket der Verbindung
+        address: tuple(str, int)
+            Die Adresse des Clients
+        """
+
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.telemetry_rate_hz = 0
+
+        self._outbox = []
+        self._outbox_order = 0
+        self._last_due = 0.0
+        self._last_sent = 0.0
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def start(self) -> None:
+        """
+        Startet die Threads für das Lesen, das verzögerte Senden und die Sensordaten.
+        """
+
+        for target in (self._read_loop, self._write_loop, self._telemetry_loop):
+            threading.Thread(target=target, daemon=True).start()
+
+    def close(self) -> None:
+        """
+        Schließt die Verbindung.
+        """
+
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.server.remove_connection(self)
+
+    def send(self, channel: int, message: str, request_id: int = NO_REQUEST_ID) -> None:
+        """
+        Reiht eine Nachricht zum verzögerten Senden ein. Sie kann laut LinkProfile verloren gehen.
+
+        Parameters
+        ----------
+        channel: int
+            Der Kanal
+        message: str
+            Die Nachricht
+        request_id: int, optional
+            default: NO_REQUEST_ID
+            Die Anfrage-ID, auf die geantwortet wird.
+        """
+
+        profile = self.server.profile
+        if profile.is_lost():
+            return
+
+        with self._condition:
+            # Die Reihenfolge bleibt wie bei TCP erhalten, Jitter verzögert also auch die folgenden Rahmen
+            due = max(self._last_due, time.monotonic() + profile.delay_sec())
+            self._last_due = due
+            self._outbox_order += 1
+            heapq.heappush(self._outbox, (due, self._outbox_order,
+                                          encode_frame(message.encode('utf-8'), channel, request_id)))
+            self._condition.notify()
+
+    def _read_loop(self) -> None:
+        """
+        Liest die Rahmen des Clients und führt sie aus. Bei einem Fehler wird die Verbindung
+        geschlossen, damit der Socket nicht mit einem beendeten Thread offen bleibt.
+        """
+
+        reader = FrameReader(self.sock)
+        try:
+            while True:
+                frame = reader.read_frame()
+                self.server.handle_frame(self, frame)
+        except OSError:
+            pass
+        except Exception as e:
+            print(f'Closing connection of {self.address}: {e!r}')
+        finally:
+            self.close()
+
+    def _write_loop(self) -> None:
+        """
+        Sendet die eingereihten Rahmen, sobald ihre Verzögerung abgelaufen ist, höchstens aber
+        mit der reply_rate_hz aus dem LinkProfile.
+        """
+
+        while True:
+            with self._condition:
+                while not self._closed and (not self._outbox or self._outbox[0][0] > time.monotonic()):
+                    timeout = self._outbox[0][0] - time.monotonic() if self._outbox else None
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+                _, _, data = heapq.heappop(self._outbox)
+
+            reply_rate_hz = self.server.profile.reply_rate_hz
+            if reply_rate_hz > 0:
+                wait = self._last_sent + 1 / reply_rate_hz - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.close()
+                return
+            self._last_sent = time.monotonic()
+
+    def _telemetry_loop(self) -> None:
+        """
+        Sendet die Sensordaten mit der ausgehandelten Rate, solange sie abonniert sind.
+        """
+
+        next_tick = time.monotonic()
+        while not self._closed:
+            rate = self.telemetry_rate_hz
+            if rate <= 0:
+                time.sleep(.05)
+                next_tick = time.monotonic()
+                continue
+
+            self.send(CHANNEL_SENSOR, self.server.drone.geodata())
+            next_tick += 1 / rate
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+
+class DroneSimulator(object):
+    """
+    Ein Server, der sich wie die Drohne verhält. Er nimmt TCP-Verbindungen und UDP-Steuerrahmen
+    auf demselben Port an und beantwortet alle Befehle des CMD-Protokolls.
+
+    Attributes
+    ----------
+    host: str
+        Die Adresse, an die der Server gebunden wird.
+    port: int
+        Der Port (TCP und UDP). 0 wählt einen freien Port, der danach hier steht.
+    profile: LinkProfile
+        Die Eigenschaften der simulierten Funkstrecke.
+    drone: SimulatedDrone
+        Der Zustand der Drohne.
+    registered_ip: str
+        Die IP-Adresse des registrierten Clients oder None.
+    session_id: str
+        Die Sitzungs-ID der Registrierung, mit der der Client nach einem Verbindungsabbruch
+        über 'resume_session' weitermachen kann, oder None.
+
+    Methods
+    -------
+    start():
+        Startet den Server im Hintergrund.
+    stop():
+        Stoppt den Server und trennt alle Clients.
+    serve_forever():
+        Startet den Server und blockiert bis zum Abbruch.
+    drop_connections():
+        Trennt alle Clients, ohne die Registrierung zu vergessen (Funkloch).
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = SERVER_PORT, profile: LinkProfile = None):
+        """
+        Erstellt alle nötigen Variablen für die DroneSimulator-Klasse.
+
+        Parameters
+        ----------
+        host: str, optional
+            default: DEFAULT_HOST
+            Die Adresse, an die der Server gebunden wird.
+        port: int, optional
+            default: SERVER_PORT
+            Der Port (TCP und UDP)
+        profile: LinkProfile, optional
+            default: None
+            Die Eigenschaften der Funkstrecke. Ohne gibt es keine Verzögerung und keine Verluste.
+        """
+
+        self.host = host
+        self.port = port
+        self.profile = profile if profile is not None else LinkProfile()
+        self.drone = SimulatedDrone()
+        self.registered_ip = None
+        self.session_id = None
+
+        self._server_socket = None
+        self._datagram_socket = None
+        self._connections = []
+        self._config_chunks = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+        self._commands = {
+            'register_ip': self.register_ip,
+            'resume_session': self.resume_session,
+            'get_sensor_data': self.get_sensor_data,
+            'get_conn_data': self.get_conn_data,
+            'set_hover_mode': self.set_hover_mode,
+            'set_config': self.set_config,
+            'set_config_chunk': self.set_config_chunk,
+            'subscribe_telemetry': self.subscribe_telemetry,
+            'unsubscribe_telemetry': self.unsubscribe_telemetry,
+            'reset': self.reset,
+        }
+
+    def start(self) -> None:
+        """
+        Bindet die Sockets und startet die Threads für neue Verbindungen und UDP-Pakete.
+        """
+
+        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server_socket.bind((self.host, self.port))
+        self._server_socket.listen(5)
+        self.port = self._server_socket.getsockname()[1]
+
+        self._datagram_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._datagram_socket.bind((self.host, self.port))
+
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._datagram_loop, daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stoppt den Server und trennt alle Clients.
+        """
+
+        self._running = False
+        for s in (self._server_socket, self._datagram_socket):
+            if s is not None:
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                s.close()
+
+        self.drop_connections()
+
+    def serve_forever(self) -> None:
+        """
+        Startet den Server und blockiert, bis das Programm mit Strg+C beendet wird.
+        """
+
+        self.start()
+        print(f'Simulated drone listening on {self.host}:{self.port} (tcp/udp)')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def drop_connections(self) -> None:
+        """
+        Trennt alle TCP-Verbindungen wie bei einem Funkloch. Die Registrierung bleibt bestehen,
+        sodass der Client die Sitzung fortsetzen kann.
+        """
+
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close()
+
+    def remove_connection(self, connection: SimulatorConnection) -> None:
+        """
+        Entfernt eine geschlossene Verbindung.
+
+        Parameters
+        ----------
+        connection: SimulatorConnection
+            Die Verbindung
+        """
+
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def handle_frame(self, connection: SimulatorConnection, frame) -> None:
+        """
+        Führt einen empfangenen Rahmen aus: Steuerrahmen werden übernommen, Befehle beantwortet.
+
+        Parameters
+        ----------
+        connection: SimulatorConnection
+            Die Verbindung, über die der Rahmen kam.
+        frame: Frame
+            Der Rahmen
+        """
+
+        if frame.channel == CHANNEL_CONTROL and codec.is_control_frame(frame.payload):
+            self.drone.apply_control(codec.decode_control_frame(frame.payload))
+            return
+
+        text = frame.payload.decode('utf-8', errors='replace')
+        parts = text.split(SEPARATOR, 2)
+
+        # Alte Textnachrichten der Joysticks: RJ|x|y bzw. LJ|x|y
+        if parts[0] in ('RJ', 'LJ') and len(parts) == 3:
+            try:
+                position = (float(parts[1]), float(parts[2]))
+            except ValueError:
+                print(f'Malformed joystick message: {text}')
+                return
+            if parts[0] == 'RJ':
+                self.drone.right_joystick = position
+            else:
+                self.drone.left_joystick = position
+            return
+
+        if parts[0] != 'CMD' or len(parts) < 2:
+            return
+
+        command = self._commands.get(parts[1].lower())
+        if command is None:
+            print(f'Command not found: {parts[1]}')
+            return
+
+        argument = parts[2] if len(parts) > 2 else ''
+        public = command in (self.register_ip, self.resume_session)
+        if not public and not self._is_registered(connection):
+            connection.send(frame.channel, 'Permission denied.', frame.request_id)
+            return
+
+        command(connection, frame.channel, frame.request_id, argument)
+
+    def register_ip(self, connection, channel, request_id, argument) -> None:
+        """
+        Registriert den Client, falls noch kein anderer registriert ist, und beginnt eine neue
+        Sitzung. Antwortet mit REGISTER|1|<Sitzungs-ID> oder REGISTER|0.
+
+        Parameters
+        ----------
+        connection: SimulatorConnection
+            Die Verbindung, über die der Befehl kam.
+        channel: int
+            Der Kanal, auf dem geantwortet wird.
+        request_id: int
+            Die Anfrage-ID, auf die geantwortet wird.
+        argument: str
+            Alles nach dem Befehlsnamen oder ''
+        """
+
+        if self.registered_ip is None or self.registered_ip == connection.address[0]:
+            self.registered_ip = connection.address[0]
+            self.session_id = secrets.token_hex(8)
+            connection.send(channel, f'REGISTER{SEPARATOR}1{SEPARATOR}{self.session_id}', request_id)
+        else:
+            connection.send(channel, 'REGISTER|0', request_id)
+
+    def resume_session(self, connection, channel, request_id, argument) -> None:
+        """
+        Setzt die Sitzung mit der übergebenen Sitzungs-ID nach einem Verbindungsabbruch fort.
+        Antwortet mit RESUME|1 oder RESUME|0. Die Parameter sind wie bei register_ip(),
+        argument ist die Sitzungs-ID.
+        """
+
+        if self.session_id is not None and argument == self.session_id:
+            # Die IP-Adresse kann sich beim Wiederverbinden geändert haben
+            self.registered_ip = connection.address[0]
+            connection.send(channel, 'RESUME|1', request_id)
+        else:
+            connection.send(channel, 'RESUME|0', request_id)
+
+    def get_sensor_data(self, connection, channel, request_id, argument) -> None:
+        """
+        Antwortet mit den aktuellen Sensordaten (GEODATA). Die Parameter sind wie bei register_ip().
+        """
+
+        connection.send(channel, self.drone.geodata(), request_id)
+
+    def get_conn_data(self, connection, channel, request_id, argument) -> None:
+        """
+        Antwortet mit der Signalstärke aus dem LinkProfile (CONDATA). Die Parameter sind wie bei register_ip().
+        """
+
+        connection.send(channel, f'CONDATA{SEPARATOR}{self.profile.signal_strength}', request_id)
+
+    def set_hover_mode(self, connection, channel, request_id, argument) -> None:
+        """
+        Schaltet den Schwebemodus ein ('True') oder aus. Die Parameter sind wie bei register_ip(),
+        argument ist der neue Zustand.
+        """
+
+        self.drone.hover_mode = argument == 'True'
+
+    def set_config(self, connection, channel, request_id, argument) -> None:
+        """
+        Übernimmt die vollständige Konfiguration als JSON (altes Format ohne Stücke).
+        Antwortet mit CONFIG|1 oder CONFIG|0. Die Parameter sind wie bei register_ip().
+        """
+
+        try:
+            self.drone.config = json.loads(argument)
+            connection.send(channel, 'CONFIG|1', request_id)
+        except ValueError:
+            connection.send(channel, 'CONFIG|0', request_id)
+
+    def set_config_chunk(self, connection, channel, request_id, argument) -> None:
+        """
+        Nimmt ein Stück einer Konfigurationsänderung an (siehe communication/config_sync.py).
+        Mit dem letzten Stück wird die Änderung übernommen. Jedes Stück wird mit
+        CONFIG|1|<Version>|<Index> bestätigt, abgelehnt wird mit CONFIG|0|<bekannte Version>.
+        Die Parameter sind wie bei register_ip(), argument ist <Version>|<Index>|<Anzahl>|<Daten>.
+        """
+
+        try:
+            version, index, count, chunk = argument.split(SEPARATOR, 3)
+            version, index, count = int(version), int(index), int(count)
+        except ValueError:
+            connection.send(channel, f'CONFIG{SEPARATOR}0{SEPARATOR}{self.drone.config_version}', request_id)
+            return
+
+        # Die Version wurde schon übernommen, nur die Bestätigung ging verloren: erneut bestätigen
+        if version == self.drone.config_version and version not in self._config_chunks:
+            connection.send(channel, SEPARATOR.join(['CONFIG', '1', str(version), str(index)]), request_id)
+            return
+
+        # Wiederholte Stücke überschreiben einfach das schon empfangene
+        chunks = self._config_chunks.setdefault(version, [None] * count)
+        if len(chunks) != count or not 0 <= index < count:
+            self._config_chunks.pop(version, None)
+            connection.send(channel, f'CONFIG{SEPARATOR}0{SEPARATOR}{self.drone.config_version}', request_id)
+            return
+        chunks[index] = chunk
+
+        if index == count - 1:
+            self._config_chunks.pop(version, None)
+            try:
+                delta = json.loads(''.join(chunks))
+            except (TypeError, ValueError):
+                delta = None
+            if delta is None or ('f' not in delta and delta.get('b') != self.drone.config_version):
+                connection.send(channel, f'CONFIG{SEPARATOR}0{SEPARATOR}{self.drone.config_version}', request_id)
+                return
+            self.drone.config = apply_config_delta(self.drone.config, delta)
+            self.drone.config_version = version
+
+        connection.send(channel, SEPARATOR.join(['CONFIG', '1', str(version), str(index)]), request_id)
+
+    def subscribe_telemetry(self, connection, channel, request_id, argument) -> None:
+        """
+        Abonniert die Sensordaten mit der übergebenen Rate (höchstens MAX_TELEMETRY_RATE_HZ).
+        Antwortet mit SUBSCRIBE|1|<Rate> oder SUBSCRIBE|0. Die Parameter sind wie bei register_ip(),
+        argument ist die Rate in Hz.
+        """
+
+        try:
+            rate = min(float(argument), MAX_TELEMETRY_RATE_HZ)
+        except ValueError:
+            connection.send(channel, 'SUBSCRIBE|0', request_id)
+            return
+        connection.telemetry_rate_hz = max(rate, 0)
+        connection.send(channel, f'SUBSCRIBE{SEPARATOR}1{SEPARATOR}{connection.telemetry_rate_hz}', request_id)
+
+    def unsubscribe_telemetry(self, connection, channel, request_id, argument) -> None:
+        """
+        Beendet das Abonnement der Sensordaten. Die Parameter sind wie bei register_ip().
+        """
+
+        connection.telemetry_rate_hz = 0
+
+    def reset(self, connection, channel, request_id, argument) -> None:
+        """
+        Hebt die Registrierung und die Sitzung auf und schließt die Verbindung.
+        Die Parameter sind wie bei register_ip().
+        """
+
+        self.registered_ip = None
+        self.session_id = None
+        self.drone.control_filter.reset()
+        connection.close()
+
+    def _is_registered(self, connection: SimulatorConnection) -> bool:
+        """
+        Prüft, ob die Verbindung vom registrierten Client kommt.
+
+        Parameters
+        ----------
+        connection: SimulatorConnection
+            Die Verbindung
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Client registriert ist.
+        """
+
+        return self.registered_ip is not None and self.registered_ip == connection.address[0]
+
+    def _accept_loop(self) -> None:
+        """
+        Nimmt neue Verbindungen an.
+        """
+
+        while self._running:
+            try:
+                sock, address = self._server_socket.accept()
+            except OSError:
+                return
+
+            # Ohne verzögert Nagle kleine Antworten bis zum ACK des Clients
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = SimulatorConnection(self, sock, address)
+            with self._lock:
+                self._connections.append(connection)
+            connection.start()
+
+    def _datagram_loop(self) -> None:
+        """
+        Empfängt die Steuerrahmen, die über UDP gesendet werden.
+        """
+
+        while self._running:
+            try:
+                data, address = self._datagram_socket.recvfrom(DATAGRAM_SIZE)
+            except OSError:
+                return
+
+            if self.profile.is_lost() or not codec.is_control_frame(data):
+                continue
+            if self.registered_ip == address[0]:
+                self.drone.apply_control(codec.decode_control_frame(data))
+
+
+def main() -> None:
+    """
+    Startet den Simulator über die Kommandozeile.
+    """
+
+    parser = argparse.ArgumentParser(description='Simulated ESP32 drone for WLANClient')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--latency', type=float, default=0, help='base reply latency in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='additional random latency in ms')
+    parser.add_argument('--loss', type=float, default=0, help='probability (0-1) that a frame is lost')
+    parser.add_argument('--reply-rate', type=float, default=0, help='max outgoing frames per second, 0 = unlimited')
+    parser.add_argument('--signal', type=int, default=100, help='signal strength reported by get_conn_data')
+    args = parser.parse_args()
+
+    profile = LinkProfile(args.latency, args.jitter, args.loss, args.reply_rate, args.signal)
+    DroneSimulator(args.host, args.port, profile).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
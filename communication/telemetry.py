@@ -0,0 +1,73 @@
+# *********************** telemetry.py **************************
+# Typisierte Sensordaten der Drohne. Eine GEODATA-Nachricht wird
+# genau einmal dekodiert, danach wird nur noch mit Zahlen gearbeitet.
+#
+# Format: GEODATA|SPEED|ALTITUDE|LATITUDE|LONGITUDE
+# ***************************************************************
+
+import time
+
+from communication.client import SEPARATOR
+
+GEODATA_FLAG = 'GEODATA'
+
+
+class Telemetry(object):
+    """
+    Ein Satz Sensordaten mit dem Zeitpunkt, zu dem er empfangen wurde.
+
+    Attributes
+    ----------
+    speed: float
+        Die Geschwindigkeit
+    altitude: float
+        Die Höhe
+    latitude: float
+        Der Breitengrad
+    longitude: float
+        Der Längengrad
+    timestamp: float
+        Empfangszeitpunkt als Unix-Zeit (time.time())
+    """
+
+    __slots__ = ('speed', 'altitude', 'latitude', 'longitude', 'timestamp')
+
+    def __init__(self, speed: float = 0.0, altitude: float = 0.0, latitude: float = 0.0,
+                 longitude: float = 0.0, timestamp: float = None):
+        self.speed = speed
+        self.altitude = altitude
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self) -> str:
+        return (f'Telemetry(speed={self.speed}, altitude={self.altitude}, latitude={self.latitude}, '
+                f'longitude={self.longitude}, timestamp={self.timestamp})')
+
+
+def decode_geodata(message: str, timestamp: float = None) -> Telemetry:
+    """
+    Dekodiert eine GEODATA-Nachricht.
+
+    Parameters
+    ----------
+    message: str
+        Die Nachricht, z.B. 'GEODATA|1.20|3.00|52.533320|13.433042'
+    timestamp: float, optional
+        default: None
+        Der Empfangszeitpunkt, ohne die aktuelle Zeit.
+
+    Returns
+    -------
+    <nameless>: Telemetry
+        Die Sensordaten oder None, falls die Nachricht nicht dem Format entspricht.
+    """
+
+    parts = message.split(SEPARATOR)
+    if parts[0] != GEODATA_FLAG or len(parts) < 5:
+        return None
+
+    try:
+        return Telemetry(float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4]), timestamp)
+    except ValueError:
+        return None
@@ -3,6 +3,7 @@
 # *******************************************************************
 
 # **************************** Imports ******************************
+import asyncio
 import os
 import platform
 import traceback
@@ -50,15 +51,20 @@ from kivy.properties import ObjectProperty, StringProperty, BooleanProperty, Bou
 
 from kivy_garden.mapview import MapMarker
 
-from communication import client
-from misc.custom_threads import DisposableLoopThread
+from communication import capture, client, codec, metrics
+from communication.async_client import EventLoopThread, AsyncWLANClient
+from communication.config_sync import ConfigSync
+from communication.telemetry import decode_geodata, GEODATA_FLAG
+from communication.rate_control import RateController
+from misc.custom_threads import DisposableLoopThread, OVERRUN_SKIP
+from misc.scheduler import Scheduler, PRIORITY_LOW
+from misc.dispatch import MainThreadDispatcher
 from misc.configuration import Configuration
 from misc.event_handling import EventHandler
 from customwidgets.joystick import *
 
 from random import randrange, uniform
 from datetime import datetime
-from time import sleep
 
 import gettext
 
@@ -74,6 +80,9 @@ FONTS_DIRECTORY = './data/fonts'
 MAP_CACHE_DIRECTORY = './cache'
 
 CON_INTERVAL = .5
+REGISTER_INTERVAL = 1
+WAIT_ANIM_INTERVAL = 1
+RESPONSE_TIMEOUT_SEC = 2
 
 CON_STATUS = {
     10: 'too weak',
@@ -99,7 +108,22 @@ GERMAN_UMLAUTS = {
 
 # ********************* Plattformspezifisch ************************
 
-wlan_client = client.WLANClient()
+# Gemeinsame Arbeiterthreads für alle periodischen Aufgaben der Bildschirme
+scheduler = Scheduler()
+# Änderungen an der Oberfläche aus Hintergrundthreads, einmal pro Bild im Hauptthread ausgeführt
+dispatcher = MainThreadDispatcher()
+# Die gesamte Kommunikation mit der Drohne läuft in einer Ereignisschleife. Die Ergebnisse der
+# Coroutinen kommen über den dispatcher im Hauptthread an
+event_loop = EventLoopThread()
+event_loop.start()
+async_client = AsyncWLANClient(event_loop, dispatch=dispatcher.post)
+# Blockierende Schnittstelle zu derselben Verbindung für den Steuerthread und den Konfigurationsabgleich
+wlan_client = client.WLANClient(async_client)
+config_sync = ConfigSync(wlan_client)
+
+# Mitschnitt des Datenverkehrs, z.B. MSDROHNE_CAPTURE=./data (abspielen mit python -m communication.replay)
+if os.environ.get('MSDROHNE_CAPTURE'):
+    wlan_client.start_capture(capture.default_capture_path(os.environ['MSDROHNE_CAPTURE']))
 
 # *******************************************************************
 
@@ -1388,10 +1412,11 @@ class ConnectionScreen(CustomScreen):
     mit Netzwerknamen und Passwörter ins Netzwerk einklingt.
     Dann wird ein Server erstellt, mit dem dann über Sockets kommuniziert werden kann.
 
-    Wer verwenden zwei Threads.
-    Der register_thread, versucht über einen Befehl, die IP-Adresse des Gerätes zu registrieren und
-    der receive_thread wartet dann auf eine Antwort.
+    Die Registrierung läuft als eine Coroutine in der Ereignisschleife des async_client.
+    Sie baut die Verbindung auf, sendet über einen Befehl die Registrierung und wartet auf die Antwort,
+    ohne dafür einen Thread zu blockieren. Ohne Antwort wird es erneut versucht.
     Wenn diese Antwort positiv also eine 1 enthält, wird man zum Kontrollbildschirm weitergeleitet.
+    Beim Verlassen des Bildschirms wird die Coroutine abgebrochen.
     """
 
     def __init__(self, **kw):
@@ -1401,15 +1426,14 @@ class ConnectionScreen(CustomScreen):
 
         self.max_steps = 4
         self._current_step = 0
+        # Der Text, hinter dem die Punkte der Animation erscheinen
+        self._status_message = self.waiting_text
 
-        self._waiting_anim_thread = DisposableLoopThread()
-        self._waiting_anim_thread.add_function(self.wait_anim)
-
-        self._register_thread = DisposableLoopThread()
-        self._register_thread.add_function(self.register_ip)
-
-        self._receive_thread = DisposableLoopThread()
-        self._receive_thread.add_function(self.receive_response)
+        self._waiting_anim_task = None
+        # Das Future der Registrierung in der Ereignisschleife
+        self._registration = None
+        # Ist der Bildschirm aktiv? Die Registrierung läuft in der Ereignisschleife, nicht im Hauptthread
+        self._active = False
 
         self._draw_points = True
 
@@ -1429,8 +1453,11 @@ class ConnectionScreen(CustomScreen):
         toolbar.title = DroneApp.translate('Connection')
 
         self.ids.loading_anim.start_animation(self._draw_points)
-        self._waiting_anim_thread.save_start()
-        self._register_thread.save_start()
+        self._status_message = self.waiting_text
+        self._current_step = 0
+        self._waiting_anim_task = scheduler.schedule_periodic(self.wait_anim, WAIT_ANIM_INTERVAL, PRIORITY_LOW)
+        self._active = True
+        self._registration = async_client.submit(self.register(), self.on_registered)
         self._draw_points = False
         super(ConnectionScreen, self).on_enter(*args)
 
@@ -1440,9 +1467,12 @@ class ConnectionScreen(CustomScreen):
         """
 
         self.ids.loading_anim.stop_animation()
-        self._waiting_anim_thread.stop()
-        self._register_thread.stop()
-        self._receive_thread.stop()
+        scheduler.cancel(self._waiting_anim_task)
+        self._active = False
+        # Bricht auch das Warten auf die Antwort sofort ab
+        if self._registration is not None:
+            self._registration.cancel()
+            self._registration = None
         super(ConnectionScreen, self).on_leave(*args)
 
     def load_drawer(self, dt):
@@ -1477,60 +1507,86 @@ class ConnectionScreen(CustomScreen):
     def wait_anim(self) -> None:
         """
         Sorgt für eine Art Animation mit den Text, indem einfach periodisch Punkte hinzugefüt werden.
+        Läuft im Scheduler, der Text wird deshalb über den dispatcher im Hauptthread gesetzt.
         """
 
-        self._current_step += 1
-        if self._current_step == self.max_steps:
-            self.status.text = self.waiting_text
-            self._current_step = 0
-        else:
-            self.status.text += '.'
+        self._current_step = (self._current_step + 1) % self.max_steps
+        dispatcher.set_property(self.status, 'text', self._status_message + '.' * self._current_step)
 
-    def register_ip(self) -> None:
+    async def register(self):
         """
-        Sendet den Befehl 'register_ip' zu den Microcontroller, der dieses Gerät registriert und
-        damit die nächste Phase beginnen kann und der Benutzer die Drohne steuern kann.
+        Läuft in der Ereignisschleife. Sendet den Befehl 'register_ip' zu den Microcontroller, der dieses
+        Gerät registriert und damit die nächste Phase beginnen kann und der Benutzer die Drohne steuern kann.
+        Bleibt die Antwort aus, wird die Registrierung erneut gesendet.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls die Registrierung angenommen wurde, False, falls sie abgelehnt wurde,
+            oder None, falls der Bildschirm vorher verlassen wurde.
         """
-        print('Start registration')
-        if self.app_config['testcase']:
-            sleep(3)
-            self.manager.current = 'control'
-            return
 
-        sent_request = False
-        # Alle Stellen an den eine Nachricht über die Sockets gesendet wird, sollte durch ein
-        # Try und Catch-Block abgedeckt sein, da besonders hier viele Exception passieren können, die nicht
-        # code bedingt sind.
-        try:
-            wlan_client.reset(0)
-            ip, port = wlan_client.get_server_address()
-            wlan_client.connect(ip, port, 0)
+        if self.app_config['testcase']:
+            await asyncio.sleep(3)
+            return True
 
-            wlan_client.send_message(0, f'CMD|register_ip')
-            sent_request = True
-        except OSError as e:
-            print(traceback.format_exc())
+        # Nach on_leave() passiert nichts mehr, sonst würde reset() die Verbindung des
+        # Kontrollbildschirms zurücksetzen
+        while self._active:
+            print('Start registration')
+            # Alle Stellen an den eine Nachricht über die Sockets gesendet wird, sollte durch ein
+            # Try und Catch-Block abgedeckt sein, da besonders hier viele Exception passieren können, die nicht
+            # code bedingt sind.
+            try:
+                await async_client.reset()
+                ip, port = await async_client.get_server_address()
+                await async_client.connect(ip, port)
+
+                response = await async_client.request(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}register_ip',
+                                                      client.deadline_in(RESPONSE_TIMEOUT_SEC))
+            except OSError:
+                print(traceback.format_exc())
+                await asyncio.sleep(REGISTER_INTERVAL)
+                continue
+
+            # Keine Antwort innerhalb der Frist: die Registrierung wird erneut gesendet
+            if not response:
+                continue
 
-        if sent_request:
-            self._register_thread.stop()
-            self._receive_thread.save_start()
+            response_split = response.split(SEPARATOR)
+            if response_split[1:2] == ['1']:
+                # Mit der Sitzungs-ID baut der Client eine abgebrochene Verbindung selbst wieder auf
+                await async_client.start_session(response_split[2] if len(response_split) > 2 else '')
+                return True
+            if response_split[1:2] == ['0']:
+                return False
+            await asyncio.sleep(REGISTER_INTERVAL)
+        return None
 
-    def receive_response(self) -> None:
+    def on_registered(self, registered, error) -> None:
         """
-        Nachdem der Befehl übermittel wurde, wartet die App/Client auf eine Bestätigung.
+        Wird im Hauptthread aufgerufen, sobald die Registrierung beendet ist.
+
+        Parameters
+        ----------
+        registered: bool
+            Das Ergebnis von register()
+        error: Exception
+            Die Exception der Registrierung oder None
         """
 
-        try:
-            response = wlan_client.wait_for_response(0, flag='REGISTER')
+        # Nach on_leave() wurde die Registrierung abgebrochen
+        if not self._active or isinstance(error, asyncio.CancelledError):
+            return
+        if error is not None:
+            print(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+            return
 
-            response_split = response.split(SEPARATOR)
-            if response_split[1] == '1':
-                self.manager.current = 'control'
-            elif response_split[1] == '0':
-                self.status.text = DroneApp.translate('Connection to drone failed. Please try again')
-            self._receive_thread.stop()
-        except Exception as e:
-            print(e)
+        if registered:
+            self.manager.current = 'control'
+        elif registered is not None:
+            self._status_message = DroneApp.translate('Connection to drone failed. Please try again')
+            self.status.text = self._status_message
 
 
 class ControlScreen(CustomScreen):
@@ -1556,22 +1612,30 @@ class ControlScreen(CustomScreen):
         Gibt den momentanen Status an.
 
 
-    _send_thread: DisposableLoopThread
-        Ein Thread, der im Hintergrund Daten an den  Mikrocontroller sendet.
-    _data_thread: DisposableLoopThread
-        Ein Thread, der im Hintergrund die Sensordaten empfängt, die über den Mikrocontroller gesendet werden
-        die über den Mikrocontroller gesendet werden und diese verarbeitet.
-    _connection_thread: DisposableLoopThread
-        Ein Thread, der im Hintergrund die Verbindungsstärke empfängt,
-         die über den Mikrocontroller gesendet werden und diese verarbeitet.
+    _control_thread: DisposableLoopThread
+        Ein Thread, der im Hintergrund mit eigenem Takt Daten an den Mikrocontroller sendet und
+        versetzt dazu mit der Rate der Sensordaten die empfangenen Sensordaten verarbeitet.
+        Er wird nur einmal erstellt und beim Verlassen des Bildschirms pausiert.
+    _connection_task: concurrent.futures.Future
+        Das Future der Coroutine watch_connection() in der Ereignisschleife, die die Verbindung aufbaut
+        und dann periodisch die Verbindungsstärke abfragt und verarbeitet.
 
     r_joystick: Joystick
         Rechter Joystick
     l_joystick: Joystick
         Linker Joystick
+    telemetry: Telemetry
+        Die zuletzt empfangenen Sensordaten oder None, solange noch keine empfangen wurden.
+        Sie sind die Grundlage für Wegpunkte und die Karte, die Texte der Anzeige werden nur daraus erzeugt.
+    rate_controller: RateController
+        Wählt die Raten der Steuer- und Sensordaten passend zur Verbindungsqualität.
+    _esp_signal_strength: int
+        Die zuletzt von der Drohne gemeldete Signalstärke oder None.
 
     _created: bool
         Wurden die Joystick schon erstellt?
+    _control_sequence: int
+        Sequenznummer des zuletzt gesendeten Steuerrahmens.
     _hover_mode: bool
         befindet sich die Drohne im hover_mode?
         Hover_mode ist ein Modus in dem die Drohne ohne zusätzliche Daten von dem Client auf der selben H
@@ -1609,22 +1673,27 @@ class ControlScreen(CustomScreen):
         self.l_joystick.inner_radius = dp(15)
 
         self.esp_connection = DroneApp.translate('strong')
+        self.telemetry = None
+        self.rate_controller = RateController()
+        self._esp_signal_strength = None
 
-        self._data_thread = DisposableLoopThread()
-        self._send_thread = DisposableLoopThread()
-        self._connection_thread = DisposableLoopThread()
-
-        self._send_thread.add_function(self.send_data)
-        self._send_thread.interval_sec = CON_INTERVAL
+        self._control_thread = DisposableLoopThread()
+        self._connection_task = None
 
-        self._data_thread.add_function(self.check_data)
-        self._data_thread.interval_sec = CON_INTERVAL
+        # Jede Funktion hat ihren eigenen festen Takt, damit z.B. 20 Hz auch 20 Hz bleiben. Veraltete
+        # Steuerdaten braucht niemand, verpasste Durchläufe werden also nicht nachgeholt.
+        # Die Sensordaten laufen einen halben Steuertakt versetzt, damit sie keinen Steuerrahmen verzögern.
+        control_interval_sec = self.rate_controller.control_interval_sec()
+        self._control_thread.overrun_policy = OVERRUN_SKIP
+        self._control_thread.add_function(self.send_data, control_interval_sec)
+        self._control_thread.add_function(self.check_data, 1 / self.rate_controller.telemetry_rate_hz(),
+                                          control_interval_sec / 2)
 
-        self._connection_thread.add_function(self.check_connection)
-        self._connection_thread.interval_sec = CON_INTERVAL
+        wlan_client.on_session_lost.add_function(self.on_session_lost)
 
         self._created = False
         self._hover_mode = False
+        self._control_sequence = 0
 
         self._waypoints = self.app_config['waypoints']
         self._names = [waypoint['name'] for waypoint in self._waypoints]
@@ -1641,19 +1710,9 @@ class ControlScreen(CustomScreen):
         if not self.app_config['testcase']:
             self.toggle_hover_mode(value=False)
 
-            ip, port = wlan_client.get_server_address()
-
-            wlan_client.connect(ip, port, 1)
-            wlan_client.connect(ip, port, 2)
-            wlan_client.connect(ip, port, 3)
-
-            # 1. socket: Daten senden
-            # 2. socket: Sensordaten abfragen
-            # 3: socket: Verbindungsdaten abfragen
-
-            self._data_thread.save_start()
-            self._connection_thread.save_start()
-            self._send_thread.save_start()
+            # Verbindungsaufbau und Abfrage der Verbindungsstärke laufen in der Ereignisschleife
+            self._connection_task = async_client.submit(self.watch_connection())
+            self._control_thread.save_start()
 
         MDApp.get_running_app().connected = True
 
@@ -1682,6 +1741,41 @@ class ControlScreen(CustomScreen):
                 self._markers.append(marker)
         super(ControlScreen, self).on_enter(*args)
 
+    async def watch_connection(self) -> None:
+        """
+        Läuft in der Ereignisschleife, bis der Bildschirm verlassen wird. Baut die Verbindung auf und
+        fragt dann alle CON_INTERVAL Sekunden die Verbindungsstärke ab (siehe check_connection()).
+        """
+
+        await self.open_connection()
+        while True:
+            await self.check_connection()
+            await asyncio.sleep(CON_INTERVAL)
+
+    async def open_connection(self) -> None:
+        """
+        Läuft in der Ereignisschleife. Stellt sicher, dass die Verbindung besteht, öffnet optional
+        den UDP-Kanal und handelt die Raten aus.
+        """
+
+        try:
+            ip, port = await async_client.get_server_address()
+
+            # Alle Kanäle laufen über die bei der Registrierung aufgebaute Verbindung:
+            # CHANNEL_CONTROL: Daten senden
+            # CHANNEL_SENSOR: Sensordaten abfragen
+            # CHANNEL_CONNECTION: Verbindungsdaten abfragen
+            await async_client.connect(ip, port)
+
+            # Optional laufen die Joystickdaten über UDP, die Befehle bleiben bei TCP
+            if self.app_config.get('udp_control', False):
+                async_client.open_datagram(ip, port)
+        except OSError:
+            # Besteht eine Sitzung, baut der WLANClient die Verbindung selbst wieder auf
+            print(traceback.format_exc())
+
+        self.apply_rates()
+
     def on_leave(self, *args) -> None:
         """
         siehe line. 757
@@ -1689,9 +1783,14 @@ class ControlScreen(CustomScreen):
 
         # Beende die Threads
         if not self.app_config['testcase']:
-            self._data_thread.stop()
-            self._send_thread.stop()
-            self._connection_thread.stop()
+            if wlan_client.is_connected():
+                wlan_client.unsubscribe_telemetry()
+            # Der Thread bleibt bestehen und wird beim nächsten Betreten fortgesetzt
+            self._control_thread.pause()
+            # Bricht auch eine Anfrage ab, die gerade auf ihre Antwort wartet
+            if self._connection_task is not None:
+                self._connection_task.cancel()
+                self._connection_task = None
             # Ist der Benutzer z.B in den Einstellungen, soll die Drohne auf gleicher Höhe bleiben
             if self.manager.current in self._control_screens[2:]:
                 self.toggle_hover_mode(value=True)
@@ -1741,30 +1840,41 @@ class ControlScreen(CustomScreen):
         """
         Diese Funktion dient dazu ein Wegpunkt zu setzen.
         Es wird also ein neuer Wegpunkt erstellt und in der Konfiguration gespeichert.
+        Ohne empfangene Sensordaten wird kein Wegpunkt gesetzt, da seine Position unbekannt ist.
         """
 
+        telemetry = self.telemetry
+        if telemetry is None:
+            self.log_message(DroneApp.translate('No sensor data received yet'), 'warning')
+            return
+
         # Erstelle dynamisch den Namen des Wegpunkts, ohne dass sie sich doppeln
         name = get_waypoint_name(self._names)
 
-        # Erstelle den Wegpunkt mithilfe der momentanen Sensordaten
+        # Erstelle den Wegpunkt mithilfe der momentanen Sensordaten, das Datum ist der Zeitpunkt des Setzens
         new_waypoint = {
             'img': './data/res/example_landscape.jpg',
             'name': name,
             "date": datetime.now().strftime("%m/%d/%Y, %H:%M:%S"),
-            "altitude": self.altitude.split(':')[1].split()[0],
-            "longitude": self.longitude.split(':')[1].split()[0],
-            "latitude": self.latitude.split(':')[1].split()[0]
+            "altitude": f'{telemetry.altitude:.2f}',
+            "longitude": f'{telemetry.longitude:.6f}',
+            "latitude": f'{telemetry.latitude:.6f}'
         }
 
         # Speicher den Wegpunkt in der Konfigurationsdatei
         self.app_config['waypoints'].append(new_waypoint)
         self.configuration.save_config()
 
+        if self.app_config['show_markers']:
+            marker = MapMarker(lon=telemetry.longitude, lat=telemetry.latitude)
+            self.ids.map.add_marker(marker)
+            self._markers.append(marker)
+
         self.log_message(DroneApp.translate('Waypoint') + ': ' + name + ' ' + DroneApp.translate('set'))
 
     def send_data(self) -> None:
         """
-        Wird von dem _send_thread aufgerufen.
+        Wird von dem _control_thread aufgerufen.
         In dieser Funktion werden die relativen Positionen der inneren, beweglichen Kreise zu den
         äußeren Kreise ermittelt und zum ESP32 gesendet.
         """
@@ -1773,65 +1883,142 @@ class ControlScreen(CustomScreen):
         l_relative_pos = self.l_joystick.get_center_pt()
 
         if not self.app_config['testcase']:
-            # Format: RJ|POS_X|POS_Y
-            message = f'RJ{SEPARATOR}{r_relative_pos[0]}{SEPARATOR}{r_relative_pos[1]}'
-            wlan_client.send_message(1, message)
-            # Format: LJ|POS_X|POS_Y
-            message = f'LJ{SEPARATOR}{l_relative_pos[0]}{SEPARATOR}{l_relative_pos[1]}'
-            wlan_client.send_message(1, message)
+            # Beide Joysticks in einem binären Rahmen, Format siehe communication/codec.py
+            self._control_sequence = (self._control_sequence + 1) % codec.SEQUENCE_MODULO
+            frame = codec.encode_control_frame(self._control_sequence, codec.timestamp_ms(),
+                                               r_relative_pos, l_relative_pos)
+            # Bricht die Verbindung ab, baut der WLANClient sie selbst wieder auf
+            try:
+                if self.app_config.get('udp_control', False):
+                    wlan_client.send_datagram(frame)
+                else:
+                    wlan_client.send_bytes(client.CHANNEL_CONTROL, frame)
+            except OSError:
+                pass
 
     def check_data(self) -> None:
         """
-        Wird von dem _data_thread aufgerufen.
-        In dieser Funktion werden die Daten vom ESP32 empfangen, aufbereitet und in den
-        zugehörigen Variablen gespeichert.
+        Wird von dem _control_thread aufgerufen.
+        In dieser Funktion werden die Daten vom ESP32 empfangen, einmal zu einem Telemetry-Objekt
+        dekodiert und in 'self.telemetry' gespeichert. Die Texte der Anzeige werden nur neu gesetzt,
+        wenn sie sich tatsächlich ändern. Die Daten werden nicht abgefragt, sondern von der Drohne
+        nach subscribe_telemetry() mit der ausgehandelten Rate gesendet.
+        Es wird nicht gewartet, da der Thread auch die Steuerdaten sendet. Nur die neueste
+        bereits empfangene Nachricht zählt.
         """
 
-        wlan_client.send_message(2, f'CMD{SEPARATOR}get_sensor_data')
+        if not wlan_client.has_pending_response(client.CHANNEL_SENSOR):
+            return
 
         # Format GEODATA|SPEED|ALTITUDE|LATITUDE|LONGITUDE
-        response = wlan_client.wait_for_response(2, flag='GEODATA')
-        response_split = response.split(SEPARATOR)
+        try:
+            response = wlan_client.wait_for_latest_response(client.CHANNEL_SENSOR, flag=GEODATA_FLAG,
+                                                            deadline=client.deadline_in(0))
+        except OSError:
+            # Die Verbindung ist abgebrochen, der WLANClient baut sie im Hintergrund wieder auf
+            return
+        if not response:
+            return
+        telemetry = decode_geodata(response)
+        if telemetry is None:
+            return
+        self.telemetry = telemetry
+
+        self.update_property('speed', f'S: {telemetry.speed:.2f}')
+        self.update_property('altitude', f'H: {telemetry.altitude:.2f}')
+        self.update_property('latitude', f'La: {telemetry.latitude:.6f}')
+        self.update_property('longitude', f'Lo: {telemetry.longitude:.6f}')
+
+    def update_property(self, name: str, value: str) -> None:
+        """
+        Setzt eine Kivy-Property nur, wenn sich der Wert geändert hat, damit die Anzeige nicht
+        bei jeder Nachricht neu gezeichnet wird. Gesetzt wird im Hauptthread beim nächsten Bild,
+        kommen bis dahin mehrere Werte, zählt nur der neueste.
 
-        self.speed = f'S: {response_split[1]}'
-        self.altitude = f'H: {response_split[2]}'
-        self.latitude = f'La: {response_split[3]}'
-        self.longitude = f'Lo: {response_split[4]}'
+        Parameters
+        ----------
+        name: str
+            Der Name der Property
+        value: str
+            Der neue Wert
+        """
 
-    def check_connection(self) -> None:
+        dispatcher.set_property(self, name, value)
+
+    async def check_connection(self) -> None:
         """
-        Wird von dem _connection_thread aufgerufen.
+        Wird von watch_connection() in der Ereignisschleife aufgerufen.
         In dieser Funktion werden die Verbindungsdaten vom ESP32 empfangen, aufbereitet und in den
         zugehörigen Variablen gespeichert. Ist die Verbindung zu schwach wird eine Warnung im
-        Terminal ausgegeben.
+        Terminal ausgegeben. Zudem werden die Raten der Steuer- und Sensordaten angepasst.
         """
 
-        esp_con = self.check_esp_connection()
+        try:
+            esp_con = await self.check_esp_connection()
+        except OSError:
+            esp_con = None
+        # Nach der Anfrage, damit eine ausgebliebene Antwort schon als Verlust zählt
         own_con = self.check_own_connection()
-        self.esp_connection_icon = CON_ICON[esp_con[0]]
-        status_keys = list(CON_STATUS.keys())
-        if esp_con[1] == status_keys[0]:
-            self.log_message(DroneApp.translate('WARNING: WEAK CONNECTION(ESP32)'), 'warning')
-        if own_con[1] == status_keys[0]:
-            self.log_message(DroneApp.translate('WARNING: WEAK CONNECTION'), 'warning')
+        signal_strength = self._esp_signal_strength if esp_con is not None else None
+        if self.rate_controller.update(signal_strength, wlan_client.get_statistics()):
+            self.apply_rates()
+
+        # Läuft in der Ereignisschleife: die Anzeige wird über den dispatcher im Hauptthread geändert
+        weakest_status = list(CON_STATUS.values())[0]
+        if own_con[1] == weakest_status:
+            dispatcher.post(self.log_message, DroneApp.translate('WARNING: WEAK CONNECTION'), 'warning')
+        if esp_con is None:
+            return
 
-        self.esp_connection = DroneApp.translate(esp_con[1])
+        self.update_property('esp_connection_icon', CON_ICON[esp_con[0]])
+        if esp_con[1] == weakest_status:
+            dispatcher.post(self.log_message, DroneApp.translate('WARNING: WEAK CONNECTION(ESP32)'), 'warning')
 
-    def check_esp_connection(self) -> (int, str):
+        self.update_property('esp_connection', DroneApp.translate(esp_con[1]))
+
+    async def check_esp_connection(self) -> (int, str):
         """
         Sendet den get_conn_data Befehl, der dafür sorgt dass der Server die
-        Verbindungsstärke zurücksendet.
+        Verbindungsstärke zurücksendet, und wartet auf die Antwort, ohne die Ereignisschleife zu blockieren.
+
+        Returns
+        -------
+        <nameless>: tuple(int, str)
+            Siehe get_connectivity() oder None, falls keine oder keine gültige CONDATA-Antwort
+            innerhalb der Frist kam (z.B. 'Permission denied.').
         """
 
-        wlan_client.send_message(3, f'CMD{SEPARATOR}get_conn_data')
-        response = wlan_client.wait_for_response(3, flag='CONDATA')
+        response = await async_client.request(client.CHANNEL_CONNECTION, f'CMD{SEPARATOR}get_conn_data',
+                                              client.deadline_in(RESPONSE_TIMEOUT_SEC))
+        if not response:
+            return None
 
         data = response.split(SEPARATOR)
+        if data[0] != 'CONDATA' or len(data) < 2 or not data[1].isdigit():
+            return None
+
+        self._esp_signal_strength = int(data[1])
         return self.get_connectivity(data[1])
 
+    def apply_rates(self) -> None:
+        """
+        Übernimmt die Raten des RateController: Die Intervalle im _control_thread werden ab dem nächsten
+        Durchlauf verwendet, die Rate der Sensordaten wird mit der Drohne neu ausgehandelt.
+        Auf die Antwort wird nicht gewartet, die Methode kann also auch in der Ereignisschleife laufen.
+        """
+
+        self._control_thread.set_interval(self.send_data, self.rate_controller.control_interval_sec())
+        self._control_thread.set_interval(self.check_data, 1 / self.rate_controller.telemetry_rate_hz())
+        try:
+            wlan_client.subscribe_telemetry(self.rate_controller.telemetry_rate_hz())
+        except OSError:
+            # Die Rate ist gespeichert, nach dem Wiederaufbau der Verbindung wird damit neu abonniert
+            pass
+
     def check_own_connection(self) -> (int, str):
         """
-        Prüft die eigene Verbindungsstärke zum Netzwerk
+        Prüft die eigene Verbindungsqualität anhand der vom WLANClient gemessenen
+        Antwortzeiten und verlorenen Anfragen (siehe communication/metrics.py).
 
         Returns
         -------
@@ -1841,7 +2028,18 @@ class ControlScreen(CustomScreen):
             wobei 100 die höchste ist.
         """
 
-        return self.get_connectivity('100')
+        quality = metrics.link_quality(wlan_client.get_statistics())
+        return self.get_connectivity(str(quality))
+
+    def on_session_lost(self) -> None:
+        """
+        Wird vom WLANClient aufgerufen, wenn die Drohne die Sitzung nach einem Verbindungsabbruch
+        nicht mehr kennt. Der Benutzer muss sich dann neu verbinden.
+        """
+
+        if self.manager is not None and self.manager.current in self._control_screens:
+            # Mehrfache Meldungen führen nur zu einem shutdown()
+            dispatcher.post(self.shutdown, key=(id(self), 'shutdown'))
 
     def toggle_hover_mode(self, value=None) -> None:
         """
@@ -1861,7 +2059,7 @@ class ControlScreen(CustomScreen):
             self.ids.hover_mode_btn.icon = 'butterfly'
             self.log_message('Hover mode deactivated', 'information')
         if not self.app_config['testcase']:
-            wlan_client.send_message(0, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}{self._hover_mode}')
+            wlan_client.send_message(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}{self._hover_mode}')
 
     def shutdown(self) -> None:
         """
@@ -1871,11 +2069,11 @@ class ControlScreen(CustomScreen):
 
         self.clear_terminal()
         if not self.app_config['testcase']:
-            wlan_client.send_message(0, f'CMD{SEPARATOR}reset')
-        wlan_client.reset()
+            wlan_client.send_message(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}reset')
+        # Im Hintergrund, damit der Hauptthread nicht wartet, bis der letzte Befehl gesendet ist
+        async_client.submit(async_client.reset())
 
-        self._send_thread.stop()
-        self._data_thread.stop()
+        self._control_thread.pause()
 
         MDApp.get_running_app().connected = False
         self.go_back('home')
@@ -1939,6 +2137,8 @@ class SettingsScreen(CustomScreen):
     def __init__(self, **kw):
         super(SettingsScreen, self).__init__(**kw)
 
+        self._sync_task = None
+
     def on_enter(self, *args) -> None:
         """
         siehe line 746.
@@ -2000,13 +2200,21 @@ class SettingsScreen(CustomScreen):
 
     def notify(self) -> None:
         """
-        In dieser Funktion wird der ESP32 mithilfe eines Command benachrichtigt,
-        der dann die übergebene Konfigurationsdatei nimmt und sich abspeichert.
+        In dieser Funktion wird der ESP32 über die geänderte Konfiguration benachrichtigt.
+        Gesendet werden nur die Änderungen seit der zuletzt bestätigten Version, in Stücken,
+        die der ESP32 einzeln bestätigt (siehe communication/config_sync.py).
+        Das Warten auf die Bestätigungen läuft im Scheduler. Wird mehrmals kurz hintereinander
+        gespeichert, ersetzt die neue Aufgabe eine noch nicht gestartete, gesendet wird dann
+        die zu diesem Zeitpunkt aktuelle Konfiguration.
         """
 
-        if not self.app_config['testcase']:
-            json_string = self.config_obj.get_json_string_from_dict(self.machine_config)
-            wlan_client.send_message(0, f'CMD{SEPARATOR}set_config{SEPARATOR}{json_string}')
+        if self.app_config['testcase']:
+            return
+
+        if self._sync_task is not None:
+            scheduler.cancel(self._sync_task)
+        self._sync_task = scheduler.schedule_once(lambda: config_sync.sync(self.machine_config),
+                                                  priority=PRIORITY_LOW)
 
 
 class WaypointsScreen(CustomScreen):
@@ -2514,6 +2722,12 @@ class DroneApp(MDApp):
         self.configuration = Configuration('./data/config.json', True)
         self.configuration.on_config_changed.add_function(self.on_config_changed)
 
+        # Beim Kaltstart zuerst die zuletzt funktionierende Adresse der Drohne versuchen
+        last_address = self.configuration.config_dict['app'].get('last_server_address')
+        if last_address:
+            wlan_client.known_address = (last_address[0], int(last_address[1]))
+        wlan_client.on_address_resolved.add_function(self.save_server_address)
+
         self.translated_widgets = []
         self.translated_parts = []
 
@@ -2529,6 +2743,38 @@ class DroneApp(MDApp):
 
         self.configuration.load_config()
 
+    def save_server_address(self, ip: str, port: int) -> None:
+        """
+        Wird ausgelöst, sobald eine Verbindung zu einer neuen Adresse der Drohne gelungen ist.
+        Die Adresse wird gespeichert, damit sie beim nächsten Start sofort versucht werden kann.
+        Läuft im Thread des Verbindungsaufbaus, gespeichert wird deshalb im Hauptthread, da
+        save_config() die Konfiguration der Oberfläche neu lädt.
+
+        Parameters
+        ----------
+        ip: str
+            Die IP-Adresse der Drohne
+        port: int
+            Der Port der Drohne
+        """
+
+        dispatcher.post(self._store_server_address, ip, port, key=(id(self), 'server_address'))
+
+    def _store_server_address(self, ip: str, port: int) -> None:
+        """
+        Schreibt die Adresse der Drohne in die Konfiguration. Nur im Hauptthread aufrufen.
+
+        Parameters
+        ----------
+        ip: str
+            Die IP-Adresse der Drohne
+        port: int
+            Der Port der Drohne
+        """
+
+        self.configuration.config_dict['app']['last_server_address'] = [ip, port]
+        self.configuration.save_config()
+
     def bind_text(self, widget, text, entire_text=None) -> str:
         """
         Registriert den Label. Durch die update_text Funktion kann dann der Text aktualisiert werden.
@@ -2629,6 +2875,8 @@ class DroneApp(MDApp):
         self.set_translation()
         self.load_kv_files()
         self.root_widget = DroneRoot()
+        # Einmal pro Bild alle Änderungen der Hintergrundthreads übernehmen
+        Clock.schedule_interval(dispatcher.drain, 0)
         return self.root_widget
 
     def on_stop(self) -> None:
@@ -2637,6 +2885,11 @@ class DroneApp(MDApp):
         """
 
         self.cut_connection()
+        # Die Nachrichten werden im Hintergrund gesendet, der Prozess endet aber gleich
+        wlan_client.flush(client.deadline_in(RESPONSE_TIMEOUT_SEC))
+        wlan_client.stop_capture()
+        scheduler.stop(RESPONSE_TIMEOUT_SEC)
+        event_loop.stop(RESPONSE_TIMEOUT_SEC)
 
     def on_pause(self) -> bool:
         """
@@ -2650,7 +2903,7 @@ class DroneApp(MDApp):
         """
 
         if not self.configuration.config_dict['app']['testcase']:
-            wlan_client.send_message(0, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}True')
+            wlan_client.send_message(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}True')
 
         Clock.schedule_once(self.cut_connection, 10)
         return True
@@ -2663,11 +2916,11 @@ class DroneApp(MDApp):
         Clock.unschedule(self.cut_connection)
 
         if not self.configuration.config_dict['app']['testcase']:
-            wlan_client.send_message(0, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}False')
+            wlan_client.send_message(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}set_hover_mode{SEPARATOR}False')
 
     def cut_connection(self) -> None:
         if not self.configuration.config_dict['app']['testcase']:
-            wlan_client.send_message(0, f'CMD{SEPARATOR}reset')
+            wlan_client.send_message(client.CHANNEL_COMMAND, f'CMD{SEPARATOR}reset')
 
     @staticmethod
     def load_kv_files() -> None:
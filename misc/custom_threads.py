@@ -8,8 +8,16 @@
 # ********************************************************************
 
 from misc.event_handling import EventHandler
-from threading import Thread
-from time import sleep
+from threading import Thread, Event, current_thread
+from time import monotonic
+
+# Was passiert, wenn ein Durchlauf länger dauert als das Intervall (siehe fixed_rate)
+OVERRUN_CATCH_UP = 'catch_up'
+OVERRUN_SKIP = 'skip'
+# So viele verpasste Durchläufe werden bei OVERRUN_CATCH_UP höchstens direkt nachgeholt
+MAX_CATCH_UP_TICKS = 3
+# So lange wartet restart() auf das Ende des alten Durchlaufs
+RESTART_TIMEOUT_SEC = 2
 
 
 class DisposableLoopThread(Thread):
@@ -18,7 +26,15 @@ class DisposableLoopThread(Thread):
     in einer Schleife aufrufen und gestoppt werden können. Zudem werden die Ergebnisse
     der Funktionen unabhängig voneinander in einer Liste gespeichert.
     Man kann zudem Funktionen aufrufen, sobald der Thread gestoppt wurde.
-    Die Häufigkeit, wie oft die Funktion aufgerufen wird, bleibt bei jeder Funktion jedoch gleich.
+    Die Häufigkeit, wie oft die Funktion aufgerufen wird, bleibt bei jeder Funktion gleich, es sei denn,
+    eine Funktion bekommt mit add_function() ein eigenes Intervall und einen Versatz. Dann läuft jede
+    Funktion auf ihrem eigenen festen Takt, alle Takte beginnen beim Start des Threads. So kann ein Thread
+    z.B. Steuerdaten mit 20 Hz und Sensordaten mit 10 Hz verarbeiten.
+    Mit 'fixed_rate' beginnen die Durchläufe in festen Abständen auf einem monotonen Zeitplan,
+    statt nach jedem Durchlauf noch das ganze Intervall zu warten. Die Laufzeit der Funktionen
+    verschiebt den Takt dann nicht.
+    Gewartet wird auf ein Event, sodass stop() und pause() sofort wirken, statt erst nach dem Intervall.
+    Mit pause() und resume() bleibt derselbe Thread über Bildschirmwechsel hinweg bestehen.
     Parent: Thread
 
     Attributes
@@ -26,24 +42,49 @@ class DisposableLoopThread(Thread):
     event_handler: EventHandler
         Die Funktionen, die in der Schleife aufgerufen werden sollen.
     on_finished_events: EventHandler
-        Die Funktionen, aufgerufen werden sollen, sobald der Thread gestoppt wurde.
+        Die Funktionen, aufgerufen werden sollen, sobald der Thread gestoppt oder pausiert wurde,
+        z.B. um blockierende Empfangsaufrufe abzubrechen.
     started: bool
         Wurde der Thread gestartet?
     proceed: bool
         Sollen die Funktionen weiterhin aufgerufen werden, oder wurde der Thread gestoppt?
+    paused: bool
+        Ist der Thread pausiert? Er läuft weiter, ruft aber keine Funktionen auf, bis resume() aufgerufen wird.
     interval_sec: int
         Das Intervall, in der zwischen jeden Durchlauf gewartet wird.
-    results: list
+    fixed_rate: bool
+        Ist 'interval_sec' der Abstand zwischen den Anfängen der Durchläufe (feste Rate) statt
+        die Pause nach jedem Durchlauf?
+    overrun_policy: str
+        Bei fester Rate: Werden zu spät gekommene Durchläufe direkt nachgeholt (OVERRUN_CATCH_UP,
+        höchstens MAX_CATCH_UP_TICKS) oder ausgelassen (OVERRUN_SKIP)?
+    ticks: int
+        Anzahl der Durchläufe seit dem Start.
+    overruns: int
+        Anzahl der Durchläufe, nach denen der nächste Zeitpunkt schon verstrichen war.
+    missed_ticks: int
+        Anzahl der ausgelassenen Durchläufe.
+    results: dict
         Die Ergebnisse jeder Funktionen.
+    timings: dict
+        Funktion -> (Intervall, Versatz) für Funktionen mit eigenem Takt.
 
     Methods
     -------
-    get_json_string():
-        Gibt den Inhalt der Konfiguration als JSON-string zurück.
-    load_config():
-        lädt die Konfiguration
-    save_config():
-        speichert die Konfiguration
+    save_start():
+        Startet den Thread oder setzt ihn fort.
+    stop(timeout=None):
+        Beendet den Thread sofort und wartet optional auf sein Ende.
+    pause():
+        Hält die Schleife an, ohne den Thread zu beenden.
+    resume():
+        Setzt die angehaltene Schleife fort.
+    add_function(function, interval_sec=None, phase_sec=0.0):
+        Fügt eine Funktion hinzu.
+    set_interval(function, interval_sec):
+        Ändert das Intervall einer Funktion.
+    remove_function(function):
+        Entfernt eine Funktion.
     """
 
     def __init__(self):
@@ -59,17 +100,34 @@ class DisposableLoopThread(Thread):
 
         self.started = False
         self.proceed = False
+        self.paused = False
         self.interval_sec = 1
+        self.fixed_rate = False
+        self.overrun_policy = OVERRUN_SKIP
+
+        self.ticks = 0
+        self.overruns = 0
+        self.missed_ticks = 0
 
         self.results = {}
+        self.timings = {}
+
+        # Gesetzt, solange die Schleife nicht pausiert ist
+        self._active = Event()
+        self._active.set()
+        # Weckt die Schleife aus dem Warten zwischen den Durchläufen
+        self._wakeup = Event()
 
     def save_start(self) -> None:
         """
         Startet den Thread, wobei jeder Thread nur einmal gestartet werden kann. Diese Funktion ist
         also gegenüber der in der Elternklasse: Thread()-Klasse definierten, start()-Funktion zu empfehlen.
+        Ein pausierter Thread wird fortgesetzt, nur ein beendeter wird neu erstellt.
         """
 
-        if self.started:
+        if self.started and self.proceed and self.is_alive():
+            self.resume()
+        elif self.started:
             self.restart()
         else:
             self.start()
@@ -77,15 +135,38 @@ class DisposableLoopThread(Thread):
     def restart(self) -> None:
         """
         Startet den Thread neu, indem der Konstruktor aufgerufen wird und setzt sie wieder mit den
-        alten Variablen gleich.
+        alten Variablen gleich. Läuft nach stop() noch eine Funktion, wird erst auf das Ende des
+        alten Threads gewartet, sonst liefen zwei Schleifen gleichzeitig.
+
+        Raises
+        ------
+        RuntimeError
+            Falls der alte Thread nicht innerhalb von RESTART_TIMEOUT_SEC endet oder restart()
+            aus dem Thread selbst aufgerufen wird.
         """
 
+        if self.is_alive():
+            if self is current_thread():
+                raise RuntimeError('A DisposableLoopThread cannot restart itself')
+            self.proceed = False
+            self._wakeup.set()
+            self._active.set()
+            self.join(RESTART_TIMEOUT_SEC)
+            if self.is_alive():
+                raise RuntimeError('The previous run of the thread is still busy')
+
         interval_sec = self.interval_sec
+        fixed_rate = self.fixed_rate
+        overrun_policy = self.overrun_policy
+        timings = self.timings
         event_handler = self.event_handler
         on_finished_event_handler = self.on_finished_events
 
         self.__init__()
         self.interval_sec = interval_sec
+        self.fixed_rate = fixed_rate
+        self.overrun_policy = overrun_policy
+        self.timings = timings
         self.event_handler = event_handler
         self.on_finished_events = on_finished_event_handler
 
@@ -97,11 +178,138 @@ class DisposableLoopThread(Thread):
         Die Hauptfunktion jedes Threads. Diese Funktion läuft in einer Dauerschleife bis,
         das Objekt zerstört oder das Programm beendet wird.
         Die Ergebnisse werden in 'self.results' gespeichert.
+        Während der Thread pausiert ist, wartet er, ohne Rechenzeit zu verbrauchen.
         """
 
         while self.proceed:
+            self._active.wait()
+            if not self.proceed:
+                break
+
+            self._wakeup.clear()
+            if self.timings:
+                self._run_multi_rate()
+            else:
+                self._run_single_rate()
+
+    def _is_running(self) -> bool:
+        """
+        Gibt zurück, ob die Schleife weiterlaufen soll (weder gestoppt noch pausiert).
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls weitergemacht wird.
+        """
+
+        return self.proceed and self._active.is_set()
+
+    def _sleep(self, seconds: float) -> None:
+        """
+        Wartet, bis die Zeit abgelaufen ist oder stop() bzw. pause() aufgerufen wird.
+
+        Parameters
+        ----------
+        seconds: float
+            Die Wartezeit
+        """
+
+        self._wakeup.wait(max(0.0, seconds))
+        # Ein Wecken zwischen pause() und resume() ist schon erledigt
+        if self._is_running():
+            self._wakeup.clear()
+
+    def _run_single_rate(self) -> None:
+        """
+        Die Schleife, wenn alle Funktionen mit 'interval_sec' laufen.
+        """
+
+        next_tick = monotonic()
+        while self._is_running():
             self.results = self.event_handler.invoke()
-            sleep(self.interval_sec)
+            self.ticks += 1
+
+            if not self.fixed_rate or self.interval_sec <= 0:
+                self._sleep(self.interval_sec)
+                continue
+
+            next_tick = self._next_tick(next_tick, monotonic(), self.interval_sec)
+            self._sleep(next_tick - monotonic())
+
+    def _run_multi_rate(self) -> None:
+        """
+        Die Schleife, wenn Funktionen einen eigenen Takt haben. Jede Funktion wird zu ihren eigenen
+        Zeitpunkten aufgerufen (erster Aufruf + Versatz + n * Intervall), dazwischen schläft der Thread bis
+        zum nächsten fälligen Zeitpunkt. Funktionen ohne eigenen Takt laufen mit 'interval_sec'.
+        """
+
+        due = {}
+        while self._is_running():
+            now = monotonic()
+            ran = False
+            functions = list(self.event_handler.events)
+            # Entfernte Funktionen dürfen den nächsten Zeitpunkt nicht mehr bestimmen
+            for function in list(due):
+                if function not in functions:
+                    del due[function]
+
+            for function in functions:
+                if not self._is_running():
+                    break
+                interval_sec, phase_sec = self.timings.get(function, (self.interval_sec, 0.0))
+                next_run = due.setdefault(function, now + phase_sec)
+                if next_run > now:
+                    continue
+
+                self.results[function] = function()
+                ran = True
+                due[function] = self._next_tick(next_run, monotonic(), interval_sec)
+
+            if ran:
+                self.ticks += 1
+            if due:
+                self._sleep(min(due.values()) - monotonic())
+            else:
+                self._sleep(self.interval_sec)
+
+    def _next_tick(self, next_tick: float, now: float, interval_sec: float) -> float:
+        """
+        Berechnet bei fester Rate den Zeitpunkt des nächsten Durchlaufs. Liegt er schon in der
+        Vergangenheit, wird er je nach 'overrun_policy' sofort nachgeholt oder ausgelassen.
+
+        Parameters
+        ----------
+        next_tick: float
+            Der geplante Zeitpunkt (monotonic()) des gerade beendeten Durchlaufs
+        now: float
+            Die aktuelle Zeit (monotonic())
+        interval_sec: float
+            Das Intervall
+
+        Returns
+        -------
+        <nameless>: float
+            Der geplante Zeitpunkt des nächsten Durchlaufs
+        """
+
+        if interval_sec <= 0:
+            return now
+
+        next_tick += interval_sec
+        if now <= next_tick:
+            return next_tick
+
+        self.overruns += 1
+        # Alle Zeitpunkte bis einschließlich jetzt sind verpasst
+        missed = int((now - next_tick) // interval_sec) + 1
+        if self.overrun_policy == OVERRUN_CATCH_UP:
+            # Höchstens MAX_CATCH_UP_TICKS Durchläufe werden direkt hintereinander nachgeholt
+            dropped = max(0, missed - MAX_CATCH_UP_TICKS)
+            self.missed_ticks += dropped
+            return next_tick + dropped * interval_sec
+
+        self.missed_ticks += missed
+        return next_tick + missed * interval_sec
 
     def start(self) -> None:
         """
@@ -114,15 +322,60 @@ class DisposableLoopThread(Thread):
             self.proceed = True
             Thread.start(self)
 
-    def stop(self) -> None:
+    def stop(self, timeout: float = None) -> bool:
         """
-        Stoppt die Ausführung der im 'self.events' definierten Funktionen.
+        Stoppt die Ausführung der im 'self.events' definierten Funktionen. Der Thread wartet nicht
+        erst das Intervall ab, nur eine gerade laufende Funktion wird noch beendet.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            default: None
+            Wie lange auf das Ende des Threads gewartet wird. Ohne wird nicht gewartet.
+
+        Returns
+        -------
+        <nameless>: bool
+            True, falls der Thread beendet ist (ohne timeout: nicht gewartet, also nur falls er schon beendet war).
         """
 
         self.proceed = False
+        self.paused = False
+        self._wakeup.set()
+        self._active.set()
+        self.on_finished_events.invoke()
+
+        if timeout is not None and self.started and self is not current_thread():
+            self.join(timeout)
+        return not self.is_alive()
+
+    def pause(self) -> None:
+        """
+        Hält die Schleife sofort an, ohne den Thread zu beenden. Mit resume() oder save_start()
+        geht es im selben Thread weiter.
+        """
+
+        if not self.proceed or self.paused:
+            return
+
+        self.paused = True
+        self._active.clear()
+        self._wakeup.set()
         self.on_finished_events.invoke()
 
-    def add_function(self, function) -> None:
+    def resume(self) -> None:
+        """
+        Setzt eine pausierte Schleife fort. Die Takte beginnen dabei neu, verpasste Durchläufe
+        werden nicht nachgeholt.
+        """
+
+        if not self.paused:
+            return
+
+        self.paused = False
+        self._active.set()
+
+    def add_function(self, function, interval_sec: float = None, phase_sec: float = 0.0) -> None:
         """
         Fügt eine auszuführende Funktion  den dazugehörenden Platz in der 'self.results' Liste hinzu,
         selbst wenn diese Funktionen kein Rückgabewert hat.
@@ -131,10 +384,42 @@ class DisposableLoopThread(Thread):
         ----------
         function: method
             Die Funktion, die ausgeführt werden soll.
+        interval_sec: float, optional
+            default: None
+            Ein eigenes Intervall für diese Funktion. Ohne gilt 'interval_sec' des Threads.
+        phase_sec: float, optional
+            default: 0.0
+            Der Versatz des ersten Aufrufs gegenüber dem Start, z.B. damit zwei Funktionen
+            nicht im selben Moment laufen. Nur zusammen mit einem eigenen Intervall.
         """
 
         self.event_handler.add_function(function)
         self.results[function] = None
+        if interval_sec is not None:
+            self.timings[function] = (interval_sec, phase_sec)
+
+    def set_interval(self, function, interval_sec: float) -> None:
+        """
+        Ändert das eigene Intervall einer Funktion. Es gilt ab ihrem nächsten Aufruf.
+
+        Parameters
+        ----------
+        function: method
+            Die Funktion, sie muss mit add_function() hinzugefügt worden sein.
+        interval_sec: float
+            Das neue Intervall
+
+        Raises
+        ------
+        ValueError
+            Falls die Funktion nicht zum Thread gehört.
+        """
+
+        if function not in self.event_handler.events:
+            raise ValueError(f'{function} has not been added to the thread')
+
+        _, phase_sec = self.timings.get(function, (None, 0.0))
+        self.timings[function] = (interval_sec, phase_sec)
 
     def remove_function(self, function) -> None:
         """
@@ -146,8 +431,7 @@ class DisposableLoopThread(Thread):
             Die Funktion, die entfernt werden soll.
         """
 
-        if function in self.event_handler:
-            index = self.event_handler.events.index(function)
-
+        if function in self.event_handler.events:
             self.event_handler.remove_function(function)
-            self.results.pop(index)
+            self.results.pop(function, None)
+            self.timings.pop(function, None)
@@ -0,0 +1,133 @@
+# *********************** dispatch.py **************************
+# Warteschlange für Änderungen an der Oberfläche aus Hintergrundthreads.
+# Kivy-Widgets dürfen nur im Hauptthread verändert werden. Die Threads
+# legen ihre Änderungen deshalb hier ab und der Hauptthread führt sie
+# einmal pro Bild gesammelt aus (z.B. mit Clock.schedule_interval(drain, 0)).
+# Mehrere Änderungen derselben Eigenschaft werden zusammengefasst, nur
+# der neueste Wert wird übernommen.
+# **************************************************************
+
+import itertools
+import threading
+import traceback
+
+
+class MainThreadDispatcher(object):
+    """
+    Sammelt Funktionsaufrufe und Änderungen von Eigenschaften aus beliebigen Threads und führt sie
+    im Thread aus, der drain() aufruft. Aufrufe mit demselben Schlüssel ersetzen sich gegenseitig,
+    der neueste wird an der Stelle seines Eintreffens ausgeführt. Sonst bleibt die Reihenfolge erhalten.
+
+    Attributes
+    ----------
+    coalesced: int
+        Anzahl der Aufrufe, die durch einen neueren mit demselben Schlüssel ersetzt wurden.
+
+    Methods
+    -------
+    post(function, *args, key=None):
+        Reiht einen Funktionsaufruf ein.
+    set_property(target, name, value):
+        Reiht das Setzen einer Eigenschaft ein.
+    drain(*args):
+        Führt alle eingereihten Aufrufe aus.
+    """
+
+    def __init__(self):
+        """
+        Erstellt alle nötigen Variablen für die MainThreadDispatcher-Klasse.
+        """
+
+        self.coalesced = 0
+
+        # Schlüssel -> (Funktion, Argumente), in der Reihenfolge des Eintreffens
+        self._queue = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def post(self, function, *args, key=None) -> None:
+        """
+        Reiht einen Funktionsaufruf ein. Kann von jedem Thread aus aufgerufen werden.
+        Passt zur 'dispatch'-Signatur von EventLoopThread.submit() und FleetClient.
+
+        Parameters
+        ----------
+        function: method
+            Die Funktion
+        args: any
+            Die Argumente
+        key: hashable, optional
+            default: None
+            Ein Schlüssel, unter dem nur der neueste Aufruf ausgeführt wird. Ohne wird jeder Aufruf ausgeführt.
+        """
+
+        if key is None:
+            key = next(self._order)
+        with self._lock:
+            if self._queue.pop(key, None) is not None:
+                self.coalesced += 1
+            self._queue[key] = (function, args)
+
+    def set_property(self, target, name: str, value) -> None:
+        """
+        Reiht das Setzen einer Eigenschaft (z.B. einer Kivy-Property) ein. Mehrere Werte für dieselbe
+        Eigenschaft werden zusammengefasst, gesetzt wird nur, wenn sich der Wert tatsächlich ändert.
+
+        Parameters
+        ----------
+        target: object
+            Das Objekt, z.B. ein Widget
+        name: str
+            Der Name der Eigenschaft
+        value: any
+            Der neue Wert
+        """
+
+        self.post(_set_if_changed, target, name, value, key=(id(target), name))
+
+    def drain(self, *args) -> int:
+        """
+        Führt alle bis jetzt eingereihten Aufrufe aus. Aufrufe, die währenddessen eingereiht
+        werden, kommen beim nächsten Mal dran. Fehler werden ausgegeben und unterbrechen die übrigen
+        Aufrufe nicht.
+
+        Parameters
+        ----------
+        args: any
+            Werden ignoriert, z.B. die Zeit 'dt' der Kivy-Clock.
+
+        Returns
+        -------
+        <nameless>: int
+            Die Anzahl der ausgeführten Aufrufe
+        """
+
+        with self._lock:
+            if not self._queue:
+                return 0
+            queue, self._queue = self._queue, {}
+
+        for function, function_args in queue.values():
+            try:
+                function(*function_args)
+            except Exception:
+                print(traceback.format_exc())
+        return len(queue)
+
+
+def _set_if_changed(target, name: str, value) -> None:
+    """
+    Setzt eine Eigenschaft nur, wenn sich der Wert ändert, damit die Anzeige nicht unnötig neu zeichnet.
+
+    Parameters
+    ----------
+    target: object
+        Das Objekt
+    name: str
+        Der Name der Eigenschaft
+    value: any
+        Der neue Wert
+    """
+
+    if getattr(target, name) != value:
+        setattr(target, name, value)
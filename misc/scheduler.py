@@ -0,0 +1,309 @@
+# *********************** scheduler.py **************************
+# Ein gemeinsamer Zeitplaner für periodische und einmalige Aufgaben.
+# Statt dass jede Aufgabe einen eigenen Thread bekommt, der die meiste
+# Zeit schläft, stehen alle Aufgaben in einem Heap nach ihrem nächsten
+# Zeitpunkt. Wenige Arbeiterthreads führen die fälligen Aufgaben aus,
+# bei mehreren fälligen zuerst die mit der höchsten Priorität.
+# ***************************************************************
+
+import heapq
+import itertools
+import threading
+import traceback
+from time import monotonic
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+DEFAULT_WORKERS = 3
+
+
+class ScheduledTask(object):
+    """
+    Eine Aufgabe im Scheduler. Eine periodische Aufgabe läuft nie gleichzeitig mit sich selbst,
+    der nächste Durchlauf wird erst nach dem Ende des vorherigen eingeplant. Sie läuft auf einem
+    festen Takt, verpasste Zeitpunkte werden ausgelassen.
+
+    Attributes
+    ----------
+    function: method
+        Die Funktion, die ausgeführt wird.
+    period_sec: float
+        Der Abstand zwischen den Durchläufen oder None für eine einmalige Aufgabe.
+        Kann geändert werden und gilt ab dem nächsten Durchlauf.
+    priority: int
+        Die Priorität (PRIORITY_*), kleinere Werte zuerst.
+    next_run: float
+        Der nächste geplante Zeitpunkt (monotonic()).
+    cancelled: bool
+        Wurde die Aufgabe abgebrochen?
+    runs: int
+        Anzahl der Durchläufe
+    missed_runs: int
+        Anzahl der ausgelassenen Zeitpunkte, weil die Aufgabe oder die Arbeiter zu langsam waren.
+
+    Methods
+    -------
+    cancel():
+        Bricht die Aufgabe ab. Ein laufender Durchlauf wird noch beendet.
+    """
+
+    def __init__(self, scheduler, function, period_sec: float, priority: int, next_run: float):
+        """
+        Erstellt alle nötigen Variablen für die ScheduledTask-Klasse.
+
+        Parameters
+        ----------
+        scheduler: Scheduler
+            Der Scheduler, zu dem die Aufgabe gehört.
+        function: method
+            Die Funktion
+        period_sec: float
+            Der Abstand zwischen den Durchläufen oder None
+        priority: int
+            Die Priorität
+        next_run: float
+            Der erste Zeitpunkt (monotonic())
+        """
+
+        self.function = function
+        self.period_sec = period_sec
+        self.priority = priority
+        self.next_run = next_run
+        self.cancelled = False
+        self.runs = 0
+        self.missed_runs = 0
+
+        self._scheduler = scheduler
+
+    def cancel(self) -> None:
+        """
+        Bricht die Aufgabe ab. Ein laufender Durchlauf wird noch beendet, danach wird sie nicht mehr eingeplant.
+        """
+
+        self._scheduler.cancel(self)
+
+
+class Scheduler(object):
+    """
+    Führt periodische und einmalige Aufgaben mit wenigen Arbeiterthreads aus.
+    Aufgaben sollten nicht lange blockieren, da sie sich die Arbeiter teilen.
+
+    Attributes
+    ----------
+    workers: int
+        Die Anzahl der Arbeiterthreads
+
+    Methods
+    -------
+    start():
+        Startet die Arbeiterthreads.
+    stop(timeout=None):
+        Beendet die Arbeiterthreads.
+    schedule_periodic(function, period_sec, priority=PRIORITY_NORMAL, delay_sec=0):
+        Plant eine periodische Aufgabe ein.
+    schedule_once(function, delay_sec=0, priority=PRIORITY_NORMAL):
+        Plant eine einmalige Aufgabe ein.
+    cancel(task):
+        Bricht eine Aufgabe ab.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        """
+        Erstellt alle nötigen Variablen für die Scheduler-Klasse.
+
+        Parameters
+        ----------
+        workers: int, optional
+            default: DEFAULT_WORKERS
+            Die Anzahl der Arbeiterthreads
+        """
+
+        self.workers = workers
+
+        # Geplante Aufgaben nach Zeitpunkt, fällige nach Priorität
+        self._timers = []
+        self._ready = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def start(self) -> None:
+        """
+        Startet die Arbeiterthreads, sofern sie noch nicht laufen.
+        """
+
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Beendet die Arbeiterthreads, nachdem sie ihre laufenden Aufgaben beendet haben.
+        Eingeplante Aufgaben bleiben erhalten und laufen nach start() weiter.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            default: None
+            Wie lange maximal auf jeden Arbeiter gewartet wird.
+        """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+            threads = self._threads
+            self._threads = []
+
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def schedule_periodic(self, function, period_sec: float, priority: int = PRIORITY_NORMAL,
+                          delay_sec: float = 0) -> ScheduledTask:
+        """
+        Plant eine Aufgabe ein, die alle 'period_sec' Sekunden ausgeführt wird.
+
+        Parameters
+        ----------
+        function: method
+            Die Funktion
+        period_sec: float
+            Der Abstand zwischen den Durchläufen
+        priority: int, optional
+            default: PRIORITY_NORMAL
+            Die Priorität
+        delay_sec: float, optional
+            default: 0
+            Die Wartezeit bis zum ersten Durchlauf
+
+        Returns
+        -------
+        task: ScheduledTask
+            Die Aufgabe, z.B. um sie abzubrechen.
+        """
+
+        return self._schedule(ScheduledTask(self, function, period_sec, priority, monotonic() + delay_sec))
+
+    def schedule_once(self, function, delay_sec: float = 0, priority: int = PRIORITY_NORMAL) -> ScheduledTask:
+        """
+        Plant eine Aufgabe ein, die einmal nach 'delay_sec' Sekunden ausgeführt wird.
+
+        Parameters
+        ----------
+        function: method
+            Die Funktion
+        delay_sec: float, optional
+            default: 0
+            Die Wartezeit
+        priority: int, optional
+            default: PRIORITY_NORMAL
+            Die Priorität
+
+        Returns
+        -------
+        task: ScheduledTask
+            Die Aufgabe, z.B. um sie abzubrechen.
+        """
+
+        return self._schedule(ScheduledTask(self, function, None, priority, monotonic() + delay_sec))
+
+    def cancel(self, task: ScheduledTask) -> None:
+        """
+        Bricht eine Aufgabe ab. Sie wird beim nächsten Blick in die Warteschlange verworfen.
+
+        Parameters
+        ----------
+        task: ScheduledTask
+            Die Aufgabe
+        """
+
+        if task is None:
+            return
+        with self._condition:
+            task.cancelled = True
+
+    def _schedule(self, task: ScheduledTask) -> ScheduledTask:
+        """
+        Trägt eine Aufgabe ein und startet bei Bedarf die Arbeiter.
+
+        Parameters
+        ----------
+        task: ScheduledTask
+            Die Aufgabe
+
+        Returns
+        -------
+        task: ScheduledTask
+            Dieselbe Aufgabe
+        """
+
+        with self._condition:
+            heapq.heappush(self._timers, (task.next_run, next(self._order), task))
+            self._condition.notify()
+        self.start()
+        return task
+
+    def _next_task(self) -> ScheduledTask:
+        """
+        Wartet auf die nächste fällige Aufgabe. Muss mit self._condition aufgerufen werden.
+
+        Returns
+        -------
+        <nameless>: ScheduledTask
+            Die Aufgabe oder None, falls der Scheduler gestoppt wurde.
+        """
+
+        while self._running:
+            now = monotonic()
+            # Alle fälligen Aufgaben wandern in den Heap nach Priorität
+            while self._timers and self._timers[0][0] <= now:
+                _, order, task = heapq.heappop(self._timers)
+                if not task.cancelled:
+                    heapq.heappush(self._ready, (task.priority, order, task))
+
+            while self._ready:
+                task = heapq.heappop(self._ready)[2]
+                if not task.cancelled:
+                    return task
+
+            timeout = self._timers[0][0] - now if self._timers else None
+            self._condition.wait(timeout)
+        return None
+
+    def _work(self) -> None:
+        """
+        Die Hauptfunktion jedes Arbeiterthreads.
+        """
+
+        while True:
+            with self._condition:
+                task = self._next_task()
+            if task is None:
+                return
+
+            try:
+                task.function()
+            except Exception:
+                print(traceback.format_exc())
+            task.runs += 1
+
+            with self._condition:
+                if task.period_sec is None or task.cancelled:
+                    continue
+
+                # Fester Takt, verpasste Zeitpunkte werden ausgelassen
+                now = monotonic()
+                task.next_run += task.period_sec
+                if task.next_run < now:
+                    missed = int((now - task.next_run) // task.period_sec) + 1 if task.period_sec > 0 else 0
+                    task.missed_runs += missed
+                    task.next_run = now if task.period_sec <= 0 else task.next_run + missed * task.period_sec
+                heapq.heappush(self._timers, (task.next_run, next(self._order), task))
+                self._condition.notify()